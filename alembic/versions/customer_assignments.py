@@ -0,0 +1,120 @@
+"""add customer_assignments change tracking for salesman delta sync
+
+Revision ID: customer_assignments
+Revises: item_versions
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'customer_assignments'
+down_revision = 'item_versions'
+branch_labels = None
+depends_on = None
+
+# Every salesman named on a cacus row, one per output row
+SALESMEN_OF = """
+    SELECT DISTINCT s.employee_id, c.zid, c.xcus
+    FROM {rows} c
+    CROSS JOIN LATERAL unnest(ARRAY[c.xsp, c.xsp1, c.xsp2, c.xsp3]) AS s(employee_id)
+    WHERE s.employee_id IS NOT NULL AND s.employee_id <> ''
+      AND c.zid IS NOT NULL AND c.xcus IS NOT NULL
+"""
+
+
+def upgrade() -> None:
+    # One row per (salesman, customer) pair ever assigned. version is the id of
+    # the last transaction that changed the customer or the assignment; active
+    # is false once the salesman was removed from the customer.
+    op.create_table(
+        'customer_assignments',
+        sa.Column('employee_id', sa.String(), nullable=False),
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xcus', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('employee_id', 'zid', 'xcus'),
+    )
+    op.create_index(
+        'ix_customer_assignments_employee_version',
+        'customer_assignments',
+        ['employee_id', 'version', 'zid', 'xcus'],
+    )
+
+    # Statement-level triggers: an area reassignment or offer update touching
+    # thousands of customers becomes two set-based statements
+    op.execute(f"""
+    CREATE OR REPLACE FUNCTION customer_assignments_touch() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO customer_assignments (employee_id, zid, xcus, active, version, changed_at)
+            SELECT employee_id, zid, xcus, true, txid_current(), now()
+            FROM ({SALESMEN_OF.format(rows='new_rows')}) AS assigned
+            ON CONFLICT (employee_id, zid, xcus) DO UPDATE
+                SET active = true,
+                    version = EXCLUDED.version,
+                    changed_at = EXCLUDED.changed_at;
+        END IF;
+
+        IF TG_OP = 'UPDATE' THEN
+            UPDATE customer_assignments a
+            SET active = false, version = txid_current(), changed_at = now()
+            FROM (
+                {SALESMEN_OF.format(rows='old_rows')}
+                EXCEPT
+                {SALESMEN_OF.format(rows='new_rows')}
+            ) AS removed
+            WHERE a.employee_id = removed.employee_id
+              AND a.zid = removed.zid
+              AND a.xcus = removed.xcus;
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE customer_assignments a
+            SET active = false, version = txid_current(), changed_at = now()
+            FROM ({SALESMEN_OF.format(rows='old_rows')}) AS removed
+            WHERE a.employee_id = removed.employee_id
+              AND a.zid = removed.zid
+              AND a.xcus = removed.xcus;
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE TRIGGER cacus_customer_assignments_ins
+        AFTER INSERT ON cacus
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION customer_assignments_touch();
+
+    CREATE TRIGGER cacus_customer_assignments_upd
+        AFTER UPDATE ON cacus
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION customer_assignments_touch();
+
+    CREATE TRIGGER cacus_customer_assignments_del
+        AFTER DELETE ON cacus
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION customer_assignments_touch();
+    """)
+
+    # Current assignments start at this migration's version, so a salesman
+    # syncing from version 0 receives the full list
+    op.execute(f"""
+    INSERT INTO customer_assignments (employee_id, zid, xcus, active, version, changed_at)
+    SELECT employee_id, zid, xcus, true, txid_current(), now()
+    FROM ({SALESMEN_OF.format(rows='cacus')}) AS assigned
+    ON CONFLICT (employee_id, zid, xcus) DO NOTHING;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS cacus_customer_assignments_ins ON cacus")
+    op.execute("DROP TRIGGER IF EXISTS cacus_customer_assignments_upd ON cacus")
+    op.execute("DROP TRIGGER IF EXISTS cacus_customer_assignments_del ON cacus")
+    op.execute("DROP FUNCTION IF EXISTS customer_assignments_touch()")
+    op.drop_index('ix_customer_assignments_employee_version', table_name='customer_assignments')
+    op.drop_table('customer_assignments')
@@ -0,0 +1,32 @@
+"""add active salesman index on customer_assignments
+
+Revision ID: customer_assignments_active_index
+Revises: customer_assignments
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'customer_assignments_active_index'
+down_revision = 'customer_assignments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Customer lists now join customer_assignments instead of OR-ing the four
+    # salesman columns of cacus. The primary key (employee_id, zid, xcus)
+    # serves the per-business list and areas; this partial index serves the
+    # cross-business sync list in its (xcus, zid) page order.
+    op.create_index(
+        'ix_customer_assignments_employee_active',
+        'customer_assignments',
+        ['employee_id', 'xcus', 'zid'],
+        postgresql_where=sa.text('active'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_customer_assignments_employee_active', table_name='customer_assignments')
@@ -0,0 +1,106 @@
+"""add customer_balance_snapshot for ledger opening balances
+
+Revision ID: customer_balance_snapshot
+Revises: customer_sales_monthly
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'customer_balance_snapshot'
+down_revision = 'customer_sales_monthly'
+branch_labels = None
+depends_on = None
+
+TRACKED_TABLES = ('glheader', 'gldetail')
+
+
+def upgrade() -> None:
+    # Month-end balance per customer and project. Rows are built by the
+    # snapshot job (and scripts/balance_snapshots.py), not backfilled here.
+    op.create_table(
+        'customer_balance_snapshot',
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xsub', sa.String(), nullable=False),
+        sa.Column('xproj', sa.String(), nullable=False),
+        sa.Column('period_end', sa.Date(), nullable=False),
+        sa.Column('balance', sa.Float(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('zid', 'xsub', 'xproj', 'period_end'),
+    )
+
+    # A posting dated on or before a snapshot's period end makes that snapshot
+    # wrong, so statement-level triggers delete every snapshot of the touched
+    # customers from the earliest touched date on. Opening balances then fall
+    # back to an older snapshot until the job rebuilds the gap. Detail rows
+    # find their date through glheader; header rows find their customers
+    # through gldetail.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION customer_balance_snapshot_invalidate() RETURNS trigger AS $$
+    DECLARE
+        changed text;
+        source text;
+    BEGIN
+        changed := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT * FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT * FROM old_rows'
+            ELSE 'SELECT * FROM new_rows UNION ALL SELECT * FROM old_rows'
+        END;
+
+        IF TG_TABLE_NAME = 'gldetail' THEN
+            source := format(
+                'SELECT r.zid, r.xsub, h.xdate FROM (%s) AS r
+                 JOIN glheader h ON h.zid = r.zid AND h.xvoucher = r.xvoucher',
+                changed
+            );
+        ELSE
+            source := format(
+                'SELECT r.zid, g.xsub, r.xdate FROM (%s) AS r
+                 JOIN gldetail g ON g.zid = r.zid AND g.xvoucher = r.xvoucher',
+                changed
+            );
+        END IF;
+
+        EXECUTE format(
+            'DELETE FROM customer_balance_snapshot s
+             USING (
+                 SELECT zid, xsub, MIN(xdate) AS xdate FROM (%s) AS touched
+                 WHERE xsub IS NOT NULL AND xdate IS NOT NULL
+                 GROUP BY zid, xsub
+             ) AS t
+             WHERE s.zid = t.zid AND s.xsub = t.xsub AND s.period_end >= t.xdate',
+            source
+        );
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    for table in TRACKED_TABLES:
+        op.execute(f"""
+        CREATE TRIGGER {table}_balance_snapshot_ins
+            AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION customer_balance_snapshot_invalidate();
+
+        CREATE TRIGGER {table}_balance_snapshot_upd
+            AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION customer_balance_snapshot_invalidate();
+
+        CREATE TRIGGER {table}_balance_snapshot_del
+            AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION customer_balance_snapshot_invalidate();
+        """)
+
+
+def downgrade() -> None:
+    for table in TRACKED_TABLES:
+        for suffix in ('ins', 'upd', 'del'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_balance_snapshot_{suffix} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS customer_balance_snapshot_invalidate()")
+    op.drop_table('customer_balance_snapshot')
@@ -0,0 +1,133 @@
+"""queue customers for balance snapshot rebuilds instead of locking the GL
+
+Revision ID: customer_balance_snapshot_dirty
+Revises: customer_balance_snapshot
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'customer_balance_snapshot_dirty'
+down_revision = 'customer_balance_snapshot'
+branch_labels = None
+depends_on = None
+
+# Touched rows as (zid, xsub, xdate): detail rows find their date through
+# glheader, header rows find their customers through gldetail
+TOUCHED_SOURCE = """
+        changed := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT * FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT * FROM old_rows'
+            ELSE 'SELECT * FROM new_rows UNION ALL SELECT * FROM old_rows'
+        END;
+
+        IF TG_TABLE_NAME = 'gldetail' THEN
+            source := format(
+                'SELECT r.zid, r.xsub, h.xdate FROM (%s) AS r
+                 JOIN glheader h ON h.zid = r.zid AND h.xvoucher = r.xvoucher',
+                changed
+            );
+        ELSE
+            source := format(
+                'SELECT r.zid, g.xsub, r.xdate FROM (%s) AS r
+                 JOIN gldetail g ON g.zid = r.zid AND g.xvoucher = r.xvoucher',
+                changed
+            );
+        END IF;
+"""
+
+
+def _replace_function(action: str) -> None:
+    op.execute(f"""
+    CREATE OR REPLACE FUNCTION customer_balance_snapshot_invalidate() RETURNS trigger AS $$
+    DECLARE
+        changed text;
+        source text;
+    BEGIN
+        {TOUCHED_SOURCE}
+        EXECUTE format({action}, source);
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def upgrade() -> None:
+    # Customers whose snapshots are stale from from_date on; version is the
+    # newest transaction that queued one
+    op.create_table(
+        'customer_balance_snapshot_dirty',
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xsub', sa.String(), nullable=False),
+        sa.Column('from_date', sa.Date(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('zid', 'xsub'),
+    )
+    op.create_index(
+        'ix_customer_balance_snapshot_dirty_version', 'customer_balance_snapshot_dirty', ['version']
+    )
+
+    # The triggers now only queue the touched customers with their earliest
+    # posting date. Readers skip snapshots a queued row covers, and the job
+    # rebuilds a customer once every transaction that queued it has finished,
+    # so neither the job nor the triggers lock or delete snapshot rows.
+    _replace_function("""
+            'INSERT INTO customer_balance_snapshot_dirty (zid, xsub, from_date, version)
+             SELECT zid, xsub, MIN(xdate), txid_current() FROM (%s) AS touched
+             WHERE xsub IS NOT NULL AND xdate IS NOT NULL
+             GROUP BY zid, xsub
+             ON CONFLICT (zid, xsub) DO UPDATE
+                 SET from_date = LEAST(customer_balance_snapshot_dirty.from_date, EXCLUDED.from_date),
+                     version = GREATEST(customer_balance_snapshot_dirty.version, EXCLUDED.version)'
+    """)
+
+    # Queue every customer from the day after its oldest "latest snapshot"
+    # across projects, or from the start of history if a project has none,
+    # so the job fills whatever the previous job had not built yet
+    op.execute("""
+    INSERT INTO customer_balance_snapshot_dirty (zid, xsub, from_date, version)
+    SELECT k.zid, k.xsub, MIN(COALESCE(s.period_end + 1, DATE '0001-01-01')), txid_current()
+    FROM (
+        SELECT DISTINCT zid, xsub, xproj FROM gldetail WHERE xsub IS NOT NULL AND xproj IS NOT NULL
+    ) AS k
+    LEFT JOIN (
+        SELECT zid, xsub, xproj, MAX(period_end) AS period_end
+        FROM customer_balance_snapshot
+        GROUP BY zid, xsub, xproj
+    ) AS s ON s.zid = k.zid AND s.xsub = k.xsub AND s.xproj = k.xproj
+    GROUP BY k.zid, k.xsub
+    """)
+
+    # The job reads one customer's GL lines at a time
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_gldetail_zid_xsub', 'gldetail', ['zid', 'xsub'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_gldetail_zid_xsub', table_name='gldetail', postgresql_concurrently=True, if_exists=True)
+
+    # Back to deleting the invalidated snapshots directly
+    _replace_function("""
+            'DELETE FROM customer_balance_snapshot s
+             USING (
+                 SELECT zid, xsub, MIN(xdate) AS xdate FROM (%s) AS touched
+                 WHERE xsub IS NOT NULL AND xdate IS NOT NULL
+                 GROUP BY zid, xsub
+             ) AS t
+             WHERE s.zid = t.zid AND s.xsub = t.xsub AND s.period_end >= t.xdate'
+    """)
+    op.execute("""
+    DELETE FROM customer_balance_snapshot s
+    USING customer_balance_snapshot_dirty d
+    WHERE s.zid = d.zid AND s.xsub = d.xsub AND s.period_end >= d.from_date
+    """)
+
+    op.drop_index('ix_customer_balance_snapshot_dirty_version', table_name='customer_balance_snapshot_dirty')
+    op.drop_table('customer_balance_snapshot_dirty')
@@ -0,0 +1,36 @@
+"""add date-bounded indexes for customer ledgers read from a snapshot
+
+Revision ID: customer_ledger_indexes
+Revises: customer_balance_snapshot_dirty
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+
+
+revision = 'customer_ledger_indexes'
+down_revision = 'customer_balance_snapshot_dirty'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A ledger that starts from a snapshot finds the vouchers dated after it
+    # by (zid, xdate), xvoucher included for an index-only scan, and then
+    # their lines by (zid, xvoucher). Built concurrently: the GL takes
+    # postings all day.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_glheader_zid_xdate', 'glheader', ['zid', 'xdate', 'xvoucher'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_gldetail_zid_xvoucher', 'gldetail', ['zid', 'xvoucher'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_gldetail_zid_xvoucher', table_name='gldetail', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_glheader_zid_xdate', table_name='glheader', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,160 @@
+"""add customer_sales_monthly aggregate for customer net sales metrics
+
+Revision ID: customer_sales_monthly
+Revises: customer_assignments_active_index
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'customer_sales_monthly'
+down_revision = 'customer_assignments_active_index'
+branch_labels = None
+depends_on = None
+
+# Document headers carry zid, xcus and xdate themselves
+HEADER_TABLES = ('opord', 'imtemptrn', 'opcrn')
+
+# Detail tables and the header table and document number column they hang off
+DETAIL_TABLES = {
+    'opodt': ('opord', 'xordernum'),
+    'imtemptdt': ('imtemptrn', 'ximtmptrn'),
+    'opcdt': ('opcrn', 'xcrnnum'),
+}
+
+# Return documents that count against a customer's sales
+IMTEMP_RETURN_PATTERNS = ('%RECA%', '%SRE-%', '%RECT-%', '%DSR-%')
+
+
+def _create_triggers(table: str, args: str = '') -> None:
+    op.execute(f"""
+    CREATE TRIGGER {table}_customer_sales_monthly_ins
+        AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION customer_sales_monthly_touch({args});
+
+    CREATE TRIGGER {table}_customer_sales_monthly_upd
+        AFTER UPDATE ON {table}
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION customer_sales_monthly_touch({args});
+
+    CREATE TRIGGER {table}_customer_sales_monthly_del
+        AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION customer_sales_monthly_touch({args});
+    """)
+
+
+def upgrade() -> None:
+    # One row per customer and calendar month
+    op.create_table(
+        'customer_sales_monthly',
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xcus', sa.String(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('gross_sales', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('imtemp_returns', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('opcrn_returns', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('zid', 'xcus', 'month'),
+    )
+
+    # Months to recompute; version is the newest transaction that queued one
+    op.create_table(
+        'customer_sales_monthly_dirty',
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xcus', sa.String(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('zid', 'xcus', 'month'),
+    )
+    op.create_index('ix_customer_sales_monthly_dirty_version', 'customer_sales_monthly_dirty', ['version'])
+
+    # Statement-level triggers queue each customer month a statement touched
+    # once. Detail tables find the customer and date through their header;
+    # TG_ARGV names that header table and the document number column.
+    # opcrn.xdate is character varying, so dates go through text.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION customer_sales_monthly_touch() RETURNS trigger AS $$
+    DECLARE
+        changed text;
+        source text;
+    BEGIN
+        changed := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT * FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT * FROM old_rows'
+            ELSE 'SELECT * FROM new_rows UNION ALL SELECT * FROM old_rows'
+        END;
+
+        IF TG_NARGS = 0 THEN
+            source := format('SELECT zid, xcus, xdate::text AS xdate FROM (%s) AS r', changed);
+        ELSE
+            source := format(
+                'SELECT h.zid, h.xcus, h.xdate::text AS xdate FROM (%1$s) AS r
+                 JOIN %2$I h ON h.zid = r.zid AND h.%3$I = r.%3$I',
+                changed, TG_ARGV[0], TG_ARGV[1]
+            );
+        END IF;
+
+        EXECUTE format(
+            'INSERT INTO customer_sales_monthly_dirty (zid, xcus, month, version)
+             SELECT DISTINCT zid, xcus, date_trunc(''month'', NULLIF(xdate, '''')::date)::date, txid_current()
+             FROM (%s) AS touched
+             WHERE zid IS NOT NULL AND xcus IS NOT NULL AND NULLIF(xdate, '''') IS NOT NULL
+             ON CONFLICT (zid, xcus, month) DO UPDATE
+                 SET version = GREATEST(customer_sales_monthly_dirty.version, EXCLUDED.version)',
+            source
+        );
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    for table in HEADER_TABLES:
+        _create_triggers(table)
+    for table, (header, column) in DETAIL_TABLES.items():
+        _create_triggers(table, f"'{header}', '{column}'")
+
+    # The endpoint reads from January of last year on; older months are only
+    # computed if their documents change
+    patterns = ' OR '.join(f"h.ximtmptrn LIKE '{pattern}'" for pattern in IMTEMP_RETURN_PATTERNS)
+    op.execute(f"""
+    INSERT INTO customer_sales_monthly
+        (zid, xcus, month, gross_sales, imtemp_returns, opcrn_returns, order_count, refreshed_at)
+    SELECT zid, xcus, month,
+           COALESCE(SUM(gross_sales), 0), COALESCE(SUM(imtemp_returns), 0),
+           COALESCE(SUM(opcrn_returns), 0), SUM(order_count), now()
+    FROM (
+        SELECT h.zid, h.xcus, date_trunc('month', h.xdate)::date AS month,
+               d.xlineamt AS gross_sales, NULL::float8 AS imtemp_returns, NULL::float8 AS opcrn_returns,
+               1 AS order_count
+        FROM opord h JOIN opodt d ON d.xordernum = h.xordernum AND d.zid = h.zid
+        WHERE h.xdate >= date_trunc('year', now()) - INTERVAL '1 year'
+        UNION ALL
+        SELECT h.zid, h.xcus, date_trunc('month', h.xdate)::date,
+               NULL, d.xlineamt, NULL, 0
+        FROM imtemptrn h JOIN imtemptdt d ON d.ximtmptrn = h.ximtmptrn AND d.zid = h.zid
+        WHERE h.xdate >= date_trunc('year', now()) - INTERVAL '1 year' AND ({patterns})
+        UNION ALL
+        SELECT h.zid, h.xcus, date_trunc('month', NULLIF(h.xdate, '')::date)::date,
+               NULL, NULL, d.xlineamt, 0
+        FROM opcrn h JOIN opcdt d ON d.xcrnnum = h.xcrnnum AND d.zid = h.zid
+        WHERE NULLIF(h.xdate, '')::date >= date_trunc('year', now()) - INTERVAL '1 year'
+    ) AS lines
+    WHERE zid IS NOT NULL AND xcus IS NOT NULL
+    GROUP BY zid, xcus, month;
+    """)
+
+
+def downgrade() -> None:
+    for table in HEADER_TABLES + tuple(DETAIL_TABLES):
+        for suffix in ('ins', 'upd', 'del'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_customer_sales_monthly_{suffix} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS customer_sales_monthly_touch()")
+    op.drop_index('ix_customer_sales_monthly_dirty_version', table_name='customer_sales_monthly_dirty')
+    op.drop_table('customer_sales_monthly_dirty')
+    op.drop_table('customer_sales_monthly')
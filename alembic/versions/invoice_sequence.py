@@ -0,0 +1,67 @@
+"""add opmob_invoicesl_seq for block-allocated invoice serials
+
+Revision ID: invoice_sequence
+Revises: order_idempotency
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+revision = 'invoice_sequence'
+down_revision = 'order_idempotency'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with INVOICE_BLOCK_SIZE and MAX_INVOICE_SERIAL in app/utils/orders_utils.py
+INVOICE_BLOCK_SIZE = 100
+MAX_INVOICE_SERIAL = 999999999999
+# Refuse to create a sequence with less room than this many serials
+MIN_FREE_SERIALS = 1000000
+
+
+def upgrade() -> None:
+    # The old generator drew serials uniformly from all 12-digit numbers, so
+    # no range is unused by construction. Start the sequence in the widest
+    # range between serials that are actually in opmob and cap it where that
+    # range ends, so sequence serials can never collide with existing
+    # invoices or outgrow the 12 digits format_invoice_number expects.
+    op.execute(f"""
+    DO $$
+    DECLARE
+        start_at bigint;
+        gap_end bigint;
+        max_at bigint;
+    BEGIN
+        SELECT used.invoicesl + 1, used.next_used - 1 INTO start_at, gap_end
+        FROM (
+            SELECT invoicesl, LEAD(invoicesl) OVER (ORDER BY invoicesl) AS next_used
+            FROM (
+                SELECT DISTINCT invoicesl FROM opmob
+                WHERE invoicesl BETWEEN 1 AND {MAX_INVOICE_SERIAL}
+                UNION ALL SELECT 0
+                UNION ALL SELECT {MAX_INVOICE_SERIAL} + 1
+            ) AS serials
+        ) AS used
+        WHERE used.next_used IS NOT NULL
+        ORDER BY used.next_used - used.invoicesl DESC
+        LIMIT 1;
+
+        -- nextval() returns the first serial of a block; the whole block must fit
+        max_at := gap_end - {INVOICE_BLOCK_SIZE} + 1;
+        IF max_at - start_at + 1 < {MIN_FREE_SERIALS} THEN
+            RAISE EXCEPTION 'No free range of % invoice serials in opmob (widest is % to %)',
+                {MIN_FREE_SERIALS}, start_at, gap_end;
+        END IF;
+
+        EXECUTE format(
+            'CREATE SEQUENCE opmob_invoicesl_seq INCREMENT BY {INVOICE_BLOCK_SIZE} '
+            'START WITH %s MINVALUE %s MAXVALUE %s NO CYCLE',
+            start_at, start_at, max_at
+        );
+    END $$;
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP SEQUENCE IF EXISTS opmob_invoicesl_seq")
@@ -0,0 +1,52 @@
+"""add pg_trgm GIN indexes for item search
+
+Revision ID: item_search_trgm
+Revises: invoice_sequence
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+
+
+revision = 'item_search_trgm'
+down_revision = 'invoice_sequence'
+branch_labels = None
+depends_on = None
+
+CAITEM_INDEXES = {
+    'ix_caitem_xdesc_trgm': 'xdesc',
+    'ix_caitem_xitem_trgm': 'xitem',
+    'ix_caitem_xgitem_trgm': 'xgitem',
+}
+
+FINAL_ITEMS_VIEW_INDEXES = {
+    'ix_final_items_view_item_name_trgm': 'item_name',
+    'ix_final_items_view_item_id_trgm': 'item_id',
+    'ix_final_items_view_item_group_trgm': 'item_group',
+}
+
+
+def upgrade() -> None:
+    # Trigram GIN indexes serve ILIKE '%term%' and word similarity (<%) lookups
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for name, column in CAITEM_INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON caitem USING gin ({column} gin_trgm_ops)")
+
+    # final_items_view is rebuilt outside of alembic; index it only when present
+    for name, column in FINAL_ITEMS_VIEW_INDEXES.items():
+        op.execute(f"""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_matviews WHERE matviewname = 'final_items_view') THEN
+                CREATE INDEX IF NOT EXISTS {name} ON final_items_view USING gin ({column} gin_trgm_ops);
+            END IF;
+        END $$;
+        """)
+
+
+def downgrade() -> None:
+    for name in FINAL_ITEMS_VIEW_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    for name in CAITEM_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
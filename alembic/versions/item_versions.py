@@ -0,0 +1,99 @@
+"""add item_versions change tracking for delta catalog sync
+
+Revision ID: item_versions
+Revises: keyset_pagination_indexes
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'item_versions'
+down_revision = 'keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+# Tables feeding the mobile catalog and the column holding their item code
+TRACKED_TABLES = {
+    'caitem': 'xitem',
+    'opspprc': 'xpricecat',
+    'stock_balance': 'xitem',
+}
+
+
+def upgrade() -> None:
+    # One row per item; version is the id of the last transaction that touched it
+    op.create_table(
+        'item_versions',
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xitem', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('zid', 'xitem'),
+    )
+    op.create_index('ix_item_versions_version', 'item_versions', ['version', 'zid', 'xitem'])
+
+    # Statement-level triggers stamp every item a statement touched once, so a
+    # bulk ERP price or stock posting costs one upsert per distinct item.
+    # TG_ARGV[0] names the item code column of the tracked table.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION item_versions_touch() RETURNS trigger AS $$
+    DECLARE
+        source text;
+    BEGIN
+        source := CASE TG_OP
+            WHEN 'INSERT' THEN format('SELECT zid, %I AS xitem FROM new_rows', TG_ARGV[0])
+            WHEN 'DELETE' THEN format('SELECT zid, %I AS xitem FROM old_rows', TG_ARGV[0])
+            ELSE format('SELECT zid, %1$I AS xitem FROM new_rows UNION SELECT zid, %1$I FROM old_rows', TG_ARGV[0])
+        END;
+
+        EXECUTE format(
+            'INSERT INTO item_versions (zid, xitem, version, changed_at)
+             SELECT DISTINCT zid, xitem, txid_current(), now() FROM (%s) AS touched
+             WHERE zid IS NOT NULL AND xitem IS NOT NULL
+             ON CONFLICT (zid, xitem) DO UPDATE
+                 SET version = EXCLUDED.version,
+                     changed_at = EXCLUDED.changed_at',
+            source
+        );
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    for table, column in TRACKED_TABLES.items():
+        op.execute(f"""
+        CREATE TRIGGER {table}_item_versions_ins
+            AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION item_versions_touch('{column}');
+
+        CREATE TRIGGER {table}_item_versions_upd
+            AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION item_versions_touch('{column}');
+
+        CREATE TRIGGER {table}_item_versions_del
+            AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION item_versions_touch('{column}');
+        """)
+
+    # Every existing item starts at this migration's version, so a client
+    # syncing from version 0 receives the whole catalog
+    op.execute("""
+    INSERT INTO item_versions (zid, xitem, version, changed_at)
+    SELECT zid, xitem, txid_current(), now() FROM caitem
+    ON CONFLICT (zid, xitem) DO NOTHING;
+    """)
+
+
+def downgrade() -> None:
+    for table in TRACKED_TABLES:
+        for suffix in ('ins', 'upd', 'del'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_item_versions_{suffix} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS item_versions_touch()")
+    op.drop_index('ix_item_versions_version', table_name='item_versions')
+    op.drop_table('item_versions')
@@ -0,0 +1,33 @@
+"""add indexes backing keyset pagination
+
+Revision ID: keyset_pagination_indexes
+Revises: item_search_trgm
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+
+revision = 'keyset_pagination_indexes'
+down_revision = 'item_search_trgm'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Cursor pages seek on (timestamp, id) / (created_at, id) newest first;
+    # btree indexes are scanned backwards for the DESC ordering
+    op.create_index('ix_location_records_timestamp_id', 'location_records', ['timestamp', 'id'], if_not_exists=True)
+    op.create_index(
+        'ix_location_records_username_timestamp_id',
+        'location_records',
+        ['username', 'timestamp', 'id'],
+        if_not_exists=True,
+    )
+    op.create_index('ix_feedback_created_at_id', 'feedback', ['created_at', 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_feedback_created_at_id', table_name='feedback', if_exists=True)
+    op.drop_index('ix_location_records_username_timestamp_id', table_name='location_records', if_exists=True)
+    op.drop_index('ix_location_records_timestamp_id', table_name='location_records', if_exists=True)
@@ -0,0 +1,35 @@
+"""add order_idempotency for retry-safe order submission
+
+Revision ID: order_idempotency
+Revises: stock_balance
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = 'order_idempotency'
+down_revision = 'stock_balance'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'order_idempotency',
+        sa.Column('username', sa.String(50), nullable=False),
+        sa.Column('idempotency_key', sa.String(100), nullable=False),
+        sa.Column('request_hash', sa.String(64), nullable=False),
+        sa.Column('response', postgresql.JSONB(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('username', 'idempotency_key'),
+    )
+    # Expiry sweeps delete by age
+    op.create_index('ix_order_idempotency_created_at', 'order_idempotency', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_idempotency_created_at', table_name='order_idempotency')
+    op.drop_table('order_idempotency')
@@ -0,0 +1,94 @@
+"""add stock_balance ledger maintained from imtrn
+
+Revision ID: stock_balance
+Revises: rbac_system
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'stock_balance'
+down_revision = 'rbac_system'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Running balance per (zid, warehouse, item) so item endpoints don't re-sum imtrn
+    op.create_table(
+        'stock_balance',
+        sa.Column('zid', sa.Integer(), nullable=False),
+        sa.Column('xwh', sa.String(), nullable=False),
+        sa.Column('xitem', sa.String(), nullable=False),
+        sa.Column('stock', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('zid', 'xwh', 'xitem'),
+    )
+    op.create_index('ix_stock_balance_zid_xitem', 'stock_balance', ['zid', 'xitem'])
+
+    # Statement-level triggers fold each imtrn write into the ledger as a delta.
+    # Transition tables let a bulk ERP posting update each balance row once.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION stock_balance_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO stock_balance (zid, xwh, xitem, stock, updated_at)
+            SELECT zid, COALESCE(xwh, ''), xitem, SUM(COALESCE(xqty * xsign, 0)), now()
+            FROM new_rows
+            GROUP BY zid, COALESCE(xwh, ''), xitem
+            ON CONFLICT (zid, xwh, xitem) DO UPDATE
+                SET stock = stock_balance.stock + EXCLUDED.stock,
+                    updated_at = EXCLUDED.updated_at;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO stock_balance (zid, xwh, xitem, stock, updated_at)
+            SELECT zid, COALESCE(xwh, ''), xitem, -SUM(COALESCE(xqty * xsign, 0)), now()
+            FROM old_rows
+            GROUP BY zid, COALESCE(xwh, ''), xitem
+            ON CONFLICT (zid, xwh, xitem) DO UPDATE
+                SET stock = stock_balance.stock + EXCLUDED.stock,
+                    updated_at = EXCLUDED.updated_at;
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Block imtrn writers while backfilling so no delta is lost between the two steps
+    op.execute("LOCK TABLE imtrn IN SHARE MODE")
+    op.execute("""
+    INSERT INTO stock_balance (zid, xwh, xitem, stock, updated_at)
+    SELECT zid, COALESCE(xwh, ''), xitem, COALESCE(SUM(xqty * xsign), 0), now()
+    FROM imtrn
+    GROUP BY zid, COALESCE(xwh, ''), xitem;
+    """)
+
+    op.execute("""
+    CREATE TRIGGER imtrn_stock_balance_ins
+        AFTER INSERT ON imtrn
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stock_balance_apply();
+
+    CREATE TRIGGER imtrn_stock_balance_upd
+        AFTER UPDATE ON imtrn
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stock_balance_apply();
+
+    CREATE TRIGGER imtrn_stock_balance_del
+        AFTER DELETE ON imtrn
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stock_balance_apply();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS imtrn_stock_balance_ins ON imtrn")
+    op.execute("DROP TRIGGER IF EXISTS imtrn_stock_balance_upd ON imtrn")
+    op.execute("DROP TRIGGER IF EXISTS imtrn_stock_balance_del ON imtrn")
+    op.execute("DROP FUNCTION IF EXISTS stock_balance_apply()")
+    op.drop_index('ix_stock_balance_zid_xitem', table_name='stock_balance')
+    op.drop_table('stock_balance')
@@ -1,14 +1,21 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import aliased
-from sqlalchemy import and_, or_, func, select
+from sqlalchemy import Date, Float, Integer, String, and_, case, cast, column, delete, exists, func, literal, literal_column, or_, select, tuple_, union_all, values
+from sqlalchemy.dialects.postgresql import insert
 from datetime import date, datetime
-from models.finance import GLHeader, GLDetail
+from models.finance import GLHeader, GLDetail, CustomerBalanceSnapshot, CustomerBalanceSnapshotDirty
 from typing import Optional, Tuple, List
 from schemas.customer_balance_schema import LedgerEntry
 from fastapi import HTTPException, status
 from logs import setup_logger
+from utils.delta_sync import high_water_mark
+from utils.streaming import NDJSONStream
 
-logger = setup_logger()
+logger = setup_logger(__name__)
+
+# Voucher prefixes of customer receipts and of sales invoices in the GL
+PAYMENT_VOUCHER_PATTERNS = ('%RCT-%', 'JV--%', 'RCT-%', 'CRCT%', 'STJV%', 'BRCT%')
+ORDER_VOUCHER_PATTERN = '%INOP%'
 
 class CustomerBalanceController:
     def __init__(self, db: AsyncSession):
@@ -39,195 +46,420 @@ class CustomerBalanceController:
             )
 
         # Log the access attempt
-        logger.info(f"User {current_user.username} ({current_user.username}) accessing customer balance for {customer_id} in {project}")
+        logger.info("User %s (%s) accessing customer balance for %s in %s", current_user.username, current_user.username, customer_id, project)
 
         # For additional validation similar to customers_db_controller if needed
         # Add any specific validation rules here
 
-    async def get_payment_data(self, zid: int, customer_id: str, start_date: date, end_date: date) -> List[dict]:
-        try:
-            h = aliased(GLHeader)
-            g = aliased(GLDetail)
-            
-            query = select(
-                h.xdate.label('last_pay_date'),
-                g.xsub.label('xcus'),
-                g.xprime.label('last_rec_amt'),
-                h.xvoucher.label('xvoucher')
-            ).select_from(h).join(
-                g, and_(h.xvoucher == g.xvoucher, h.zid == g.zid)
-            ).filter(
-                h.zid == zid,
-                g.zid == zid,
-                g.xsub == customer_id,
-                h.xdate.between(start_date, end_date),
-                or_(
-                    h.xvoucher.like('%RCT-%'),
-                    h.xvoucher.like('JV--%'),
-                    h.xvoucher.like('RCT-%'),
-                    h.xvoucher.like('CRCT%'),
-                    h.xvoucher.like('STJV%'),
-                    h.xvoucher.like('BRCT%')
-                )
-            ).order_by(g.xsub, h.xdate)
-            
-            result = await self.db.execute(query)
-            results = result.fetchall()
-            
-            return [
-                {
-                    'last_pay_date': row.last_pay_date,
-                    'xcus': row.xcus,
-                    'last_rec_amt': float(row.last_rec_amt) if row.last_rec_amt is not None else 0.0,
-                    'xvoucher': row.xvoucher
-                }
-                for row in results
-            ]
-        except Exception as e:
-            logger.error(f"Error getting payment data: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error retrieving payment data: {str(e)}"
-            )
+    @staticmethod
+    def ledger_query(
+        zid: int,
+        customer_id: str,
+        project: str,
+        start_date: date,
+        end_date: date,
+        snapshot: Optional[CustomerBalanceSnapshot] = None,
+    ):
+        """
+        The whole ledger as one statement: the OPENING row followed by every
+        payment and order voucher in the range, each with its running balance.
 
-    async def get_order_data(self, zid: int, customer_id: str, start_date: date, end_date: date) -> List[dict]:
-        try:
+        The customer's GL lines up to end_date are read once. The opening
+        balance (project lines before start_date, opening-balance vouchers
+        excluded) is summed into the OPENING row, and the running balance is
+        a window sum over the rows in ledger order, so nothing has to be
+        merged or accumulated in Python. With a snapshot from before
+        start_date its balance is carried into the opening and only vouchers
+        dated after its period end are read: they are found by date through
+        ix_glheader_zid_xdate and their lines through ix_gldetail_zid_xvoucher,
+        so the work follows the date range rather than the customer's history.
+        """
+        g = aliased(GLDetail)
+        carried_balance = 0.0
+        if snapshot is None:
             h = aliased(GLHeader)
-            g = aliased(GLDetail)
-            
-            query = select(
-                h.xdate.label('last_order_date'),
-                g.xsub.label('xcus'),
-                g.xprime.label('last_order_amt'),
-                h.xvoucher.label('xvoucher')
-            ).select_from(h).join(
-                g, and_(h.xvoucher == g.xvoucher, h.zid == g.zid)
-            ).filter(
-                h.zid == zid,
-                g.zid == zid,
-                g.xsub == customer_id,
-                h.xdate.between(start_date, end_date),
-                h.xvoucher.like('%INOP%')
-            ).order_by(g.xsub, h.xdate)
-            
-            result = await self.db.execute(query)
-            results = result.fetchall()
-            
-            return [
-                {
-                    'last_order_date': row.last_order_date,
-                    'xcus': row.xcus,
-                    'last_order_amt': float(row.last_order_amt) if row.last_order_amt is not None else 0.0,
-                    'xvoucher': row.xvoucher
-                }
-                for row in results
-            ]
-        except Exception as e:
-            logger.error(f"Error getting order data: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error retrieving order data: {str(e)}"
+            headers = h
+        else:
+            gh = aliased(GLHeader)
+            # MATERIALIZED keeps the planner from turning this back into a
+            # walk over every line of the customer
+            headers = (
+                select(gh.zid, gh.xvoucher, gh.xdate)
+                .where(gh.zid == zid, gh.xdate > snapshot.period_end, gh.xdate <= end_date)
+                .cte("delta_vouchers")
+                .prefix_with("MATERIALIZED")
             )
+            h = headers.c
+            carried_balance = snapshot.balance
 
-    async def get_closing_balance(self, zid: int, customer_id: str, closing_date: date) -> float:
-        try:
-            g = aliased(GLDetail)
-            h = aliased(GLHeader)
-            
-            project = self.get_project_by_zid(zid)
-            if not project:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Invalid business ID: {zid}"
-                )
-            
-            query = select(
-                func.sum(g.xprime).label('closing_balance')
-            ).select_from(g).join(
-                h, and_(g.xvoucher == h.xvoucher, g.zid == h.zid)
-            ).filter(
+        entry_type = case(
+            (or_(*(h.xvoucher.like(pattern) for pattern in PAYMENT_VOUCHER_PATTERNS)), "PAYMENT"),
+            (h.xvoucher.like(ORDER_VOUCHER_PATTERN), "ORDER"),
+        )
+        lines = (
+            select(
+                h.xdate.label("transaction_date"),
+                h.xvoucher.label("voucher"),
+                func.coalesce(g.xprime, 0).label("amount"),
+                entry_type.label("entry_type"),
+                and_(
+                    h.xdate < start_date,
+                    g.xproj == project,
+                    ~g.xvoucher.like('%OB%'),
+                ).label("in_opening"),
+            )
+            .select_from(headers)
+            .join(g, and_(h.xvoucher == g.xvoucher, h.zid == g.zid))
+            .filter(
                 h.zid == zid,
                 g.zid == zid,
                 g.xsub == customer_id,
-                g.xproj == project,
-                ~g.xvoucher.like('%OB%'),
-                h.xdate < closing_date
+                h.xdate <= end_date,
             )
-            
-            result = await self.db.execute(query)
-            scalar_result = result.scalar()
-            return float(scalar_result) if scalar_result is not None else 0.0
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error getting closing balance: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error retrieving closing balance: {str(e)}"
+        )
+        lines = lines.cte("lines")
+
+        opening = select(
+            literal(0, Integer).label("position"),
+            literal(start_date, Date).label("transaction_date"),
+            literal("OPENING", String).label("entry_type"),
+            literal(0.0, Float).label("amount"),
+            literal("N/A", String).label("voucher"),
+            (
+                literal(carried_balance, Float)
+                + func.coalesce(func.sum(case((lines.c.in_opening, lines.c.amount), else_=0)), 0)
+            ).label("balance_change"),
+        )
+        entries = select(
+            # Payments before orders on the same day, as the ledger always listed them
+            case((lines.c.entry_type == "PAYMENT", 1), else_=2).label("position"),
+            lines.c.transaction_date,
+            lines.c.entry_type,
+            lines.c.amount,
+            lines.c.voucher,
+            lines.c.amount.label("balance_change"),
+        ).where(
+            lines.c.entry_type.isnot(None),
+            lines.c.transaction_date >= start_date,
+        )
+        ledger = union_all(opening, entries).subquery("ledger")
+
+        # OPENING is dated start_date with position 0, so it sorts first
+        ledger_order = (ledger.c.transaction_date, ledger.c.position, ledger.c.voucher)
+        return select(
+            ledger.c.transaction_date,
+            ledger.c.entry_type,
+            ledger.c.amount,
+            ledger.c.voucher,
+            func.sum(ledger.c.balance_change).over(
+                order_by=ledger_order, rows=(None, 0)
+            ).label("running_balance"),
+        ).order_by(*ledger_order)
+
+    async def get_opening_snapshot(
+        self, zid: int, customer_id: str, project: str, before: date
+    ) -> Optional[CustomerBalanceSnapshot]:
+        """Latest valid balance snapshot of the customer's project with a period end before `before`"""
+        query = (
+            select(CustomerBalanceSnapshot)
+            .filter(
+                CustomerBalanceSnapshot.zid == zid,
+                CustomerBalanceSnapshot.xsub == customer_id,
+                CustomerBalanceSnapshot.xproj == project,
+                CustomerBalanceSnapshot.period_end < before,
+                ~self._invalidated(),
             )
+            .order_by(CustomerBalanceSnapshot.period_end.desc())
+            .limit(1)
+        )
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    def _invalidated():
+        """True for a snapshot that a posting queued for rebuild predates"""
+        dirty = CustomerBalanceSnapshotDirty
+        return exists().where(
+            dirty.zid == CustomerBalanceSnapshot.zid,
+            dirty.xsub == CustomerBalanceSnapshot.xsub,
+            dirty.from_date <= CustomerBalanceSnapshot.period_end,
+        )
+
+    @staticmethod
+    def _to_ledger_entry(row) -> LedgerEntry:
+        return LedgerEntry.model_validate(row, from_attributes=True)
+
+    async def stream_customer_ledger(self, zid: int, customer_id: str, start_date: date, end_date: date, current_user) -> NDJSONStream:
+        """
+        The ledger of get_customer_ledger as an NDJSON stream, OPENING row
+        first, for ranges of several years: rows go out as they are read from
+        a server-side cursor instead of being collected into a list.
+        """
+        await self.validate_user_access(zid, customer_id, current_user)
+        project = self.get_project_by_zid(zid)
+        snapshot = await self.get_opening_snapshot(zid, customer_id, project, start_date)
+        query = self.ledger_query(zid, customer_id, project, start_date, end_date, snapshot)
+        return NDJSONStream(query, self._to_ledger_entry)
 
     async def get_customer_ledger(self, zid: int, customer_id: str, start_date: date, end_date: date, current_user) -> Tuple[float, List[LedgerEntry]]:
         try:
             # Validate user access first
             await self.validate_user_access(zid, customer_id, current_user)
-            
-            # Get opening balance
-            opening_balance = await self.get_closing_balance(zid, customer_id, start_date)
-            
-            # Get payments and orders
-            payments = await self.get_payment_data(zid, customer_id, start_date, end_date)
-            orders = await self.get_order_data(zid, customer_id, start_date, end_date)
-            
-            # Process payments
-            ledger_entries = []
-            running_balance = opening_balance
-
-            # Add opening balance entry
-            ledger_entries.append(LedgerEntry(
-                transaction_date=start_date,
-                entry_type="OPENING",
-                amount=0.0,
-                voucher="N/A",
-                running_balance=opening_balance
-            ))
-
-            # Process all transactions
-            all_transactions = []
-            
-            for payment in payments:
-                all_transactions.append({
-                    'date': payment['last_pay_date'],
-                    'type': 'PAYMENT',
-                    'amount': payment['last_rec_amt'],
-                    'voucher': payment['xvoucher']
-                })
-                
-            for order in orders:
-                all_transactions.append({
-                    'date': order['last_order_date'],
-                    'type': 'ORDER',
-                    'amount': order['last_order_amt'],
-                    'voucher': order['xvoucher']
-                })
-                
-            # Sort transactions by date
-            all_transactions.sort(key=lambda x: x['date'])
-            
-            # Create ledger entries
-            for trans in all_transactions:
-                running_balance += trans['amount']
-                ledger_entries.append(LedgerEntry(
-                    transaction_date=trans['date'],
-                    entry_type=trans['type'],
-                    amount=trans['amount'],
-                    voucher=trans['voucher'],
-                    running_balance=running_balance
-                ))
-                
+
+            project = self.get_project_by_zid(zid)
+            snapshot = await self.get_opening_snapshot(zid, customer_id, project, start_date)
+            query = self.ledger_query(zid, customer_id, project, start_date, end_date, snapshot)
+            result = await self.db.execute(query)
+            ledger_entries = [self._to_ledger_entry(row) for row in result]
+
+            # The OPENING row always comes first
+            opening_balance = ledger_entries[0].running_balance
             return opening_balance, ledger_entries
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error getting customer ledger: {str(e)}")
+            logger.error("Error getting customer ledger: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error retrieving customer ledger: {str(e)}"
             )
+
+    @staticmethod
+    def _monthly_totals(before: date, zid: Optional[int] = None, customer_id: Optional[str] = None, queued=None):
+        """
+        Net GL movement per (zid, xsub, xproj, month end) before `before`,
+        opening-balance vouchers excluded. With `queued` (zid, xsub,
+        from_date rows claimed from the dirty queue) only those customers'
+        lines are read, each project after its latest snapshot before
+        from_date, whose balance is returned as `carried`.
+        """
+        h = aliased(GLHeader)
+        g = aliased(GLDetail)
+        period_end = cast(
+            # 'month' inline rather than bound, so GROUP BY matches the selected expression
+            func.date_trunc(literal_column("'month'"), h.xdate) + literal_column("INTERVAL '1 month - 1 day'"),
+            Date,
+        ).label("period_end")
+
+        carried = literal(0.0, Float)
+        query = (
+            select(g.zid, g.xsub, g.xproj, period_end, func.sum(g.xprime).label("total"))
+            .select_from(h)
+            .join(g, and_(h.xvoucher == g.xvoucher, h.zid == g.zid))
+            .filter(
+                g.xsub.isnot(None),
+                g.xproj.isnot(None),
+                ~g.xvoucher.like('%OB%'),
+                h.xdate < before,
+            )
+            .group_by(g.zid, g.xsub, g.xproj, period_end)
+        )
+        if queued is not None:
+            snapshot = CustomerBalanceSnapshot
+            last_period = (
+                select(snapshot.zid, snapshot.xsub, snapshot.xproj, func.max(snapshot.period_end).label("period_end"))
+                .join(
+                    queued,
+                    and_(
+                        queued.c.zid == snapshot.zid,
+                        queued.c.xsub == snapshot.xsub,
+                        snapshot.period_end < queued.c.from_date,
+                    ),
+                )
+                .group_by(snapshot.zid, snapshot.xsub, snapshot.xproj)
+                .subquery("last_period")
+            )
+            carry = (
+                select(snapshot.zid, snapshot.xsub, snapshot.xproj, snapshot.period_end, snapshot.balance)
+                .join(
+                    last_period,
+                    and_(
+                        last_period.c.zid == snapshot.zid,
+                        last_period.c.xsub == snapshot.xsub,
+                        last_period.c.xproj == snapshot.xproj,
+                        last_period.c.period_end == snapshot.period_end,
+                    ),
+                )
+                .subquery("carry")
+            )
+            # Driven by the queued customers, so only their lines are read (ix_gldetail_zid_xsub)
+            query = (
+                query.join(queued, and_(queued.c.zid == g.zid, queued.c.xsub == g.xsub))
+                .outerjoin(carry, and_(carry.c.zid == g.zid, carry.c.xsub == g.xsub, carry.c.xproj == g.xproj))
+                .filter(or_(carry.c.period_end.is_(None), h.xdate > carry.c.period_end))
+            )
+            carried = func.coalesce(func.max(carry.c.balance), 0)
+        if zid is not None:
+            query = query.filter(h.zid == zid, g.zid == zid)
+        if customer_id is not None:
+            query = query.filter(g.xsub == customer_id)
+        return query.add_columns(carried.label("carried")).subquery("monthly_totals")
+
+    @staticmethod
+    def _claim_statement(watermark: int, before: date, batch_size: int):
+        """
+        Dequeue up to batch_size customers whose queued postings all belong
+        to finished transactions (version below the watermark) and start in
+        a closed month. A customer re-queued by a posting still in flight
+        keeps its row for the next run.
+        """
+        dirty = CustomerBalanceSnapshotDirty
+        ready = (dirty.version < watermark, dirty.from_date < before)
+        oldest = select(dirty.zid, dirty.xsub).where(*ready).order_by(dirty.version).limit(batch_size)
+        return (
+            delete(dirty)
+            .where(tuple_(dirty.zid, dirty.xsub).in_(oldest), *ready)
+            .returning(dirty.zid, dirty.xsub, dirty.from_date)
+        )
+
+    async def _rebuild_claimed(self, claimed, before: date) -> int:
+        """Replace the claimed customers' snapshots from their from_date up to `before`"""
+        snapshot = CustomerBalanceSnapshot
+        queued = values(
+            column("zid", Integer),
+            column("xsub", String),
+            column("from_date", Date),
+            name="queued",
+        ).data([(row.zid, row.xsub, row.from_date) for row in claimed])
+
+        await self.db.execute(
+            delete(snapshot).where(
+                snapshot.zid == queued.c.zid,
+                snapshot.xsub == queued.c.xsub,
+                snapshot.period_end >= queued.c.from_date,
+            )
+        )
+
+        totals = self._monthly_totals(before, queued=queued)
+        key = (totals.c.zid, totals.c.xsub, totals.c.xproj)
+        rebuilt = await self.db.execute(
+            insert(snapshot).from_select(
+                ["zid", "xsub", "xproj", "period_end", "balance", "refreshed_at"],
+                select(
+                    *key,
+                    totals.c.period_end,
+                    totals.c.carried + func.sum(totals.c.total).over(
+                        partition_by=key, order_by=totals.c.period_end
+                    ),
+                    func.now(),
+                ),
+            )
+        )
+        return rebuilt.rowcount
+
+    async def refresh_balance_snapshots(self, batch_size: int = 500) -> int:
+        """
+        Rebuild the snapshots of the customers queued in
+        customer_balance_snapshot_dirty, batch_size customers per
+        transaction, up to the last closed month.
+
+        Only the queued customers' GL lines after their last valid snapshot
+        are read and no table is locked: a customer is claimed once every
+        transaction that queued it has finished, and a posting that commits
+        meanwhile queues it again.
+
+        Returns:
+            Number of snapshots written
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        today = date.today()
+        before = date(today.year, today.month, 1)
+        written = 0
+        try:
+            while True:
+                watermark = await high_water_mark(self.db)
+                claimed = (await self.db.execute(self._claim_statement(watermark, before, batch_size))).all()
+                if claimed:
+                    written += await self._rebuild_claimed(claimed, before)
+                await self.db.commit()
+                if len(claimed) < batch_size:
+                    return written
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    async def queue_balance_snapshots(self, zid: Optional[int] = None, customer_id: Optional[str] = None) -> int:
+        """
+        Queue every customer in scope for a rebuild from the start of
+        history; the next refresh drops and rebuilds their snapshots.
+
+        Returns:
+            Number of customers queued
+        """
+        dirty = CustomerBalanceSnapshotDirty
+        customers = select(
+            GLDetail.zid, GLDetail.xsub, literal(date.min, Date), func.txid_current()
+        ).filter(GLDetail.xsub.isnot(None)).distinct()
+        if zid is not None:
+            customers = customers.filter(GLDetail.zid == zid)
+        if customer_id is not None:
+            customers = customers.filter(GLDetail.xsub == customer_id)
+
+        upsert = insert(dirty).from_select(["zid", "xsub", "from_date", "version"], customers)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=["zid", "xsub"],
+            set_={
+                "from_date": upsert.excluded.from_date,
+                "version": func.greatest(dirty.version, upsert.excluded.version),
+            },
+        )
+        try:
+            result = await self.db.execute(upsert)
+            await self.db.commit()
+            return result.rowcount
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    async def check_balance_snapshots(
+        self, zid: Optional[int] = None, customer_id: Optional[str] = None, tolerance: float = 0.01
+    ) -> List[dict]:
+        """
+        Compare every snapshot in scope with the full sum of the customer's
+        GL lines up to its period end, in one pass over the GL. Returns the
+        snapshots that are off by more than `tolerance`. Snapshots already
+        queued for a rebuild are skipped, as readers skip them too.
+        """
+        snapshot = CustomerBalanceSnapshot
+        today = date.today()
+        totals = self._monthly_totals(date(today.year, today.month, 1), zid, customer_id)
+
+        snapshots = select(
+            snapshot.zid, snapshot.xsub, snapshot.xproj, snapshot.period_end,
+            literal(0.0, Float).label("total"), snapshot.balance.label("snapshot_balance"),
+        ).filter(~self._invalidated())
+        if zid is not None:
+            snapshots = snapshots.filter(snapshot.zid == zid)
+        if customer_id is not None:
+            snapshots = snapshots.filter(snapshot.xsub == customer_id)
+        movements = select(
+            totals.c.zid, totals.c.xsub, totals.c.xproj, totals.c.period_end,
+            totals.c.total, literal(None, Float).label("snapshot_balance"),
+        )
+        combined = union_all(movements, snapshots).subquery("combined")
+
+        key = (combined.c.zid, combined.c.xsub, combined.c.xproj)
+        # A month's movement sorts before the snapshot of the same month end
+        running = select(
+            *key,
+            combined.c.period_end,
+            combined.c.snapshot_balance,
+            func.coalesce(func.sum(combined.c.total).over(
+                partition_by=key,
+                order_by=(combined.c.period_end, combined.c.snapshot_balance.isnot(None)),
+                rows=(None, 0),
+            ), 0).label("gl_balance"),
+        ).subquery("running")
+
+        query = (
+            select(running)
+            .filter(
+                running.c.snapshot_balance.isnot(None),
+                func.abs(running.c.snapshot_balance - running.c.gl_balance) > tolerance,
+            )
+            .order_by(running.c.zid, running.c.xsub, running.c.xproj, running.c.period_end)
+        )
+        result = await self.db.execute(query)
+        return [dict(row._mapping) for row in result]
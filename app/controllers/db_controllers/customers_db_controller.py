@@ -1,14 +1,18 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, and_
-from models.customers_model import Cacus
+from sqlalchemy import select, or_, and_, func, text, true, tuple_, union, update
+from sqlalchemy.dialects.postgresql import insert
+from models.customers_model import Cacus, CustomerAssignment
 from schemas.user_schema import UserRegistrationSchema
 from utils.auth import get_current_normal_user
-from schemas.customers_schema import CustomersSchema, CustomerOfferSchema
-from typing import List
+from schemas.customers_schema import CustomersSchema, CustomerOfferSchema, CustomerChangesSchema, CustomerKeySchema
+from typing import List, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from logs import setup_logger
+from utils.pagination import keyset_after, paginate
+from utils.delta_sync import high_water_mark
+from utils.streaming import NDJSONStream
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class CustomersDBController:
     """Controller for handling customer-related database operations."""
@@ -17,12 +21,48 @@ class CustomersDBController:
         super().__init__()
         self.db = db  # Use the session passed in from the route handler
 
+    @staticmethod
+    def _assigned_to(employee_id: str):
+        """
+        Join condition from cacus to the salesman's active rows in
+        customer_assignments: one index range scan instead of a four-way
+        OR over xsp, xsp1, xsp2 and xsp3.
+        """
+        return and_(
+            CustomerAssignment.employee_id == employee_id,
+            CustomerAssignment.active,
+            CustomerAssignment.zid == Cacus.zid,
+            CustomerAssignment.xcus == Cacus.xcus,
+        )
+
+    @staticmethod
+    def _to_schema(customer) -> CustomersSchema:
+        return CustomersSchema(
+            zid=customer.zid,
+            xcus=customer.xcus,
+            xorg=customer.xorg,
+            xadd1=customer.xadd1,
+            xcity=customer.xcity,
+            xstate=customer.xstate,
+            xmobile=customer.xmobile,
+            xtaxnum=customer.xtaxnum,
+            xsp=customer.xsp,
+            xsp1=customer.xsp1,
+            xsp2=customer.xsp2,
+            xsp3=customer.xsp3,
+            # Split the xtitle at hyphen and take first part
+            xtitle=customer.xtitle.split('-')[0] if customer.xtitle else None,
+            xfax=customer.xfax, 
+            xcreditr=customer.xcreditr
+        )
+
    
 
     async def get_all_customers(
         self, zid: int, customer: str, employee_id:str, limit: int, offset: int,  current_user: UserRegistrationSchema = Depends(get_current_normal_user),
-    ) -> List[CustomersSchema]: 
-        """Get all customers based on filter criteria."""
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[CustomersSchema], Optional[str]]: 
+        """Get all customers based on filter criteria, with the cursor for the next page."""
         if self.db is None:
             raise Exception("Database session not initialized.")
  
@@ -47,8 +87,9 @@ class CustomersDBController:
                     Cacus.xfax.label("xfax"),
                     Cacus.xcreditr.label("xcreditr"),
                 )
+                .join(CustomerAssignment, self._assigned_to(user_id))
                 .filter(
-                    Cacus.zid == zid,
+                    CustomerAssignment.zid == zid,
                     or_(
                         Cacus.xcus.ilike(f"%{customer}%"),
                         Cacus.xorg.ilike(f"%{customer}%"),
@@ -56,23 +97,21 @@ class CustomersDBController:
                         Cacus.xtaxnum.ilike(f"%{customer}%"),
                         Cacus.xmobile.ilike(f"%{customer}%"),
                     ),
-                    and_(
-                        or_(
-                            Cacus.xsp == user_id,
-                            Cacus.xsp1 == user_id,
-                            Cacus.xsp2 == user_id,
-                            Cacus.xsp3 == user_id
-                        )
-                    )
                 )
-                .order_by(Cacus.xcus)
-                .limit(limit)
-                .offset(offset)
             )
 
+            # Keyset pagination when a cursor is given, otherwise limit and offset
+            order_by = [CustomerAssignment.xcus]
+            if cursor:
+                stmt = stmt.filter(keyset_after(order_by, cursor))
+                offset = 0
+            stmt = stmt.order_by(*order_by).limit(limit + 1).offset(offset)
+
             # Execute the query asynchronously
             result = await self.db.execute(stmt)
-            customers_records = result.fetchall()
+            customers_records, next_cursor = paginate(
+                result.fetchall(), limit, lambda row: [row.xcus]
+            )
 
             # Check if we found any customers before processing
             if not customers_records:
@@ -80,84 +119,70 @@ class CustomersDBController:
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"No customers found for employee ID: {user_id}"
                 )            # Convert query results to list of CustomersSchema instances
-            customers = [
-                CustomersSchema(
-                    zid=customer.zid,
-                    xcus=customer.xcus,
-                    xorg=customer.xorg,
-                    xadd1=customer.xadd1,
-                    xcity=customer.xcity,
-                    xstate=customer.xstate,
-                    xmobile=customer.xmobile,
-                    xtaxnum=customer.xtaxnum,
-                    xsp=customer.xsp,
-                    xsp1=customer.xsp1,
-                    xsp2=customer.xsp2,
-                    xsp3=customer.xsp3,
-                    # Split the xtitle at hyphen and take first part
-                    xtitle=customer.xtitle.split('-')[0] if customer.xtitle else None,
-                    xfax=customer.xfax, 
-                    xcreditr=customer.xcreditr
-                )
-                for customer in customers_records
-            ]
+            customers = [self._to_schema(customer) for customer in customers_records]
 
-            return customers
+            return customers, next_cursor
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error getting customers for employee {employee_id}: {str(e)}")
+            logger.error("Error getting customers for employee %s: %s", employee_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error retrieving customer information"
             )
         
+    @classmethod
+    def _customers_sync_query(cls, employee_id: str):
+        """Query for a salesman's customers across all businesses and its ORDER BY terms."""
+        # Construct the query without zid filter
+        stmt = (
+            select(
+                Cacus.zid.label("zid"),
+                Cacus.xcus.label("xcus"),
+                Cacus.xorg.label("xorg"),
+                Cacus.xadd1.label("xadd1"),
+                Cacus.xcity.label("xcity"),
+                Cacus.xstate.label("xstate"),
+                Cacus.xmobile.label("xmobile"),
+                Cacus.xtaxnum.label("xtaxnum"),
+                Cacus.xsp.label("xsp"),
+                Cacus.xsp1.label("xsp1"),
+                Cacus.xsp2.label("xsp2"),
+                Cacus.xsp3.label("xsp3"),
+                Cacus.xtitle.label("xtitle"),
+                Cacus.xfax.label("xfax"),
+                Cacus.xcreditr.label("xcreditr"),
+            )
+            .join(CustomerAssignment, cls._assigned_to(employee_id))
+        )
+
+        # xcus repeats across businesses, so zid breaks ties for a stable keyset order
+        order_by = [CustomerAssignment.xcus, CustomerAssignment.zid]
+        return stmt, order_by
+
     async def get_all_customers_sync(
         self, employee_id: str, limit: int, offset: int, current_user: UserRegistrationSchema = Depends(get_current_normal_user),
-    ) -> List[CustomersSchema]:
-        """Get all customers across all businesses for a specific employee ID."""
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[CustomersSchema], Optional[str]]:
+        """Get all customers across all businesses for a specific employee ID, with the cursor for the next page."""
         if self.db is None:
             raise Exception("Database session not initialized.")
             
         try:
             user_id = employee_id
             
-            # Construct the async query without zid filter
-            stmt = (
-                select(
-                    Cacus.zid.label("zid"),
-                    Cacus.xcus.label("xcus"),
-                    Cacus.xorg.label("xorg"),
-                    Cacus.xadd1.label("xadd1"),
-                    Cacus.xcity.label("xcity"),
-                    Cacus.xstate.label("xstate"),
-                    Cacus.xmobile.label("xmobile"),
-                    Cacus.xtaxnum.label("xtaxnum"),
-                    Cacus.xsp.label("xsp"),
-                    Cacus.xsp1.label("xsp1"),
-                    Cacus.xsp2.label("xsp2"),
-                    Cacus.xsp3.label("xsp3"),
-                    Cacus.xtitle.label("xtitle"),
-                    Cacus.xfax.label("xfax"),
-                    Cacus.xcreditr.label("xcreditr"),
-                )
-                .filter(
-                    or_(
-                        Cacus.xsp == user_id,
-                        Cacus.xsp1 == user_id,
-                        Cacus.xsp2 == user_id,
-                        Cacus.xsp3 == user_id
-                    )
-                )
-                .order_by(Cacus.xcus)
-                .limit(limit)
-                .offset(offset)
-            )
+            stmt, order_by = self._customers_sync_query(user_id)
+            if cursor:
+                stmt = stmt.filter(keyset_after(order_by, cursor))
+                offset = 0
+            stmt = stmt.order_by(*order_by).limit(limit + 1).offset(offset)
 
             # Execute the query asynchronously
             result = await self.db.execute(stmt)
-            customers_records = result.fetchall()
+            customers_records, next_cursor = paginate(
+                result.fetchall(), limit, lambda row: [row.xcus, row.zid]
+            )
 
             # Check if we found any customers before processing
             if not customers_records:
@@ -167,39 +192,178 @@ class CustomersDBController:
                 )
 
             # Convert query results to list of CustomersSchema instances
-            customers = [
-                CustomersSchema(
-                    zid=customer.zid,
-                    xcus=customer.xcus,
-                    xorg=customer.xorg,
-                    xadd1=customer.xadd1,
-                    xcity=customer.xcity,
-                    xstate=customer.xstate,
-                    xmobile=customer.xmobile,
-                    xtaxnum=customer.xtaxnum,
-                    xsp=customer.xsp,
-                    xsp1=customer.xsp1,
-                    xsp2=customer.xsp2,
-                    xsp3=customer.xsp3,
-                    # Split the xtitle at hyphen and take first part
-                    xtitle=customer.xtitle.split('-')[0] if customer.xtitle else None,
-                    xfax=customer.xfax, 
-                    xcreditr=customer.xcreditr
-                )
-                for customer in customers_records
-            ]
+            customers = [self._to_schema(customer) for customer in customers_records]
 
-            return customers
+            return customers, next_cursor
             
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error getting synchronized customers for employee {employee_id}: {str(e)}")
+            logger.error("Error getting synchronized customers for employee %s: %s", employee_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error retrieving customer information"
             )
 
+    @classmethod
+    def stream_all_customers_sync(
+        cls, employee_id: str, limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> NDJSONStream:
+        """
+        A salesman's customers across all businesses as an NDJSON stream, read
+        through a server-side cursor so memory stays flat for any list size.
+        The query is built (and the cursor validated) before the response starts.
+        """
+        stmt, order_by = cls._customers_sync_query(employee_id)
+        if cursor:
+            stmt = stmt.filter(keyset_after(order_by, cursor))
+        stmt = stmt.order_by(*order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return NDJSONStream(stmt, cls._to_schema)
+
+    async def get_customer_changes(
+        self, employee_id: str, since: int, limit: int, cursor: Optional[str] = None
+    ) -> CustomerChangesSchema:
+        """
+        Customers added, changed or reassigned for a salesman since the
+        client's last sync version. Customers taken off the salesman (by
+        update_salesman_by_area or the ERP) or deleted come back as deletes.
+        Versions are transaction ids stamped by the customer_assignments
+        triggers; see utils.delta_sync.high_water_mark.
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        try:
+            high_water = await high_water_mark(self.db)
+            if since > high_water:
+                # A version this database never issued (e.g. restored from a backup)
+                return CustomerChangesSchema(since=since, version=0, full_resync=True, upserts=[], deletes=[])
+
+            order_by = [CustomerAssignment.version, CustomerAssignment.zid, CustomerAssignment.xcus]
+            stmt = select(
+                CustomerAssignment.zid, CustomerAssignment.xcus,
+                CustomerAssignment.active, CustomerAssignment.version,
+            ).filter(
+                CustomerAssignment.employee_id == employee_id,
+                CustomerAssignment.version >= since,
+                CustomerAssignment.version < high_water,
+            )
+            if cursor:
+                stmt = stmt.filter(keyset_after(order_by, cursor))
+            result = await self.db.execute(stmt.order_by(*order_by).limit(limit + 1))
+            changed, next_cursor = paginate(
+                result.fetchall(), limit, lambda row: [row.version, row.zid, row.xcus]
+            )
+
+            upserts = []
+            assigned = [(row.zid, row.xcus) for row in changed if row.active]
+            if assigned:
+                result = await self.db.execute(
+                    select(Cacus).filter(tuple_(Cacus.zid, Cacus.xcus).in_(assigned))
+                )
+                upserts = [self._to_schema(customer) for customer in result.scalars().all()]
+
+            present = {(customer.zid, customer.xcus) for customer in upserts}
+            deletes = [
+                CustomerKeySchema(zid=row.zid, xcus=row.xcus)
+                for row in changed
+                if (row.zid, row.xcus) not in present
+            ]
+
+            return CustomerChangesSchema(
+                since=since,
+                # Keep the old version until the last page so an interrupted sync resumes safely
+                version=since if next_cursor else high_water,
+                upserts=upserts,
+                deletes=deletes,
+                next_cursor=next_cursor,
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error getting customer changes for employee %s: %s", employee_id, e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error retrieving customer changes"
+            )
+
+    async def refresh_customer_assignments(self, zid: Optional[int] = None) -> int:
+        """
+        Re-derive customer_assignments from the salesman columns of cacus.
+
+        The cacus triggers keep the table current on their own; this is the
+        reconciliation path after a bulk load that ran with triggers disabled.
+        Pairs missing from the table are added or reactivated and pairs no
+        longer on cacus are deactivated, both with a new version so delta
+        sync clients pick them up.
+
+        Args:
+            zid: Optional business ID to limit the refresh to
+
+        Returns:
+            Number of assignment rows written
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        pairs = []
+        for column in (Cacus.xsp, Cacus.xsp1, Cacus.xsp2, Cacus.xsp3):
+            pair = select(column.label("employee_id"), Cacus.zid, Cacus.xcus).filter(
+                column.isnot(None), column != ""
+            )
+            if zid is not None:
+                pair = pair.filter(Cacus.zid == zid)
+            pairs.append(pair)
+        assigned = union(*pairs).subquery("assigned")
+
+        upsert = insert(CustomerAssignment).from_select(
+            ["employee_id", "zid", "xcus", "active", "version", "changed_at"],
+            select(
+                assigned.c.employee_id,
+                assigned.c.zid,
+                assigned.c.xcus,
+                true(),
+                func.txid_current(),
+                func.now(),
+            ),
+        )
+        upsert = upsert.on_conflict_do_update(
+            index_elements=["employee_id", "zid", "xcus"],
+            set_={
+                "active": True,
+                "version": upsert.excluded.version,
+                "changed_at": upsert.excluded.changed_at,
+            },
+            where=~CustomerAssignment.active,
+        )
+
+        still_assigned = select(assigned.c.employee_id).filter(
+            assigned.c.employee_id == CustomerAssignment.employee_id,
+            assigned.c.zid == CustomerAssignment.zid,
+            assigned.c.xcus == CustomerAssignment.xcus,
+        ).exists()
+        deactivate = (
+            update(CustomerAssignment)
+            .where(CustomerAssignment.active, ~still_assigned)
+            .values(active=False, version=func.txid_current(), changed_at=func.now())
+        )
+        if zid is not None:
+            deactivate = deactivate.where(CustomerAssignment.zid == zid)
+
+        try:
+            # Keep cacus writers out so trigger updates can't interleave with the rebuild
+            await self.db.execute(text("LOCK TABLE cacus IN SHARE MODE"))
+            added = await self.db.execute(upsert)
+            removed = await self.db.execute(deactivate)
+            await self.db.commit()
+            return added.rowcount + removed.rowcount
+        except Exception:
+            await self.db.rollback()
+            raise
+
     async def get_salesman_by_area(self, zid: int, area: str):
         """Get salesman information for a specific area."""
         if self.db is None:
@@ -237,7 +401,7 @@ class CustomersDBController:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error getting salesman info for area {area}: {str(e)}")
+            logger.error("Error getting salesman info for area %s: %s", area, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error retrieving salesman information"
@@ -295,7 +459,7 @@ class CustomersDBController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error updating salesman assignments for area {area}: {str(e)}")
+            logger.error("Error updating salesman assignments for area %s: %s", area, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error updating salesman assignments"
@@ -311,14 +475,10 @@ class CustomersDBController:
             query = select(Cacus.xcity).distinct().filter(Cacus.zid == zid)
             
             if user_id:
-                query = query.filter(
-                    or_(
-                        Cacus.xsp == user_id,
-                        Cacus.xsp1 == user_id,
-                        Cacus.xsp2 == user_id,
-                        Cacus.xsp3 == user_id
-                    )
-                )
+                query = query.join(CustomerAssignment, self._assigned_to(user_id))
+
+            # A stable order keeps the response body, and so its ETag, unchanged between calls
+            query = query.order_by(Cacus.xcity)
             
             result = await self.db.execute(query)
             areas = [row[0] for row in result.fetchall() if row[0]]  # Filter out None values
@@ -334,7 +494,7 @@ class CustomersDBController:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error getting areas for zid {zid}: {str(e)}")
+            logger.error("Error getting areas for zid %s: %s", zid, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error retrieving areas"
@@ -379,7 +539,7 @@ class CustomersDBController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error updating offers for zid {request.zid} segment {request.xtitle}: {str(e)}")
+            logger.error("Error updating offers for zid %s segment %s: %s", request.zid, request.xtitle, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error updating customer offers"
@@ -429,7 +589,7 @@ class CustomersDBController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error checking/setting monitoring offer for customer {xcus}: {str(e)}")
+            logger.error("Error checking/setting monitoring offer for customer %s: %s", xcus, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error checking/setting monitoring offer"
@@ -480,7 +640,7 @@ class CustomersDBController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error checking/setting default offer for customer {xcus}: {str(e)}")
+            logger.error("Error checking/setting default offer for customer %s: %s", xcus, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error checking/setting default offer"
@@ -5,12 +5,13 @@ from models.feedback_model import Feedback
 from models.customers_model import Cacus
 from models.items_model import Caitem
 from schemas.feedback_schema import FeedbackCreate, FeedbackResponse, FeedbackQuery
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from fastapi import HTTPException, status
 from logs import setup_logger
+from utils.pagination import keyset_after, paginate
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class FeedbackDBController:
     """Controller for handling feedback-related database operations."""
@@ -38,7 +39,7 @@ class FeedbackDBController:
                 
                 if not customer:
                     # Customer not found, set to None instead of raising an error
-                    logger.warning(f"Customer {feedback_data.customer_id} not found in business {feedback_data.zid}, setting to None")
+                    logger.warning("Customer %s not found in business %s, setting to None", feedback_data.customer_id, feedback_data.zid)
                     feedback_data.customer_id = None
             
             # Verify product exists (only if product_id is provided)
@@ -72,11 +73,11 @@ class FeedbackDBController:
                             feedback_data.product_id = product.xitem
                         else:
                             # Product not found, set to None instead of raising an error
-                            logger.warning(f"Product {feedback_data.product_id} not found, setting to None")
+                            logger.warning("Product %s not found, setting to None", feedback_data.product_id)
                             feedback_data.product_id = None
                     except (ValueError, TypeError):
                         # Product not found, set to None instead of raising an error
-                        logger.warning(f"Product {feedback_data.product_id} not found, setting to None")
+                        logger.warning("Product %s not found, setting to None", feedback_data.product_id)
                         feedback_data.product_id = None
             
             # Create feedback object with base data
@@ -117,20 +118,20 @@ class FeedbackDBController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error creating feedback: {str(e)}")
+            logger.error("Error creating feedback: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error creating feedback: {str(e)}"
             )
 
-    async def get_feedbacks(self, query_params: FeedbackQuery) -> List[Dict[str, Any]]:
-        """Get feedback entries with applied filters."""
+    async def get_feedbacks(self, query_params: FeedbackQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get feedback entries with applied filters, and the cursor for the next page."""
         if self.db is None:
             raise Exception("Database session not initialized.")
         
         try:
             # Debug log query parameters
-            logger.info(f"Feedback search parameters: {query_params}")
+            logger.info("Feedback search parameters: %s", query_params)
             
             # Start building the query
             query = select(Feedback)
@@ -166,21 +167,29 @@ class FeedbackDBController:
             elif query_params.end_date is not None:
                 query = query.filter(Feedback.created_at <= query_params.end_date)
             
-            # Add ordering, limit and offset
-            query = query.order_by(Feedback.created_at.desc())
+            # Add ordering, limit and offset; id breaks ties between equal timestamps
+            order_by = [Feedback.created_at.desc(), Feedback.id.desc()]
+            if query_params.cursor:
+                query = query.filter(keyset_after(order_by, query_params.cursor))
+            query = query.order_by(*order_by)
             
             if query_params.limit is not None:
-                query = query.limit(query_params.limit)
+                query = query.limit(query_params.limit + 1)
                 
-            if query_params.offset is not None:
+            if query_params.offset is not None and not query_params.cursor:
                 query = query.offset(query_params.offset)
             
             # Execute the query
             result = await self.db.execute(query)
             feedbacks = result.scalars().all()
+            next_cursor = None
+            if query_params.limit is not None:
+                feedbacks, next_cursor = paginate(
+                    feedbacks, query_params.limit, lambda feedback: [feedback.created_at, feedback.id]
+                )
             
             # Log the number of results
-            logger.info(f"Found {len(feedbacks)} feedback entries matching the criteria")
+            logger.info("Found %s feedback entries matching the criteria", len(feedbacks))
             
             # Convert to response format
             response_feedbacks = []
@@ -200,10 +209,12 @@ class FeedbackDBController:
                     "user_id": feedback.user_id
                 })
             
-            return response_feedbacks
+            return response_feedbacks, next_cursor
             
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error getting feedbacks: {str(e)}")
+            logger.error("Error getting feedbacks: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error getting feedbacks: {str(e)}"
@@ -1,11 +1,23 @@
 from sqlalchemy.orm import Session
-from models.items_model import Caitem, Imtrn, Opspprc, FinalItemsView
-from schemas.items_schema import ItemsBaseSchema, ItemsSchema
-from sqlalchemy import func, or_, and_
+from models.items_model import Caitem, Imtrn, Opspprc, FinalItemsView, StockBalance, ItemVersion
+from schemas.items_schema import ItemsBaseSchema, ItemsSchema, ItemChangesSchema, ItemKeySchema
+from sqlalchemy import func, and_, case, delete, literal_column, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql.functions import coalesce
-from typing import Union, List
+from typing import Union, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from utils.item_search import build_item_search
+from utils.pagination import keyset_after, paginate
+from utils.delta_sync import high_water_mark
+from utils.streaming import NDJSONStream
+
+# Sales warehouse whose stock is shown to salesmen for each business
+SALES_WAREHOUSES = {
+    100001: "HMBR -Main Store (4th Floor)",
+    100000: "Sales Warehouse GI",
+    100005: "Sales Warehouse(Zepto)",
+}
 
 
 class ItemsDBController:
@@ -16,44 +28,13 @@ class ItemsDBController:
         super().__init__()
         self.db = db  # Use the session passed in from the route handler
 
-    async def get_all_items(
-        self, zid: int, item_name: Union[str, None], limit: int, offset: int
-        ) -> List[ItemsSchema]:
-        """       
-         Retrieve all items for a specific business ID (zid) with optional filtering and pagination.
-        Args:
-            zid: The business ID to filter items
-            item_name: Optional item name or ID to filter results
-            limit: Maximum number of items to return
-            offset: Number of items to skip for pagination
-        Returns:
-            A list of ItemsSchema instances containing item details
+    @staticmethod
+    def _catalog_query(warehouse):
         """
-        if self.db is None:
-            raise Exception("Database session not initialized.")
-
-        # Define the warehouse condition dynamically based on zid
-        xwh_condition = (
-            (Imtrn.zid == 100001) & (Imtrn.xwh == 'HMBR -Main Store (4th Floor)') |
-            (Imtrn.zid == 100000) & (Imtrn.xwh == 'Sales Warehouse GI') |
-            (Imtrn.zid == 100005) & (Imtrn.xwh == 'Sales Warehouse(Zepto)')
-        )
-
-        # Define the CTE for transaction summary with xwh filtering
-        transaction_summary_query = (
-            select(
-                Imtrn.zid,
-                Imtrn.xitem,
-                func.sum(Imtrn.xqty * Imtrn.xsign).label("stock")
-            )
-            .filter(xwh_condition)
-            .group_by(Imtrn.zid, Imtrn.xitem)
-        )
-
-        transaction_summary = transaction_summary_query.cte("transaction_summary")
-
-        # Build base query
-        query = (
+        Items joined to their stock ledger row in `warehouse` (a name, or an
+        expression of Caitem.zid) and their discount terms, one row per item.
+        """
+        return (
             select(
                 Caitem.zid.label("zid"),
                 Caitem.xitem.label("item_id"),
@@ -62,31 +43,19 @@ class ItemsDBController:
                 Caitem.xstdprice.label("std_price"),
                 Caitem.xunitstk.label("stock_unit"),
                 Caitem.xbin.label("xbin"),  # Added xbin for product image
-                transaction_summary.c.stock,
+                StockBalance.stock.label("stock"),
+                StockBalance.updated_at.label("stock_updated_at"),
                 func.coalesce(func.min(Opspprc.xqty), 0).label("min_disc_qty"),
                 func.coalesce(func.min(Opspprc.xdisc), 0).label("disc_amt"),
             )
-            .join(transaction_summary, 
-                (Caitem.xitem == transaction_summary.c.xitem) & 
-                (Caitem.zid == transaction_summary.c.zid))
+            .join(StockBalance,
+                (StockBalance.zid == Caitem.zid) &
+                (StockBalance.xwh == warehouse) &
+                (StockBalance.xitem == Caitem.xitem))
             .outerjoin(Opspprc, 
                     (Caitem.xitem == Opspprc.xpricecat) & 
                     (Caitem.zid == Opspprc.zid))
-            .filter(Caitem.zid == zid)
-        )
-
-        # Add item search filter only if item_name is provided
-        if item_name:
-            query = query.filter(
-                or_(
-                    Caitem.xdesc.ilike(f"%{item_name}%"),
-                    Caitem.xitem.ilike(f"%{item_name}%"),
-                    Caitem.xgitem.ilike(f"%{item_name}%"),
-                )
-            )
-        # Group by, order by, limit, offset
-        query = (
-            query.group_by(
+            .group_by(
                 Caitem.zid,
                 Caitem.xitem,
                 Caitem.xdesc,
@@ -94,15 +63,65 @@ class ItemsDBController:
                 Caitem.xstdprice,
                 Caitem.xunitstk,
                 Caitem.xbin,
-                transaction_summary.c.stock,
+                StockBalance.stock,
+                StockBalance.updated_at,
             )
-            .order_by(Caitem.xitem)
-            .limit(limit)
-            .offset(offset)
         )
 
+    async def get_all_items(
+        self, zid: int, item_name: Union[str, None], limit: int, offset: int,
+        cursor: Optional[str] = None,
+        ) -> Tuple[List[ItemsSchema], Optional[str]]:
+        """       
+         Retrieve all items for a specific business ID (zid) with optional filtering and pagination.
+        Args:
+            zid: The business ID to filter items
+            item_name: Optional item name or ID to filter results
+            limit: Maximum number of items to return
+            offset: Number of items to skip for pagination, ignored when a cursor is given
+            cursor: Optional cursor from a previous page; continues after its last item
+        Returns:
+            A list of ItemsSchema instances containing item details, and the
+            cursor for the next page (None on the last page)
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        warehouse = SALES_WAREHOUSES.get(zid)
+        if warehouse is None:
+            return [], None
+
+        # Stock comes from the maintained ledger: one primary key lookup per item
+        query = self._catalog_query(warehouse).filter(Caitem.zid == zid)
+
+        # Ranked trigram search over code, name and group when a term is given;
+        # the rank and similarity are selected so the next cursor can carry them
+        order_by = [Caitem.xitem]
+        if item_name and item_name.strip():
+            search = build_item_search(item_name, Caitem.xitem, Caitem.xdesc, Caitem.xgitem)
+            query = query.add_columns(
+                search.rank.label("search_rank"), search.similarity.label("search_similarity")
+            ).filter(search.condition)
+            order_by = [search.rank, search.similarity.desc(), Caitem.xitem]
+
+        # Keyset pagination: seek past the cursor instead of skipping rows
+        if cursor:
+            query = query.filter(keyset_after(order_by, cursor))
+            offset = 0
+
+        # Order by, limit, offset
+        query = query.order_by(*order_by).limit(limit + 1).offset(offset)
+
         # Execute asynchronously
         result = await self.db.execute(query)
+        rows, next_cursor = paginate(
+            result.fetchall(),
+            limit,
+            lambda row: (
+                [row.search_rank, row.search_similarity, row.item_id]
+                if len(order_by) > 1 else [row.item_id]
+            ),
+        )
 
         # Map results to schema
         items = [
@@ -115,17 +134,19 @@ class ItemsDBController:
                 stock=item.stock,
                 min_disc_qty=item.min_disc_qty,
                 disc_amt=item.disc_amt,
+                stock_updated_at=item.stock_updated_at,
             )
-            for item in result.fetchall()
+            for item in rows
         ]
 
-        return items
+        return items, next_cursor
     
-    async def get_all_items_sync(
-        self, item_name: Union[str, None], limit: int, offset: int
-    ) -> List[ItemsSchema]:
-        if self.db is None:
-            raise Exception("Database session not initialized.")        
+    @staticmethod
+    def _items_sync_query(item_name: Union[str, None]):
+        """
+        Query over final_items_view for the sync endpoints and its ORDER BY
+        terms: (item_id, zid), or ranked trigram search when a term is given.
+        """
         # Start the query to select data from the view
         query = select(
             # Select all columns from the final_items_view (since the view already has them)
@@ -140,37 +161,167 @@ class ItemsDBController:
             FinalItemsView.xbin,  # Added xbin for product image
         ).select_from(FinalItemsView)
 
-        # Add item search filter if item_name is provided
-        if item_name:
-            query = query.filter(
-                or_(
-                    FinalItemsView.item_name.ilike(f"%{item_name}%"),
-                    FinalItemsView.item_id.ilike(f"%{item_name}%"),
-                    FinalItemsView.item_group.ilike(f"%{item_name}%")
-                )
+        # A stable order over (item_id, zid) so pages neither repeat nor skip items;
+        # ranked trigram search over code, name and group when a term is given
+        order_by = [FinalItemsView.item_id, FinalItemsView.zid]
+        if item_name and item_name.strip():
+            search = build_item_search(
+                item_name, FinalItemsView.item_id, FinalItemsView.item_name, FinalItemsView.item_group
             )
+            query = query.add_columns(
+                search.rank.label("search_rank"), search.similarity.label("search_similarity")
+            ).filter(search.condition)
+            order_by = [search.rank, search.similarity.desc(), *order_by]
 
-        # Add pagination (limit and offset)
-        query = query.limit(limit).offset(offset)
+        return query, order_by
+
+    @staticmethod
+    def _sync_item_schema(item) -> ItemsSchema:
+        return ItemsSchema(
+            zid=item.zid,
+            item_id=item.item_id,
+            item_name=item.item_name,
+            item_group=item.item_group,
+            std_price=item.std_price,
+            stock=item.stock,
+            min_disc_qty=item.min_disc_qty,
+            disc_amt=item.disc_amt,
+            xbin=item.xbin,  # Added xbin for product image
+        )
+
+    async def get_all_items_sync(
+        self, item_name: Union[str, None], limit: int, offset: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[ItemsSchema], Optional[str]]:
+        if self.db is None:
+            raise Exception("Database session not initialized.")        
+        query, order_by = self._items_sync_query(item_name)
+
+        # Keyset pagination when a cursor is given, otherwise limit and offset
+        if cursor:
+            query = query.filter(keyset_after(order_by, cursor))
+            offset = 0
+        query = query.order_by(*order_by).limit(limit + 1).offset(offset)
 
         # Execute the main query asynchronously
-        result = await self.db.execute(query)        # Convert the query results to a list of ItemsSchema instances
-        items = [
-            ItemsSchema(
-                zid=item.zid,
-                item_id=item.item_id,
-                item_name=item.item_name,
-                item_group=item.item_group,
-                std_price=item.std_price,
-                stock=item.stock,
-                min_disc_qty=item.min_disc_qty,
-                disc_amt=item.disc_amt,
-                xbin=item.xbin,  # Added xbin for product image
+        result = await self.db.execute(query)
+        rows, next_cursor = paginate(
+            result.fetchall(),
+            limit,
+            lambda row: (
+                [row.search_rank, row.search_similarity, row.item_id, row.zid]
+                if len(order_by) > 2 else [row.item_id, row.zid]
+            ),
+        )
+        # Convert the query results to a list of ItemsSchema instances
+        items = [self._sync_item_schema(item) for item in rows]
+        return items, next_cursor
+
+    @classmethod
+    def stream_all_items_sync(
+        cls, item_name: Union[str, None], limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> NDJSONStream:
+        """
+        The sync catalog as an NDJSON stream, read through a server-side
+        cursor so memory stays flat however many items are returned.
+
+        Args:
+            item_name: Optional item name or ID to filter results
+            limit: Optional maximum number of items; all items when None
+            cursor: Optional X-Next-Cursor from a paged sync to continue after
+        Returns:
+            An NDJSONStream; the query is built (and the cursor validated) up
+            front, rows are only read once the response is sent
+        """
+        query, order_by = cls._items_sync_query(item_name)
+        if cursor:
+            query = query.filter(keyset_after(order_by, cursor))
+        query = query.order_by(*order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        return NDJSONStream(query, cls._sync_item_schema)
+
+    async def get_item_changes(
+        self, since: int, limit: int, cursor: Optional[str] = None
+    ) -> ItemChangesSchema:
+        """
+        Items whose catalog row, prices or stock changed since a client's
+        last sync version, as upserts and deletes.
+
+        Versions are transaction ids stamped by the item_versions triggers;
+        see utils.delta_sync.high_water_mark for why the new version is safe.
+
+        Args:
+            since: `version` from the client's previous completed sync, 0 for everything
+            limit: Maximum number of changed items per page
+            cursor: Optional next_cursor of the previous page of this sync
+        Returns:
+            An ItemChangesSchema; `version` is the new high-water mark once
+            the last page (no next_cursor) has been reached
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        high_water = await high_water_mark(self.db)
+        if since > high_water:
+            # A version this database never issued (e.g. restored from a backup)
+            return ItemChangesSchema(since=since, version=0, full_resync=True, upserts=[], deletes=[])
+
+        order_by = [ItemVersion.version, ItemVersion.zid, ItemVersion.xitem]
+        query = select(ItemVersion.zid, ItemVersion.xitem, ItemVersion.version).filter(
+            ItemVersion.version >= since,
+            ItemVersion.version < high_water,
+        )
+        if cursor:
+            query = query.filter(keyset_after(order_by, cursor))
+        result = await self.db.execute(query.order_by(*order_by).limit(limit + 1))
+        changed, next_cursor = paginate(
+            result.fetchall(), limit, lambda row: [row.version, row.zid, row.xitem]
+        )
+
+        upserts = []
+        if changed:
+            # Current state of the changed items, with stock from each business's sales warehouse
+            warehouse = case(SALES_WAREHOUSES, value=Caitem.zid)
+            result = await self.db.execute(
+                self._catalog_query(warehouse).filter(
+                    tuple_(Caitem.zid, Caitem.xitem).in_([(row.zid, row.xitem) for row in changed])
+                )
             )
-            for item in result.fetchall()
+            upserts = [
+                ItemsSchema(
+                    zid=item.zid,
+                    item_id=item.item_id,
+                    item_name=item.item_name,
+                    item_group=item.item_group,
+                    std_price=item.std_price,
+                    stock=item.stock,
+                    min_disc_qty=item.min_disc_qty,
+                    disc_amt=item.disc_amt,
+                    xbin=item.xbin,
+                    stock_updated_at=item.stock_updated_at,
+                )
+                for item in result.fetchall()
+            ]
+
+        # Changed items that no longer make it into the catalog were deleted
+        # or lost their sales warehouse stock row; the client drops them
+        present = {(item.zid, item.item_id) for item in upserts}
+        deletes = [
+            ItemKeySchema(zid=row.zid, item_id=row.xitem)
+            for row in changed
+            if (row.zid, row.xitem) not in present
         ]
-        return items
-        
+
+        return ItemChangesSchema(
+            since=since,
+            # Keep the old version until the last page so an interrupted sync resumes safely
+            version=since if next_cursor else high_water,
+            upserts=upserts,
+            deletes=deletes,
+            next_cursor=next_cursor,
+        )
+
     async def get_single_item(self, zid: int, item_id: str) -> Union[ItemsSchema, None]:
         """
         Retrieve a single item based on zid and item_id.
@@ -185,15 +336,19 @@ class ItemsDBController:
         if self.db is None:
             raise Exception("Database session not initialized.")
 
-        # Define the CTE for transaction summary
-        transaction_summary_query = (
-            select(Imtrn.xitem, func.sum(Imtrn.xqty * Imtrn.xsign).label("stock"))
-            .filter(Imtrn.zid == zid)
-            .group_by(Imtrn.xitem)
+        # Sum the ledger rows of every warehouse for this item (indexed on zid, xitem)
+        stock_summary = (
+            select(
+                StockBalance.xitem,
+                func.sum(StockBalance.stock).label("stock"),
+                func.max(StockBalance.updated_at).label("stock_updated_at"),
+            )
+            .filter(StockBalance.zid == zid, StockBalance.xitem == item_id)
+            .group_by(StockBalance.xitem)
+            .subquery("stock_summary")
         )
 
-        transaction_summary = transaction_summary_query.cte("transaction_summary")
-          # Build query to get a single item
+        # Build query to get a single item
         query = (
             select(
                 Caitem.zid.label("zid"),
@@ -203,19 +358,21 @@ class ItemsDBController:
                 Caitem.xstdprice.label("std_price"),
                 Caitem.xunitstk.label("stock_unit"),
                 Caitem.xbin.label("xbin"),  # Added xbin for product image
-                transaction_summary.c.stock,
+                stock_summary.c.stock,
+                stock_summary.c.stock_updated_at,
                 func.coalesce(func.min(Opspprc.xqty), 0).label("min_disc_qty"),
                 func.coalesce(func.min(Opspprc.xdisc), 0).label("disc_amt"),
             )
-            .join(transaction_summary, Caitem.xitem == transaction_summary.c.xitem)
+            .join(stock_summary, Caitem.xitem == stock_summary.c.xitem)
             .outerjoin(
                 Opspprc, and_(Caitem.xitem == Opspprc.xpricecat, Opspprc.zid == zid)
             )
             .filter(
                 Caitem.zid == zid,
                 Caitem.xitem == item_id,  # Filter by specific item_id
-                # transaction_summary.c.stock > 0, # also show which has 0 stock
-            )            .group_by(
+                # stock_summary.c.stock > 0, # also show which has 0 stock
+            )
+            .group_by(
                 Caitem.zid,
                 Caitem.xitem,
                 Caitem.xdesc,
@@ -223,7 +380,8 @@ class ItemsDBController:
                 Caitem.xstdprice,
                 Caitem.xunitstk,
                 Caitem.xbin,  # Added xbin for product image
-                transaction_summary.c.stock,
+                stock_summary.c.stock,
+                stock_summary.c.stock_updated_at,
             )
         )
 
@@ -236,7 +394,8 @@ class ItemsDBController:
         # Return None if no item is found
         if not item:
             return None
-              # Convert the query result to an ItemsSchema instance
+
+        # Convert the query result to an ItemsSchema instance
         return ItemsSchema(
             zid=item.zid,
             item_id=item.item_id,
@@ -247,4 +406,59 @@ class ItemsDBController:
             min_disc_qty=item.min_disc_qty,
             disc_amt=item.disc_amt,
             xbin=item.xbin,  # Added xbin for product image
+            stock_updated_at=item.stock_updated_at,
         )
+
+    async def refresh_stock_balance(
+        self, zid: Optional[int] = None, item_ids: Optional[List[str]] = None
+    ) -> int:
+        """
+        Recompute stock_balance rows from imtrn for the given scope.
+
+        The imtrn triggers keep the ledger current on their own; this is the
+        reconciliation path for repairing drift or backfilling a single business.
+
+        Args:
+            zid: Optional business ID to limit the refresh to
+            item_ids: Optional list of item IDs to limit the refresh to
+
+        Returns:
+            Number of ledger rows written
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        scope = []
+        if zid is not None:
+            scope.append(StockBalance.zid == zid)
+        if item_ids:
+            scope.append(StockBalance.xitem.in_(item_ids))
+
+        warehouse = func.coalesce(Imtrn.xwh, literal_column("''"))
+        source = select(
+            Imtrn.zid,
+            warehouse.label("xwh"),
+            Imtrn.xitem,
+            func.coalesce(func.sum(Imtrn.xqty * Imtrn.xsign), 0).label("stock"),
+            func.now().label("updated_at"),
+        )
+        if zid is not None:
+            source = source.filter(Imtrn.zid == zid)
+        if item_ids:
+            source = source.filter(Imtrn.xitem.in_(item_ids))
+        source = source.group_by(Imtrn.zid, warehouse, Imtrn.xitem)
+
+        try:
+            # Lock out imtrn writers so trigger deltas can't interleave with the recount
+            await self.db.execute(text("LOCK TABLE imtrn IN SHARE MODE"))
+            await self.db.execute(delete(StockBalance).where(*scope))
+            result = await self.db.execute(
+                insert(StockBalance).from_select(
+                    ["zid", "xwh", "xitem", "stock", "updated_at"], source
+                )
+            )
+            await self.db.commit()
+            return result.rowcount
+        except Exception:
+            await self.db.rollback()
+            raise
@@ -5,12 +5,13 @@ from models.users_model import ApiUsers
 from models.location_model import LocationRecord
 from schemas.location_schema import LocationCreate, Location, LocationQuery
 import asyncio
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Tuple
 from datetime import datetime, timedelta
 import logging
 from logs import setup_logger
+from utils.pagination import keyset_after, paginate
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class LocationDBController:
     """Controller for handling location-related database operations."""
@@ -66,7 +67,7 @@ class LocationDBController:
         
         return new_location
         
-    async def get_locations(self, query_params: LocationQuery) -> List[LocationRecord]:
+    async def get_locations(self, query_params: LocationQuery) -> Tuple[List[LocationRecord], Optional[str]]:
         """
         Retrieve location records based on query parameters.
         
@@ -74,7 +75,8 @@ class LocationDBController:
             query_params: Parameters to filter locations by
             
         Returns:
-            A list of location records matching the criteria
+            A list of location records matching the criteria, and the cursor
+            for the next page (None on the last page)
         """
         if self.db is None:
             raise Exception("Database session not initialized.")
@@ -98,20 +100,25 @@ class LocationDBController:
             end_date_str = query_params.end_date.strftime("%Y-%m-%d")
             query = query.filter(LocationRecord.xdate <= end_date_str)
             
-        # Apply sorting, limit and offset
-        query = query.order_by(LocationRecord.timestamp.desc())
+        # Newest first; id breaks ties between records sharing a timestamp
+        order_by = [LocationRecord.timestamp.desc(), LocationRecord.id.desc()]
+        if query_params.cursor:
+            query = query.filter(keyset_after(order_by, query_params.cursor))
+        query = query.order_by(*order_by)
         
         if query_params.limit:
-            query = query.limit(query_params.limit)
+            query = query.limit(query_params.limit + 1)
             
-        if query_params.offset:
+        if query_params.offset and not query_params.cursor:
             query = query.offset(query_params.offset)
             
         # Execute query
         result = await self.db.execute(query)
         locations = result.scalars().all()
         
-        return locations
+        if not query_params.limit:
+            return locations, None
+        return paginate(locations, query_params.limit, lambda record: [record.timestamp, record.id])
     
     async def get_last_location(self, username: str) -> Optional[LocationRecord]:
         """
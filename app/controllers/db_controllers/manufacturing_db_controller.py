@@ -7,7 +7,7 @@ from fastapi import Depends, HTTPException, status
 from logs import setup_logger
 import math
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class ManufacturingDBController:
     """Controller for handling manufacturing-related database operations."""
@@ -187,7 +187,7 @@ class ManufacturingDBController:
             return manufacturing_orders, total
             
         except Exception as e:
-            logger.error(f"Error getting manufacturing orders: {str(e)}")
+            logger.error("Error getting manufacturing orders: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error getting manufacturing orders: {str(e)}",
@@ -273,7 +273,7 @@ class ManufacturingDBController:
             # Re-raise HTTP exceptions without modifying them
             raise
         except Exception as e:
-            logger.error(f"Error getting manufacturing order details: {str(e)}")
+            logger.error("Error getting manufacturing order details: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error getting manufacturing order details: {str(e)}"
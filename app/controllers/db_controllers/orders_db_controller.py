@@ -1,13 +1,18 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from uuid import uuid4
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text
+from sqlalchemy import select, func, text, insert, tuple_, and_, or_
 from models.orders_model import Opmob
-from schemas.orders_schema import OpmobSchema
+from models.customers_model import Cacus
+from models.items_model import Caitem
+from schemas.orders_schema import OpmobSchema, BulkOrderResult
 from schemas.user_schema import UserRegistrationSchema
-from utils.orders_utils import format_invoice_number, generate_random_number
+from utils.orders_utils import format_invoice_number, invoice_allocator
 from schemas.order_summary_schema import OrderSummaryResponse, OrderSummaryListResponse
+from logs import setup_logger
+
+logger = setup_logger(__name__)
 
 class OrderDBController:
     """Controller for handling order-related database operations."""
@@ -15,18 +20,18 @@ class OrderDBController:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def _create_order_item(
+    def _order_item_values(
         self, 
         zid: int,
         invoiceno: str,
         invoicesl: str, 
         order_data: OpmobSchema,
         item_data: dict,
-        current_user: UserRegistrationSchema
-    ) -> Opmob:
-        current_time = datetime.now()
-        
-        return Opmob(
+        current_user: UserRegistrationSchema,
+        current_time: datetime
+    ) -> dict:
+        """Column values of one opmob line, for the multi-row INSERT in create_order."""
+        return dict(
             zid=zid,
             ztime=current_time,
             zutime=current_time,
@@ -55,45 +60,41 @@ class OrderDBController:
         self, 
         zid: int, 
         order_data: OpmobSchema, 
-        current_user: UserRegistrationSchema
+        current_user: UserRegistrationSchema,
+        commit: bool = True
     ) -> List[Opmob]:
-        """Create a new order with multiple items."""
+        """Create a new order with multiple items; with commit=False the caller commits."""
         # Generate invoice numbers
-        invoicesl = generate_random_number(12)
+        invoicesl = await invoice_allocator.allocate(self.db)
         invoiceno = format_invoice_number(invoicesl)
         
-        # Create order items
-        created_items = []
-        created_xsl_values = []  # Store XSL values for later retrieval
-        
-        for item in order_data.items:
-            order_item = await self._create_order_item(
+        current_time = datetime.now()
+        rows = [
+            self._order_item_values(
                 zid=zid,
                 invoiceno=invoiceno,
                 invoicesl=invoicesl,
                 order_data=order_data,
                 item_data=item,
-                current_user=current_user
+                current_user=current_user,
+                current_time=current_time
             )
-            self.db.add(order_item)
-            created_items.append(order_item)
-            created_xsl_values.append(order_item.xsl)  # Remember XSL values
+            for item in order_data.items
+        ]
+        if not rows:
+            return []
 
-        # Commit changes
-        await self.db.commit()
-        
-        # Fetch the created items with fresh data by querying them separately
-        # instead of calling refresh which can cause transaction issues
-        result_items = []
-        for xsl in created_xsl_values:
-            # Execute a select query to get the fresh item
-            stmt = select(Opmob).where(Opmob.xsl == xsl)
-            result = await self.db.execute(stmt)
-            fresh_item = result.scalar_one_or_none()
-            if fresh_item:
-                result_items.append(fresh_item)
-            
-        return result_items
+        # One multi-row INSERT for all lines; RETURNING hands back the stored rows
+        # in input order, so no per-line re-SELECT is needed after the commit
+        result = await self.db.scalars(
+            insert(Opmob).returning(Opmob, sort_by_parameter_order=True),
+            rows
+        )
+        created_items = result.all()
+        if commit:
+            await self.db.commit()
+
+        return list(created_items)
 
     async def create_bulk_order(
         self, 
@@ -101,15 +102,166 @@ class OrderDBController:
         orders_data: List[OpmobSchema], 
         current_user: UserRegistrationSchema
     ) -> List[Opmob]:
-        """Create multiple orders in bulk."""
-        all_created_items = []
-        
-        for order_data in orders_data:
-            created_items = await self.create_order(zid, order_data, current_user)
-            all_created_items.extend(created_items)
-            
-        return all_created_items
-    
+        """Create multiple orders in bulk, all for business zid."""
+        orders_data = [order.model_copy(update={"zid": zid}) for order in orders_data]
+        _, created_items = await self.ingest_bulk_orders(orders_data, current_user)
+        return created_items
+
+    async def _validate_bulk_orders(self, orders_data: List[OpmobSchema]) -> Dict[int, List[str]]:
+        """
+        Validate a whole batch before anything is written.
+
+        Customer and item existence are checked with one query each for the
+        entire batch. Returns the validation errors keyed by order index;
+        orders without errors are absent.
+        """
+        errors: Dict[int, List[str]] = {}
+
+        customer_keys: Set[Tuple[int, str]] = set()
+        items_by_zid: Dict[int, Set[str]] = {}
+        for order in orders_data:
+            customer_keys.add((order.zid, order.xcus))
+            items_by_zid.setdefault(order.zid, set()).update(item.xitem for item in order.items)
+
+        known_customers: Set[Tuple[int, str]] = set()
+        if customer_keys:
+            result = await self.db.execute(
+                select(Cacus.zid, Cacus.xcus).where(tuple_(Cacus.zid, Cacus.xcus).in_(list(customer_keys)))
+            )
+            known_customers = {(row.zid, row.xcus) for row in result}
+
+        known_items: Set[Tuple[int, str]] = set()
+        item_filters = [
+            and_(Caitem.zid == item_zid, Caitem.xitem.in_(list(xitems)))
+            for item_zid, xitems in items_by_zid.items() if xitems
+        ]
+        if item_filters:
+            result = await self.db.execute(select(Caitem.zid, Caitem.xitem).where(or_(*item_filters)))
+            known_items = {(row.zid, row.xitem) for row in result}
+
+        for index, order in enumerate(orders_data):
+            order_errors = []
+            if not order.items:
+                order_errors.append("Order has no items")
+            if (order.zid, order.xcus) not in known_customers:
+                order_errors.append(f"Unknown customer {order.xcus} for business {order.zid}")
+            for item in order.items:
+                if (order.zid, item.xitem) not in known_items:
+                    order_errors.append(f"Unknown item {item.xitem}")
+                if item.xqty <= 0:
+                    order_errors.append(f"Item {item.xitem} must have a positive quantity")
+                if item.xprice < 0:
+                    order_errors.append(f"Item {item.xitem} must not have a negative price")
+            if order_errors:
+                errors[index] = order_errors
+
+        return errors
+
+    async def ingest_bulk_orders(
+        self,
+        orders_data: List[OpmobSchema],
+        current_user: UserRegistrationSchema,
+        atomic: bool = False,
+        commit: bool = True
+    ) -> Tuple[List[BulkOrderResult], List[Opmob]]:
+        """
+        Create a batch of orders in a single transaction.
+
+        The batch is validated up front and every line of every valid order is
+        written with one multi-row INSERT ... RETURNING. If that statement
+        fails, each order is retried in its own savepoint so one bad order
+        does not sink the rest. With atomic=True nothing is written unless
+        every order succeeds; the others are reported as "skipped". With
+        commit=False the lines are left for the caller to commit. Returns
+        per-order results (in input order) and the created lines.
+        """
+        validation_errors = await self._validate_bulk_orders(orders_data)
+
+        results: List[BulkOrderResult] = []
+        if atomic and validation_errors:
+            for index, order in enumerate(orders_data):
+                results.append(BulkOrderResult(
+                    index=index, zid=order.zid, xcus=order.xcus,
+                    status="rejected" if index in validation_errors else "skipped",
+                    errors=validation_errors.get(index, []),
+                ))
+            return results, []
+
+        rows_by_order: Dict[int, List[dict]] = {}
+        current_time = datetime.now()
+        serials = iter(await invoice_allocator.allocate_many(
+            self.db, len(orders_data) - len(validation_errors)
+        ))
+
+        for index, order in enumerate(orders_data):
+            result = BulkOrderResult(index=index, zid=order.zid, xcus=order.xcus, status="rejected")
+            results.append(result)
+            if index in validation_errors:
+                result.errors = validation_errors[index]
+                continue
+
+            invoicesl = next(serials)
+            invoiceno = format_invoice_number(invoicesl)
+            rows_by_order[index] = [
+                self._order_item_values(
+                    zid=order.zid,
+                    invoiceno=invoiceno,
+                    invoicesl=invoicesl,
+                    order_data=order,
+                    item_data=item,
+                    current_user=current_user,
+                    current_time=current_time
+                )
+                for item in order.items
+            ]
+            result.invoiceno = rows_by_order[index][0]["invoiceno"]
+
+        if not rows_by_order:
+            return results, []
+
+        insert_stmt = insert(Opmob).returning(Opmob, sort_by_parameter_order=True)
+        created_items: List[Opmob] = []
+
+        try:
+            all_rows = [row for rows in rows_by_order.values() for row in rows]
+            async with self.db.begin_nested():
+                created_items = list((await self.db.scalars(insert_stmt, all_rows)).all())
+            for index, rows in rows_by_order.items():
+                results[index].status = "created"
+                results[index].lines = len(rows)
+        except Exception as e:
+            logger.warning("Bulk insert of %s orders failed, retrying per order: %s", len(rows_by_order), e)
+            created_items = []
+
+            # The per-order savepoints nest in this one, so atomic mode can undo them together
+            retry = await self.db.begin_nested()
+            for index, rows in rows_by_order.items():
+                try:
+                    async with self.db.begin_nested():
+                        order_items = (await self.db.scalars(insert_stmt, rows)).all()
+                    created_items.extend(order_items)
+                    results[index].status = "created"
+                    results[index].lines = len(order_items)
+                except Exception as order_error:
+                    results[index].status = "failed"
+                    results[index].invoiceno = None
+                    results[index].errors = [str(order_error)]
+                    logger.error("Order %s for customer %s failed: %s", index, results[index].xcus, order_error)
+
+            if atomic and any(results[index].status == "failed" for index in rows_by_order):
+                await retry.rollback()
+                for index in rows_by_order:
+                    if results[index].status == "created":
+                        results[index].status = "skipped"
+                        results[index].invoiceno = None
+                        results[index].lines = 0
+                return results, []
+            await retry.commit()
+
+        if commit:
+            await self.db.commit()
+        return results, created_items
+
     async def get_orders_by_status(
         self, 
         status: str,
@@ -8,8 +8,9 @@ from sqlalchemy.orm import selectinload
 from models.permissions_model import Permission, Role
 from models.users_model import ApiUsers
 from logs import setup_logger
+from utils.permission_cache import invalidate_all_grants, invalidate_user_grants
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class RBACController:
     """Controller for managing roles, permissions, and user roles"""
@@ -55,7 +56,7 @@ class RBACController:
             await self.db.commit()
             await self.db.refresh(permission)
             
-            logger.info(f"Created permission: {codename}")
+            logger.info("Created permission: %s", codename)
             return permission
             
         except HTTPException:
@@ -63,7 +64,7 @@ class RBACController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error creating permission: {str(e)}")
+            logger.error("Error creating permission: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create permission"
@@ -103,7 +104,7 @@ class RBACController:
             await self.db.commit()
             await self.db.refresh(role)
             
-            logger.info(f"Created role: {name}")
+            logger.info("Created role: %s", name)
             return role
             
         except HTTPException:
@@ -111,7 +112,7 @@ class RBACController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error creating role: {str(e)}")
+            logger.error("Error creating role: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to create role"
@@ -154,15 +155,17 @@ class RBACController:
                 
             # Check if permission is already assigned to role
             if permission in role.permissions:
-                logger.info(f"Permission {permission.codename} is already assigned to role {role.name}")
+                logger.info("Permission %s is already assigned to role %s", permission.codename, role.name)
                 return role
                 
             # Assign permission to role
             role.permissions.append(permission)
             await self.db.commit()
+            # Any number of users may hold this role
+            invalidate_all_grants()
             await self.db.refresh(role)
             
-            logger.info(f"Assigned permission {permission.codename} to role {role.name}")
+            logger.info("Assigned permission %s to role %s", permission.codename, role.name)
             return role
             
         except HTTPException:
@@ -170,7 +173,7 @@ class RBACController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error assigning permission to role: {str(e)}")
+            logger.error("Error assigning permission to role: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to assign permission to role"
@@ -213,15 +216,16 @@ class RBACController:
                 
             # Check if role is already assigned to user
             if role in user.roles:
-                logger.info(f"Role {role.name} is already assigned to user {username}")
+                logger.info("Role %s is already assigned to user %s", role.name, username)
                 return user
                 
             # Assign role to user
             user.roles.append(role)
             await self.db.commit()
+            invalidate_user_grants(username)
             await self.db.refresh(user)
             
-            logger.info(f"Assigned role {role.name} to user {username}")
+            logger.info("Assigned role %s to user %s", role.name, username)
             return user
             
         except HTTPException:
@@ -229,7 +233,7 @@ class RBACController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error assigning role to user: {str(e)}")
+            logger.error("Error assigning role to user: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to assign role to user"
@@ -280,7 +284,7 @@ class RBACController:
             
             # Handle users with no roles
             if not user.roles:
-                logger.info(f"User {username} has no roles assigned")
+                logger.info("User %s has no roles assigned", username)
                 return []
                 
             # Collect unique permissions from user roles
@@ -301,7 +305,7 @@ class RBACController:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error getting user permissions: {str(e)}", exc_info=True)
+            logger.error("Error getting user permissions: %s", e, exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to get user permissions"
@@ -344,15 +348,16 @@ class RBACController:
                 
             # Check if role is assigned to user
             if role not in user.roles:
-                logger.info(f"Role {role.name} is not assigned to user {username}")
+                logger.info("Role %s is not assigned to user %s", role.name, username)
                 return user
                 
             # Remove role from user
             user.roles.remove(role)
             await self.db.commit()
+            invalidate_user_grants(username)
             await self.db.refresh(user)
             
-            logger.info(f"Removed role {role.name} from user {username}")
+            logger.info("Removed role %s from user %s", role.name, username)
             return user
             
         except HTTPException:
@@ -360,7 +365,7 @@ class RBACController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error removing role from user: {str(e)}")
+            logger.error("Error removing role from user: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to remove role from user"
@@ -1,15 +1,28 @@
-from sqlalchemy import func, select, or_, cast
+from sqlalchemy import Date, Float, and_, cast, delete, func, literal, literal_column, null, or_, select, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.sql.functions import sum, coalesce
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 # Models
-from models.orders_model import Opord, Opodt, Imtemptrn, Imtemptdt, Opcrn, Opcdt
-from models.customers_model import Cacus
+from models.orders_model import (
+    Opord, Opodt, Imtemptrn, Imtemptdt, Opcrn, Opcdt,
+    CustomerSalesMonthly, CustomerSalesMonthlyDirty,
+)
+from models.customers_model import Cacus, CustomerAssignment
 
 # Schema
 from schemas.sales_return_schema import NetSalesWithAllReturnsResponse
+from utils.delta_sync import high_water_mark
+from controllers.db_controllers.customers_db_controller import CustomersDBController
+
+# imtemptrn documents that are customer returns
+IMTEMP_RETURN_PATTERNS = ('%RECA%', '%SRE-%', '%RECT-%', '%DSR-%')
+
+
+def _imtemp_return_filter():
+    return or_(*(Imtemptrn.ximtmptrn.like(pattern) for pattern in IMTEMP_RETURN_PATTERNS))
 
 
 class SalesReturnDBController:
@@ -21,16 +34,31 @@ class SalesReturnDBController:
     ) -> "NetSalesWithAllReturnsResponse":
         """
         Calculate Net Sales = Gross Sales – (Imtemptrn Returns + Opcrn Returns)
+        Yearly figures come from customer_sales_monthly; only the current
+        month is summed from the order and return tables.
         Also calculates:
           - Avg per order net sales = Yearly Net Sales / Total Order Count
           - Target Sales = Net Sales * (1 + xmonper / 100)
           - Gap = target – this_month_net_sales
           - Offer from Cacus.xcreditr if gap <= 0, else motivational message
         """
-
+        summaries = await self.get_net_sales_for_customers(zid, customer_ids=[customer_id])
+        return summaries[0] if summaries else NetSalesWithAllReturnsResponse()
+
+    async def get_net_sales_for_customers(
+        self,
+        zid: int,
+        customer_ids: Optional[List[str]] = None,
+        employee_id: Optional[str] = None,
+    ) -> List[NetSalesWithAllReturnsResponse]:
+        """
+        get_net_sales_with_all_returns for many customers at once: the listed
+        customer IDs, or every customer assigned to employee_id. Three
+        queries whatever the number of customers, each grouped by xcus.
+        Unknown customer IDs are left out of the result.
+        """
         now = datetime.now()
         from_date = datetime(now.year - 1, 1, 1)
-        to_date = datetime(now.year, now.month, 1) - timedelta(days=1)
 
         # This month date range
         this_month_start = datetime(now.year, now.month, 1)
@@ -44,224 +72,280 @@ class SalesReturnDBController:
             Cacus.xcus, Cacus.xorg, Cacus.xadd1,
             Cacus.xcreditr, Cacus.xmonper, Cacus.xmondiscper,
             Cacus.xisgotdefault, Cacus.xisgotmon
-        ).where(
-            Cacus.zid == zid,
-            Cacus.xcus == customer_id
-        ).limit(1)
+        ).where(Cacus.zid == zid)
+        if customer_ids is not None:
+            cacus_query = cacus_query.where(Cacus.xcus.in_(customer_ids))
+        if employee_id is not None:
+            cacus_query = cacus_query.join(CustomerAssignment, CustomersDBController._assigned_to(employee_id))
+        cacus_query = cacus_query.order_by(Cacus.xcus)
 
         cacus_result = await self.db.execute(cacus_query)
-        customer_info = cacus_result.first()
-
-        if not customer_info:
-            return NetSalesWithAllReturnsResponse()
-
-        # --- GROSS SALES ---
-        gross_sales_subq = (
-            select(func.sum(Opodt.xlineamt))
-            .join(Opord, Opord.xordernum == Opodt.xordernum)
+        customers = cacus_result.all()
+        if not customers:
+            return []
+        xcus_list = [customer.xcus for customer in customers]
+
+        # --- CLOSED MONTHS: precomputed per customer and month ---
+        closed_months_query = (
+            select(
+                CustomerSalesMonthly.xcus,
+                func.sum(CustomerSalesMonthly.gross_sales).label("gross_sales"),
+                func.sum(CustomerSalesMonthly.imtemp_returns).label("imtemp_returns"),
+                func.sum(CustomerSalesMonthly.opcrn_returns).label("opcrn_returns"),
+                func.sum(CustomerSalesMonthly.order_count).label("customer_order_count"),
+            )
             .where(
-                Opord.zid == zid,
-                Opodt.zid == zid,
-                Opord.xcus == customer_id,
-                Opord.xdate.between(from_date, to_date),
+                CustomerSalesMonthly.zid == zid,
+                CustomerSalesMonthly.xcus.in_(xcus_list),
+                CustomerSalesMonthly.month >= from_date.date(),
+                CustomerSalesMonthly.month < this_month_start.date(),
             )
-            .scalar_subquery()
+            .group_by(CustomerSalesMonthly.xcus)
         )
 
-        # --- RETURNS: imtemptrn ---
-        imtemp_return_subq = (
-            select(func.sum(Imtemptdt.xlineamt))
-            .join(Imtemptrn, Imtemptrn.ximtmptrn == Imtemptdt.ximtmptrn)
-            .where(
-                Imtemptrn.zid == zid,
-                Imtemptdt.zid == zid,
-                Imtemptrn.xcus == customer_id,
-                Imtemptrn.xdate.between(from_date, to_date),
-                or_(
-                    Imtemptrn.ximtmptrn.like('%RECA%'),
-                    Imtemptrn.ximtmptrn.like('%SRE-%'),
-                    Imtemptrn.ximtmptrn.like('%RECT-%'),
-                    Imtemptrn.ximtmptrn.like('%DSR-%')
+        # --- THIS MONTH NET SALES: returns count negative ---
+        def month_lines(header, detail, header_date, join_on, sign, *filters):
+            return (
+                select(header.xcus, (detail.xlineamt * sign).label("amount"))
+                .select_from(detail)
+                .join(header, join_on)
+                .where(
+                    header.zid == zid,
+                    detail.zid == zid,
+                    header.xcus.in_(xcus_list),
+                    header_date.between(this_month_start.date(), this_month_end.date()),
+                    *filters,
                 )
             )
-            .scalar_subquery()
-        )
 
-        # --- RETURNS: opcrn ---
-        opcrn_return_subq = (
-            select(func.sum(Opcdt.xlineamt))
-            .join(Opcrn, Opcrn.xcrnnum == Opcdt.xcrnnum)
-            .where(
-                Opcrn.zid == zid,
-                Opcdt.zid == zid,
-                Opcrn.xcus == customer_id,
-                Opcrn.xdate.between(from_date, to_date)
-            )
-            .scalar_subquery()
+        this_month_lines = union_all(
+            month_lines(Opord, Opodt, Opord.xdate, Opord.xordernum == Opodt.xordernum, 1),
+            month_lines(
+                Imtemptrn, Imtemptdt, Imtemptrn.xdate, Imtemptrn.ximtmptrn == Imtemptdt.ximtmptrn, -1,
+                _imtemp_return_filter(),
+            ),
+            # opcrn.xdate is varchar
+            month_lines(
+                Opcrn, Opcdt, cast(func.nullif(Opcrn.xdate, ""), Date), Opcrn.xcrnnum == Opcdt.xcrnnum, -1
+            ),
+        ).subquery("this_month_lines")
+        this_month_query = (
+            select(this_month_lines.c.xcus, func.sum(this_month_lines.c.amount).label("net_sales"))
+            .group_by(this_month_lines.c.xcus)
         )
 
-        # --- THIS MONTH NET SALES ---
-        this_month_gross_sales = (
-            select(func.sum(Opodt.xlineamt))
-            .join(Opord, Opord.xordernum == Opodt.xordernum)
-            .where(
-                Opord.zid == zid,
-                Opodt.zid == zid,
-                Opord.xcus == customer_id,
-                Opord.xdate.between(this_month_start, this_month_end),
-            )
-            .scalar_subquery()
+        closed_months = {row.xcus: row for row in (await self.db.execute(closed_months_query)).all()}
+        this_month = {row.xcus: row.net_sales for row in (await self.db.execute(this_month_query)).all()}
+
+        return [
+            self._build_summary(customer, closed_months.get(customer.xcus), this_month.get(customer.xcus))
+            for customer in customers
+        ]
+
+    def _build_summary(self, customer_info, totals, this_month_net_sales) -> NetSalesWithAllReturnsResponse:
+        """Response for one customer from its closed-month totals and this month's net sales"""
+        # Extract values safely
+        gross_sales = float(totals.gross_sales or 0) if totals else 0.0
+        imtemp_returns = float(totals.imtemp_returns or 0) if totals else 0.0
+        opcrn_returns = float(totals.opcrn_returns or 0) if totals else 0.0
+        customer_order_count = int(totals.customer_order_count or 0) if totals else 0
+        net_sales = gross_sales - imtemp_returns - opcrn_returns
+        this_month_net_sales = float(this_month_net_sales or 0)
+        avg_per_order_net_sales = net_sales / customer_order_count if customer_order_count else 0.0
+
+        # Get xmonper with fallback
+        xmonper = float(customer_info.xmonper) if customer_info.xmonper not in (None, '') else 0.0
+        xmondiscper = float(customer_info.xmondiscper) if customer_info.xmondiscper not in (None, '') else 0.0
+
+        # Boolean conversion for flags
+        # Convert string flags safely
+        xisgotdefault = None
+        if customer_info.xisgotdefault not in (None, '', 'null', 'None'):
+            xisgotdefault = customer_info.xisgotdefault.lower() == 'true'
+
+        xisgotmon = None
+        if customer_info.xisgotmon not in (None, '', 'null', 'None'):
+            xisgotmon = customer_info.xisgotmon.lower() == 'true'
+
+
+        # Calculate monthly target: avg + percentage increase
+        this_month_target_sales = avg_per_order_net_sales * (1 + xmonper / 100)
+        # Compare actual vs target
+        sales_gap = this_month_target_sales - this_month_net_sales
+
+        # Build offers using private methods
+        default_offer = self._build_default_offer(customer_info.xcreditr, xisgotdefault)
+        monitory_offer = self._build_monitory_offer(xmondiscper, xisgotmon)
+
+        # Final offer logic
+        if sales_gap <= 0:
+            offer_value = default_offer if xisgotdefault else monitory_offer if xisgotmon else "No offer"
+        else:
+            offer_value = f"You are Tk- {abs(round(sales_gap))} away from getting {default_offer if xisgotdefault else monitory_offer if xisgotmon else 'an offer'}"
+
+        return NetSalesWithAllReturnsResponse(
+            # Customer Info
+            xcus=customer_info.xcus,
+            xorg=customer_info.xorg,
+            xadd1=customer_info.xadd1,
+            xmonper=xmonper,
+            xcreditr=customer_info.xcreditr,
+            xmondiscper=xmondiscper,
+            xisgotdefault=xisgotdefault,
+            xisgotmon=xisgotmon,
+
+            # Sales & Returns
+            yearly_gross_sales=round(gross_sales, 2),
+            yearly_imtemp_returns=round(imtemp_returns, 2),
+            yearly_opcrn_returns=round(opcrn_returns, 2),
+            yearly_net_sales=round(net_sales, 2),
+
+            # Order Metrics
+            yearly_customer_order_count=customer_order_count,
+            avg_per_order_net_sales=round(avg_per_order_net_sales, 2),
+
+            # This Month
+            this_month_net_sales=round(this_month_net_sales, 2),
+            this_month_target_sales=round(this_month_target_sales, 2),
+            sales_gap=round(sales_gap, 2),
+
+            # Offers
+            default_offer=default_offer,
+            monitory_offer=monitory_offer,
+            offer=offer_value
         )
 
-        this_month_imtemp_return = (
-            select(func.sum(Imtemptdt.xlineamt))
-            .join(Imtemptrn, Imtemptrn.ximtmptrn == Imtemptdt.ximtmptrn)
-            .where(
-                Imtemptrn.zid == zid,
-                Imtemptdt.zid == zid,
-                Imtemptrn.xcus == customer_id,
-                Imtemptrn.xdate.between(this_month_start, this_month_end),
-                or_(
-                    Imtemptrn.ximtmptrn.like('%RECA%'),
-                    Imtemptrn.ximtmptrn.like('%SRE-%'),
-                    Imtemptrn.ximtmptrn.like('%RECT-%'),
-                    Imtemptrn.ximtmptrn.like('%DSR-%')
+    async def refresh_customer_sales_monthly(self, batch_size: int = 5000) -> int:
+        """
+        Recompute the customer_sales_monthly rows queued in
+        customer_sales_monthly_dirty, one batch per statement, until the queue
+        is drained up to the current watermark.
+
+        A queued month is only claimed once every transaction that queued it
+        has finished (its version is below the watermark), so the recompute
+        sees all of their changes. Months queued by transactions still
+        running stay in the queue for the next run.
+
+        Returns:
+            Number of customer months recomputed
+        """
+        if self.db is None:
+            raise Exception("Database session not initialized.")
+
+        refreshed = 0
+        try:
+            while True:
+                watermark = await high_water_mark(self.db)
+                batch = await self.db.execute(self._refresh_monthly_statement(watermark, batch_size))
+                await self.db.commit()
+                refreshed += batch.rowcount
+                if batch.rowcount < batch_size:
+                    return refreshed
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    @staticmethod
+    def _refresh_monthly_statement(watermark: int, batch_size: int):
+        """
+        One statement that dequeues up to batch_size customer months and
+        upserts their totals, summed with a single pass per document type.
+        """
+        dirty = CustomerSalesMonthlyDirty
+        oldest = (
+            select(dirty.zid, dirty.xcus, dirty.month)
+            .where(dirty.version < watermark)
+            .order_by(dirty.version)
+            .limit(batch_size)
+        )
+        claimed = (
+            delete(dirty)
+            .where(tuple_(dirty.zid, dirty.xcus, dirty.month).in_(oldest), dirty.version < watermark)
+            .returning(dirty.zid, dirty.xcus, dirty.month)
+            .cte("claimed")
+        )
+        month_end = claimed.c.month + literal_column("INTERVAL '1 month'")
+
+        def document_lines(header, detail, header_date, join_on, amount_column, *filters):
+            # Detail lines of the claimed customer months, the amount in its own column
+            amounts = [
+                cast(detail.xlineamt if name == amount_column else null(), Float).label(name)
+                for name in ("gross_sales", "imtemp_returns", "opcrn_returns")
+            ]
+            return (
+                select(
+                    claimed.c.zid,
+                    claimed.c.xcus,
+                    claimed.c.month,
+                    *amounts,
+                    literal(1 if amount_column == "gross_sales" else 0).label("order_count"),
+                )
+                .select_from(claimed)
+                .join(
+                    header,
+                    and_(
+                        header.zid == claimed.c.zid,
+                        header.xcus == claimed.c.xcus,
+                        header_date >= claimed.c.month,
+                        header_date < month_end,
+                        *filters,
+                    ),
                 )
+                .join(detail, and_(join_on, detail.zid == header.zid))
             )
-            .scalar_subquery()
-        )
 
-        this_month_opcrn_return = (
-            select(func.sum(Opcdt.xlineamt))
-            .join(Opcrn, Opcrn.xcrnnum == Opcdt.xcrnnum)
-            .where(
-                Opcrn.zid == zid,
-                Opcdt.zid == zid,
-                Opcrn.xcus == customer_id,
-                Opcrn.xdate.between(this_month_start, this_month_end)
+        lines = union_all(
+            document_lines(Opord, Opodt, Opord.xdate, Opodt.xordernum == Opord.xordernum, "gross_sales"),
+            document_lines(
+                Imtemptrn, Imtemptdt, Imtemptrn.xdate, Imtemptdt.ximtmptrn == Imtemptrn.ximtmptrn,
+                "imtemp_returns", _imtemp_return_filter(),
+            ),
+            document_lines(
+                Opcrn, Opcdt, cast(func.nullif(Opcrn.xdate, ""), Date), Opcdt.xcrnnum == Opcrn.xcrnnum,
+                "opcrn_returns",
+            ),
+        ).subquery("document_lines")
+
+        totals = (
+            select(
+                claimed.c.zid,
+                claimed.c.xcus,
+                claimed.c.month,
+                coalesce(func.sum(lines.c.gross_sales), 0),
+                coalesce(func.sum(lines.c.imtemp_returns), 0),
+                coalesce(func.sum(lines.c.opcrn_returns), 0),
+                coalesce(func.sum(lines.c.order_count), 0),
+                func.now(),
             )
-            .scalar_subquery()
-        )
-
-        # --- CUSTOMER ORDER COUNT ---
-        customer_order_count = (
-            select(func.count(Opord.xordernum))
-            .join(Opodt, Opodt.xordernum == Opord.xordernum)
-            .where(
-                Opord.zid == zid,
-                Opodt.zid == zid,
-                Opord.xcus == customer_id,
-                Opord.xdate.between(from_date, to_date)
+            .select_from(claimed)
+            .outerjoin(
+                lines,
+                and_(
+                    lines.c.zid == claimed.c.zid,
+                    lines.c.xcus == claimed.c.xcus,
+                    lines.c.month == claimed.c.month,
+                ),
             )
-            .scalar_subquery()
+            .group_by(claimed.c.zid, claimed.c.xcus, claimed.c.month)
         )
 
-        # Final query for metrics
-        stmt = select(
-            coalesce(gross_sales_subq, 0).label("gross_sales"),
-            coalesce(imtemp_return_subq, 0).label("imtemp_returns"),
-            coalesce(opcrn_return_subq, 0).label("opcrn_returns"),
-            (
-                coalesce(gross_sales_subq, 0)
-                - coalesce(imtemp_return_subq, 0)
-                - coalesce(opcrn_return_subq, 0)
-            ).label("net_sales"),
-            coalesce(customer_order_count, 0).label("customer_order_count"),
-            (
-                (
-                    coalesce(gross_sales_subq, 0)
-                    - coalesce(imtemp_return_subq, 0)
-                    - coalesce(opcrn_return_subq, 0)
-                ) / func.nullif(customer_order_count, 0)
-            ).label("avg_per_order_net_sales"),
-            (
-                coalesce(this_month_gross_sales, 0)
-                - coalesce(this_month_imtemp_return, 0)
-                - coalesce(this_month_opcrn_return, 0)
-            ).label("this_month_net_sales")
+        upsert = insert(CustomerSalesMonthly).from_select(
+            [
+                "zid", "xcus", "month", "gross_sales", "imtemp_returns",
+                "opcrn_returns", "order_count", "refreshed_at",
+            ],
+            totals,
         )
-
-        try:
-            result = await self.db.execute(stmt)
-            row = result.first()
-
-            if not row:
-                return NetSalesWithAllReturnsResponse(
-                    xcus=customer_info.xcus,
-                    xorg=customer_info.xorg,
-                    xadd1=customer_info.xadd1
+        return upsert.on_conflict_do_update(
+            index_elements=["zid", "xcus", "month"],
+            set_={
+                column: upsert.excluded[column]
+                for column in (
+                    "gross_sales", "imtemp_returns", "opcrn_returns", "order_count", "refreshed_at"
                 )
+            },
+        ).add_cte(claimed)
 
-            # Extract values safely
-            net_sales = float(row.net_sales)
-            this_month_net_sales = float(row.this_month_net_sales)
-            customer_order_count = int(row.customer_order_count)
-            avg_per_order_net_sales = float(row.avg_per_order_net_sales) if row.avg_per_order_net_sales is not None else 0.0
-
-            # Get xmonper with fallback
-            xmonper = float(customer_info.xmonper) if customer_info.xmonper not in (None, '') else 0.0
-            xmondiscper = float(customer_info.xmondiscper) if customer_info.xmondiscper not in (None, '') else 0.0
-
-            # Boolean conversion for flags
-            # Convert string flags safely
-            xisgotdefault = None
-            if customer_info.xisgotdefault not in (None, '', 'null', 'None'):
-                xisgotdefault = customer_info.xisgotdefault.lower() == 'true'
-
-            xisgotmon = None
-            if customer_info.xisgotmon not in (None, '', 'null', 'None'):
-                xisgotmon = customer_info.xisgotmon.lower() == 'true'
-
-
-            # Calculate monthly target: avg + percentage increase
-            this_month_target_sales = avg_per_order_net_sales * (1 + xmonper / 100)
-            # Compare actual vs target
-            sales_gap = this_month_target_sales - this_month_net_sales
-
-            # Build offers using private methods
-            default_offer = self._build_default_offer(customer_info.xcreditr, xisgotdefault)
-            monitory_offer = self._build_monitory_offer(xmondiscper, xisgotmon)
-
-            # Final offer logic
-            if sales_gap <= 0:
-                offer_value = default_offer if xisgotdefault else monitory_offer if xisgotmon else "No offer"
-            else:
-                offer_value = f"You are Tk- {abs(round(sales_gap))} away from getting {default_offer if xisgotdefault else monitory_offer if xisgotmon else 'an offer'}"
-
-            return NetSalesWithAllReturnsResponse(
-                # Customer Info
-                xcus=customer_info.xcus,
-                xorg=customer_info.xorg,
-                xadd1=customer_info.xadd1,
-                xmonper=xmonper,
-                xcreditr=customer_info.xcreditr,
-                xmondiscper=xmondiscper,
-                xisgotdefault=xisgotdefault,
-                xisgotmon=xisgotmon,
-
-                # Sales & Returns
-                yearly_gross_sales=round(float(row.gross_sales), 2),
-                yearly_imtemp_returns=round(float(row.imtemp_returns), 2),
-                yearly_opcrn_returns=round(float(row.opcrn_returns), 2),
-                yearly_net_sales=round(net_sales, 2),
-
-                # Order Metrics
-                yearly_customer_order_count=int(row.customer_order_count),
-                avg_per_order_net_sales=round(avg_per_order_net_sales, 2),
-
-                # This Month
-                this_month_net_sales=round(this_month_net_sales, 2),
-                this_month_target_sales=round(this_month_target_sales, 2),
-                sales_gap=round(sales_gap, 2),
-
-                # Offers
-                default_offer=default_offer,
-                monitory_offer=monitory_offer,
-                offer=offer_value
-            )
-        except Exception as e:
-            raise e
-        
     def _build_default_offer(self, xcreditr: str, is_received: Optional[bool]) -> str:
         if is_received is True:
             return f"You already got the {xcreditr.strip()}" if xcreditr and xcreditr.strip() else "You already got the default offer"
@@ -7,7 +7,7 @@ from sqlalchemy import update, delete
 from logs import setup_logger
 from fastapi import HTTPException, status
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class UserDBController:
 
@@ -40,7 +40,7 @@ class UserDBController:
             
             return user
         except Exception as e:
-            logger.error(f"Error retrieving user {username}: {str(e)}")
+            logger.error("Error retrieving user %s: %s", username, e)
             raise
  
     async def get_user_by_id(self, user_id: str) -> ApiUsers:
@@ -119,7 +119,7 @@ class UserDBController:
             return user
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error creating user: {str(e)}")
+            logger.error("Error creating user: %s", e)
             raise
 
     async def update_user(self, username: str, user_data: dict) -> ApiUsers:
@@ -141,7 +141,7 @@ class UserDBController:
             return user
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error updating user {username}: {str(e)}")
+            logger.error("Error updating user %s: %s", username, e)
             raise
 
     async def delete_user(self, username: str) -> bool:
@@ -159,7 +159,7 @@ class UserDBController:
             return True
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error deleting user {username}: {str(e)}")
+            logger.error("Error deleting user %s: %s", username, e)
             raise
 
 
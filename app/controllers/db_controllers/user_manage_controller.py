@@ -5,12 +5,11 @@ from models.users_model import ApiUsers, Logged, SessionHistory, Prmst
 from logs import setup_logger
 from datetime import datetime
 from utils.token_utils import blacklist_token
-from passlib.context import CryptContext
+from utils.auth_cache import invalidate_user
+from utils.permission_cache import invalidate_user_grants
+from utils.passwords import hash_password
 
-# Initialize password hashing context
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class UserManageController:
     def __init__(self, db: AsyncSession):
@@ -62,6 +61,8 @@ class UserManageController:
                 )
 
             await self.db.commit()
+            invalidate_user(username)
+            invalidate_user_grants(username)
             return {"message": f"User {username} and associated data deleted successfully"}
 
         except HTTPException:
@@ -69,7 +70,7 @@ class UserManageController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error deleting user: {str(e)}")
+            logger.error("Error deleting user: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error occurred while deleting user"
@@ -126,6 +127,8 @@ class UserManageController:
                 )
 
             await self.db.commit()
+            # Cached lookups carry the old status; drop them whatever the new value is
+            invalidate_user(username)
             return {"message": f"User {username} status updated to {new_status}"}
 
         except HTTPException:
@@ -133,7 +136,7 @@ class UserManageController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error updating user status: {str(e)}")
+            logger.error("Error updating user status: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error occurred while updating user status"
@@ -222,10 +225,12 @@ class UserManageController:
                         detail="Password must be at least 4 characters long"
                     )
                 # Hash the password
-                hashed_password = pwd_context.hash(user_data.password)
+                hashed_password = await hash_password(user_data.password)
                 user.password = hashed_password
 
             await self.db.commit()
+            invalidate_user(user.username)
+            invalidate_user_grants(user.username)
             
             # Return updated user data
             return {
@@ -244,7 +249,7 @@ class UserManageController:
             raise
         except Exception as e:
             await self.db.rollback()
-            logger.error(f"Error updating user: {str(e)}")
+            logger.error("Error updating user: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error occurred while updating user information"
@@ -7,7 +7,8 @@ from utils.token_utils import (
     create_access_token, create_refresh_token, blacklist_token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from passlib.context import CryptContext
+from utils.auth_cache import invalidate_token, invalidate_user
+from utils.passwords import password_hasher
 
 from logs import setup_logger
 from sqlalchemy.future import select
@@ -22,10 +23,7 @@ load_dotenv()
 MAX_LOGIN_ATTEMPTS = int(os.getenv("MAX_LOGIN_ATTEMPTS", "5"))
 LOCKOUT_TIME_SECONDS = int(os.getenv("LOCKOUT_TIME_SECONDS", "300"))  # 5 minutes
 
-# Initialize password context
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class UserLoginController:
     def __init__(self, db: AsyncSession):
@@ -52,7 +50,7 @@ class UserLoginController:
                     is_admin_value = 'admin' if is_admin_value else 'user'
                 elif is_admin_value not in ['admin', 'user', '']:
                     is_admin_value = ''  # Default to empty string if invalid
-                    logger.warning(f"Invalid is_admin value '{session.is_admin}' normalized to empty string")
+                    logger.warning("Invalid is_admin value '%s' normalized to empty string", session.is_admin)
                 
                 # Record in session history
                 session_history = SessionHistory(
@@ -78,12 +76,12 @@ class UserLoginController:
 
             if inactive_sessions:
                 await self.db.commit()
-                logger.info(f"Cleaned up {len(inactive_sessions)} inactive sessions")
+                logger.info("Cleaned up %s inactive sessions", len(inactive_sessions))
                 
             return len(inactive_sessions)
 
         except Exception as e:
-            logger.error(f"Error during inactive session cleanup")
+            logger.error("Error during inactive session cleanup")
             await self.db.rollback()
             # Don't raise exception during login flow
             if max_inactive_hours > 0:  # Only raise if specifically called as a standalone operation
@@ -93,7 +91,8 @@ class UserLoginController:
                 )
 
     async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        # Runs on the password worker pool so logins don't block the event loop
+        return await password_hasher.verify(plain_password, hashed_password)
 
     async def check_login_attempts(self, username: str, ip_address: str) -> None:
         """Check if user is allowed to attempt login"""
@@ -105,7 +104,7 @@ class UserLoginController:
         if attempts:
             if attempts.locked_until and attempts.locked_until > datetime.utcnow():
                 lock_remaining = (attempts.locked_until - datetime.utcnow()).seconds
-                logger.warning(f"Account {username} is locked. Remaining time: {lock_remaining} seconds")
+                logger.warning("Account %s is locked. Remaining time: %s seconds", username, lock_remaining)
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail=f"Account is locked. Try again in {lock_remaining} seconds"
@@ -130,7 +129,7 @@ class UserLoginController:
 
             if attempts.attempt_count >= MAX_LOGIN_ATTEMPTS:
                 attempts.locked_until = datetime.utcnow() + timedelta(seconds=LOCKOUT_TIME_SECONDS)
-                logger.warning(f"Account {username} locked due to too many failed attempts")
+                logger.warning("Account %s locked due to too many failed attempts", username)
         else:
             attempts = LoginAttempts(
                 username=username,
@@ -156,9 +155,6 @@ class UserLoginController:
             raise Exception("Database session not initialized")
 
         try:
-            # Clean up inactive sessions before creating new one
-            await self.cleanup_inactive_sessions()
-            
             ip_address = request.client.host
             await self.check_login_attempts(form_data.username, ip_address)
 
@@ -169,14 +165,14 @@ class UserLoginController:
 
             if not user or not await self.verify_password(form_data.password, user.password):
                 await self.record_failed_attempt(form_data.username, ip_address)
-                logger.error(f"Failed login attempt for user {form_data.username} from IP {ip_address}")
+                logger.error("Failed login attempt for user %s from IP %s", form_data.username, ip_address)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Incorrect username or password"
                 )
 
             if user.status != "active":
-                logger.error(f"Login denied for inactive user {user.username}")
+                logger.error("Login denied for inactive user %s", user.username)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="User is not active"
@@ -220,7 +216,7 @@ class UserLoginController:
             self.db.add(new_session)
             await self.db.commit()
             
-            logger.info(f"Successful login for user {user.username} from {ip_address}")
+            logger.info("Successful login for user %s from %s", user.username, ip_address)
             
             return {
                 "access_token": access_token,
@@ -232,7 +228,7 @@ class UserLoginController:
         except HTTPException as he:
             raise he
         except Exception as e:
-            logger.error(f"Login error: {str(e)}")
+            logger.error("Login error: %s", e)
             await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -248,7 +244,7 @@ class UserLoginController:
             logged_user = logged_user.scalars().first()
 
             if not logged_user:
-                logger.error(f"Logout failed: No matching session found for user {username} with provided token")
+                logger.error("Logout failed: No matching session found for user %s with provided token", username)
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="No matching session found"
@@ -261,7 +257,7 @@ class UserLoginController:
                     is_admin_value = 'admin' if is_admin_value else 'user'
                 elif is_admin_value not in ['admin', 'user', '']:
                     is_admin_value = ''  # Default to empty string if invalid
-                    logger.warning(f"Invalid is_admin value '{logged_user.is_admin}' normalized to empty string")
+                    logger.warning("Invalid is_admin value '%s' normalized to empty string", logged_user.is_admin)
                 
                 # Record the session history
                 session_history = SessionHistory(
@@ -286,12 +282,13 @@ class UserLoginController:
                 # Remove only this specific session
                 await self.db.delete(logged_user)
                 await self.db.commit()
+                invalidate_token(token)
 
-                logger.info(f"User {username} logged out successfully from one device")
+                logger.info("User %s logged out successfully from one device", username)
                 return {"detail": f"User {username} logged out successfully from this device"}
 
             except Exception as db_error:
-                logger.error(f"Database error during logout for user {username}: {str(db_error)}")
+                logger.error("Database error during logout for user %s: %s", username, db_error)
                 await self.db.rollback()
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -299,7 +296,7 @@ class UserLoginController:
                 )
                 
         except Exception as e:
-            logger.error(f"Logout error for {username}: {str(e)}")
+            logger.error("Logout error for %s: %s", username, e)
             await self.db.rollback()
             if isinstance(e, HTTPException):
                 raise e
@@ -323,7 +320,7 @@ class UserLoginController:
                     is_admin_value = 'admin' if is_admin_value else 'user'
                 elif is_admin_value not in ['admin', 'user', '']:
                     is_admin_value = ''  # Default to empty string if invalid
-                    logger.warning(f"Invalid is_admin value '{logged_user.is_admin}' normalized to empty string")
+                    logger.warning("Invalid is_admin value '%s' normalized to empty string", logged_user.is_admin)
                 
                 # Create session history record
                 session_history = SessionHistory(
@@ -345,11 +342,12 @@ class UserLoginController:
                 
                 await self.db.delete(logged_user)
                 await self.db.commit()
+                invalidate_user(username)
                 
-                logger.warning(f"Forced logout for user {username}: {reason}")
+                logger.warning("Forced logout for user %s: %s", username, reason)
         
         except Exception as e:
-            logger.error(f"Error during forced logout for {username}: {str(e)}")
+            logger.error("Error during forced logout for %s: %s", username, e)
             await self.db.rollback()
             raise
 
@@ -369,7 +367,7 @@ class UserLoginController:
                 "status": session.status
             } for session in sessions]
         except Exception as e:
-            logger.error(f"Error fetching sessions for user {username}: {str(e)}")
+            logger.error("Error fetching sessions for user %s: %s", username, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error fetching user sessions"
@@ -393,7 +391,7 @@ class UserLoginController:
                     is_admin_value = 'admin' if is_admin_value else 'user'
                 elif is_admin_value not in ['admin', 'user', '']:
                     is_admin_value = ''  # Default to empty string if invalid
-                    logger.warning(f"Invalid is_admin value '{session.is_admin}' normalized to empty string")
+                    logger.warning("Invalid is_admin value '%s' normalized to empty string", session.is_admin)
                 
                 # Create session history record
                 session_history = SessionHistory(
@@ -421,7 +419,7 @@ class UserLoginController:
             return {"detail": "Successfully logged out all sessions"}
 
         except Exception as e:
-            logger.error(f"Error during mass logout for user {username}: {str(e)}")
+            logger.error("Error during mass logout for user %s: %s", username, e)
             await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -8,13 +8,10 @@ from schemas.user_schema import UserRegistrationSchema, UserRegistrationResponse
 from models.users_model import Prmst, ApiUsers
 from utils.error import error_details
 from logs import setup_logger
-from passlib.context import CryptContext
-
-# Initialize password hashing context
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+from utils.passwords import hash_password
 
 # Setup logger
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class UserRegistrationController:
     def __init__(self, db: AsyncSession):
@@ -22,7 +19,7 @@ class UserRegistrationController:
         self.user_db_controller = UserDBController(db)
 
     async def get_password_hash(self, password: str) -> str:
-        return pwd_context.hash(password)
+        return await hash_password(password)
 
     async def validate_password(self, password: str):
         if len(password) < 4:
@@ -35,7 +32,7 @@ class UserRegistrationController:
     async def check_exists(self, model, attribute, value, error_message):
         try:
             if not hasattr(model, attribute):
-                logger.error(f"Model {model.__name__} does not have attribute '{attribute}'")
+                logger.error("Model %s does not have attribute '%s'", model.__name__, attribute)
                 raise ValueError(f"Invalid attribute '{attribute}' for model {model.__name__}")
 
             if isinstance(value, str):
@@ -45,11 +42,11 @@ class UserRegistrationController:
                 normalized_value = value
                 query = select(model).filter(getattr(model, attribute) == normalized_value)
 
-            logger.debug(f"Executing query: {query}")
+            logger.debug("Executing query: %s", query)
             result = await self.db.execute(query)
             exists = result.scalars().first()
 
-            logger.debug(f"Result of existence check for {attribute}='{normalized_value}': {exists is not None}")
+            logger.debug("Result of existence check for %s='%s': %s", attribute, normalized_value, exists is not None)
 
             if exists:
                 logger.error(error_message)
@@ -61,7 +58,7 @@ class UserRegistrationController:
             raise
         except Exception as e:
             # logger.error(f"Error checking existence of {attribute}: {str(e)}\n{traceback.format_exc()}")
-            logger.error(f"Error checking existence of {attribute}: ")
+            logger.error("Error checking existence of %s: ", attribute)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Internal server error during existence check",
@@ -75,21 +72,21 @@ class UserRegistrationController:
         try:
             # Normalize the user ID
             normalized_user_id = user_id.strip().lower()
-            logger.debug(f"Checking if user_id '{normalized_user_id}' exists in Prmst...")
+            logger.debug("Checking if user_id '%s' exists in Prmst...", normalized_user_id)
 
             # Build and execute the query
             query = select(Prmst).filter(func.lower(Prmst.xemp) == normalized_user_id)
-            logger.debug(f"Executing query: {query}")
+            logger.debug("Executing query: %s", query)
             result = await self.db.execute(query)
             prmst_user = result.scalars().first()
 
             # Log the result of the query
-            logger.debug(f"Result of Prmst check for xemp='{normalized_user_id}': {'Found' if prmst_user else 'Not Found'}")
+            logger.debug("Result of Prmst check for xemp='%s': %s", normalized_user_id, 'Found' if prmst_user else 'Not Found')
 
             # Raise an exception if the user ID is not found
             if not prmst_user:
                 error_msg = "You have no ID in employee table"
-                logger.error(f"User ID '{normalized_user_id}' not found in Prmst: {error_msg}")
+                logger.error("User ID '%s' not found in Prmst: %s", normalized_user_id, error_msg)
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=error_details(error_msg),
@@ -101,7 +98,7 @@ class UserRegistrationController:
 
         except Exception as e:
             # Log unexpected errors with sufficient context
-            logger.error(f"Unexpected error while checking user ID '{normalized_user_id}' in Prmst: {str(e)}")
+            logger.error("Unexpected error while checking user ID '%s' in Prmst: %s", normalized_user_id, e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Internal server error during user ID check",
@@ -136,9 +133,9 @@ class UserRegistrationController:
             normalized_email = users.email.strip().lower()
             normalized_user_id = users.user_id.strip().lower()
 
-            logger.debug(f"Normalized Username: '{normalized_username}'")
-            logger.debug(f"Normalized Email: '{normalized_email}'")
-            logger.debug(f"Normalized User ID: '{normalized_user_id}'")
+            logger.debug("Normalized Username: '%s'", normalized_username)
+            logger.debug("Normalized Email: '%s'", normalized_email)
+            logger.debug("Normalized User ID: '%s'", normalized_user_id)
 
             users.username = normalized_username
             users.email = normalized_email
@@ -154,7 +151,7 @@ class UserRegistrationController:
             logger.debug("Password hashed successfully.")
 
             user_data = users.dict()
-            logger.debug(f"User data before processing: {user_data}")
+            logger.debug("User data before processing: %s", user_data)
             
             business_id = user_data.get("businessId")
             accode = ""
@@ -165,7 +162,7 @@ class UserRegistrationController:
             elif (business_id == 100005):
                 accode = "c"
             user_data["accode"] = accode
-            logger.debug(f"Generated Accode: '{accode}'")
+            logger.debug("Generated Accode: '%s'", accode)
 
             if not business_id:
                 error_msg = "Business ID must be provided"
@@ -180,7 +177,7 @@ class UserRegistrationController:
             logger.debug("Updated user data with hashed password and removed confirm_password.")
 
             next_terminal = await self.user_db_controller.get_next_terminal()
-            logger.debug(f"Generated next terminal: {next_terminal}")
+            logger.debug("Generated next terminal: %s", next_terminal)
 
             new_user = ApiUsers(
                 username=users.username, 
@@ -195,7 +192,7 @@ class UserRegistrationController:
                 is_admin="user",  # Changed to directly use the string value
                 accode=accode,
             )
-            logger.debug(f"Creating new user instance: {new_user}")
+            logger.debug("Creating new user instance: %s", new_user)
 
             self.db.add(new_user)
             logger.debug("Added new user to the database.")
@@ -207,7 +204,7 @@ class UserRegistrationController:
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error during user registration: {str(e)}\n{traceback.format_exc()}")
+            logger.error("Error during user registration: %s\n%s", e, traceback.format_exc())
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Internal server error during user registration",
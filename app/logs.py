@@ -1,51 +1,165 @@
+import atexit
+import copy
+import json
 import logging
-import sys
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 
-def setup_logger():
-    logger = logging.getLogger('logs')
-    
-    if not logger.handlers:  # Prevent duplicate handlers
-        logger.setLevel(logging.INFO)  # Changed from DEBUG to INFO level
-        
-        # Create formatters for different levels
-        info_formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s'
-        )
-        
-        error_formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s\n'
-            'File: %(pathname)s, Line: %(lineno)d\n'
-        )
-        
-        # File handler for app.log with rotation (general logs)
-        app_handler = RotatingFileHandler(
-            'app.log',
-            maxBytes=1024 * 1024,  # 1MB
-            backupCount=3,  # Reduced from 5 to 3
-            encoding='utf-8'
-        )
-        app_handler.setLevel(logging.INFO)
-        app_handler.setFormatter(info_formatter)
-        logger.addHandler(app_handler)
-        
-        # Error handler with more detailed formatting
-        error_handler = RotatingFileHandler(
-            'error.log',
-            maxBytes=1024 * 1024,
-            backupCount=3,
-            encoding='utf-8'
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ROOT_LOGGER = 'logs'
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for one JSON object per line, "text" for the classic layout
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Per-logger overrides, e.g. "logs.routers.items_route=DEBUG,sqlalchemy.engine=INFO"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_FILE_BACKUP_COUNT = int(os.getenv("LOG_FILE_BACKUP_COUNT", "5"))
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message, source
+    location, the exception if any, and every field passed in `extra=`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    Enqueues the record itself for the listener thread. Only the message is
+    resolved here, because its args may change once the call returns; the
+    JSON encoding, traceback formatting and file writes happen off the loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _formatters():
+    if LOG_FORMAT == "text":
+        return (
+            logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'),
+            logging.Formatter(
+                '%(asctime)s - %(levelname)s - %(name)s - %(message)s\n'
+                'File: %(pathname)s, Line: %(lineno)d\n'
+            ),
         )
-        error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(error_formatter)
-        logger.addHandler(error_handler)
-        
-        # Console handler for development
-        if os.getenv('FASTAPI_ENV') == 'development':
-            console_handler = logging.StreamHandler(sys.stdout)
-            console_handler.setLevel(logging.INFO)
-            console_handler.setFormatter(info_formatter)
-            logger.addHandler(console_handler)
-        
-    return logger
+    return JsonFormatter(), JsonFormatter()
+
+
+def _apply_levels(spec: str) -> None:
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if level:
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def _configure() -> logging.Logger:
+    """
+    Route every record of the 'logs' hierarchy through a queue. Callers on
+    the event loop only enqueue the record; a listener thread formats it and
+    does the file and console I/O.
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return root
+
+    info_formatter, error_formatter = _formatters()
+
+    # File handler for app.log with rotation (general logs)
+    app_handler = RotatingFileHandler(
+        'app.log',
+        maxBytes=LOG_FILE_MAX_BYTES,
+        backupCount=LOG_FILE_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    app_handler.setFormatter(info_formatter)
+
+    # Error handler with more detailed formatting
+    error_handler = RotatingFileHandler(
+        'error.log',
+        maxBytes=LOG_FILE_MAX_BYTES,
+        backupCount=LOG_FILE_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    error_handler.setLevel(logging.ERROR)
+    error_handler.setFormatter(error_formatter)
+    handlers = [app_handler, error_handler]
+
+    # Console handler for development
+    if os.getenv('FASTAPI_ENV') == 'development':
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(info_formatter)
+        handlers.append(console_handler)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root.handlers = [RecordQueueHandler(records)]
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+    # Library loggers that should end up in the same files
+    for name in ("sqlalchemy.engine",):
+        library = logging.getLogger(name)
+        library.handlers = [RecordQueueHandler(records)]
+        library.propagate = False
+
+    _apply_levels(LOG_LEVELS)
+
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logger(name: Optional[str] = None) -> logging.Logger:
+    """
+    Logger for a module, e.g. setup_logger(__name__) -> 'logs.routers.items_route'.
+    All of them share the queued handlers of the 'logs' logger; LOG_LEVELS can
+    raise or lower one module without touching the others.
+    """
+    root = _configure()
+    if not name or name == ROOT_LOGGER:
+        return root
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -1,10 +1,13 @@
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import uvicorn
 from typing import List
 import logging
 import os
+import time
 from dotenv import load_dotenv
 import json
 from sqlalchemy import inspect
@@ -28,9 +31,20 @@ from routers import (
 from database import engine, Base, get_db, async_session_maker
 from logs import setup_logger
 from utils.auth import session_activity_middleware
+from utils.auth_cache import invalidation_listener as auth_cache_listener
+from utils.scheduler import scheduler
+from utils.maintenance import register_maintenance_jobs
+from utils.session_activity import session_activity
+from utils.passwords import password_hasher
+from utils.pagination import CURSOR_HEADER
+from utils.db_stats import (
+    DB_STATS_HEADERS, UNMATCHED_ROUTE, end_request_stats, endpoint_db_stats, start_request_stats,
+)
+from utils.readiness import readiness
+from utils.metrics import http_request_duration, http_requests_in_flight, http_requests_total, metrics_registry
 
 # Configure logging
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -72,10 +86,10 @@ def validate_env_vars():
             for escape_seq, char in escape_chars.items():
                 if escape_seq in fixed_value:
                     fixed_value = fixed_value.replace(escape_seq, char)
-                    logger.info(f"Replaced escape sequence {escape_seq} with {char} in DATABASE_URL")
+                    logger.info("Replaced escape sequence %s with %s in DATABASE_URL", escape_seq, char)
             
             if fixed_value != value:
-                logger.info(f"Fixed DATABASE_URL: {fixed_value}")
+                logger.info("Fixed DATABASE_URL: %s", fixed_value)
                 os.environ[var_name] = fixed_value
                 value = fixed_value
         
@@ -179,17 +193,30 @@ async def lifespan(app: FastAPI):
         logger.info("Starting up application...")
         await create_database()
         logger.info("Database tables created successfully.")
+        if not scheduler.tasks:
+            register_maintenance_jobs(scheduler)
+        scheduler.start()
+        # Evict auth cache entries that other workers invalidate
+        auth_cache_listener.start()
         yield  # Application runs here
     except Exception as e:
-        logger.error(f"Error during startup: {e}")
+        logger.error("Error during startup: %s", e)
         raise
     finally:
         try:
             logger.info("Shutting down application...")
+            await scheduler.stop()
+            await auth_cache_listener.stop()
+            # Persist activity buffered since the last periodic flush
+            try:
+                await session_activity.flush()
+            except Exception as e:
+                logger.error("Error flushing session activity on shutdown: %s", e)
+            password_hasher.shutdown()
             await engine.dispose()
             logger.info("Application shutdown completed.")
         except Exception as e:
-            logger.error(f"Error during shutdown: {e}")
+            logger.error("Error during shutdown: %s", e)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -220,6 +247,9 @@ except ImportError:
     has_test_routes = False
     logger.warning("Test routes not available")
 
+# Smaller bodies are sent as-is: gzip framing costs more than it saves on them
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+
 # CORS Configuration
 CORS_ORIGINS = [
     "http://localhost",
@@ -236,8 +266,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browser clients need to read the pagination cursor, the ETag to revalidate with
+    # and which bulk orders were left out
+    expose_headers=[
+        CURSOR_HEADER, orders_route.BULK_ORDERS_NOT_CREATED_HEADER, "ETag", "X-DB-Queries", "Server-Timing", "X-DB-Slowest-Ms", "X-DB-Slowest-Statement",
+    ],
 )
 
+# Compress responses above GZIP_MINIMUM_SIZE bytes for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 # Add session activity middleware with database dependency
 @app.middleware("http")
 async def add_db_to_request(request: Request, call_next):
@@ -259,7 +297,7 @@ async def activity_middleware(request: Request, call_next):
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Global exception handler caught: {exc}", exc_info=True)
+    logger.error("Global exception handler caught: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
@@ -271,41 +309,81 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.middleware("http")
 async def debug_request_middleware(request: Request, call_next):
     # Log request details
-    logger.debug(f"Request path: {request.url.path}")
-    logger.debug(f"Request method: {request.method}")
+    logger.debug("Request path: %s", request.url.path)
+    logger.debug("Request method: %s", request.method)
     
-    # Only log request body for specific endpoints that might handle is_admin
-    if request.url.path.endswith(("/login", "/logout", "/registration")):
+    # Only log request body for specific endpoints that might handle is_admin,
+    # and only when debug logging is on: reading it costs every login a copy
+    if logger.isEnabledFor(logging.DEBUG) and request.url.path.endswith(("/login", "/logout", "/registration")):
         try:
             body = await request.body()
             if body:
                 body_str = body.decode()
-                logger.debug(f"Request body: {body_str}")
+                logger.debug("Request body: %s", body_str)
                 # Check for boolean values in the request
                 if '"is_admin":' in body_str and ('true' in body_str.lower() or 'false' in body_str.lower()):
-                    logger.warning(f"Found boolean is_admin in request body for {request.url.path}")
+                    logger.warning("Found boolean is_admin in request body for %s", request.url.path)
         except Exception as e:
-            logger.error(f"Error reading request body: {str(e)}")
+            logger.error("Error reading request body: %s", e)
 
     response = await call_next(request)
 
     # Log response details for errors
     if response.status_code >= 400:
-        logger.error(f"Error response status: {response.status_code}")
+        logger.error("Error response status: %s", response.status_code)
         try:
             response_body = b""
             async for chunk in response.body_iterator:
                 response_body += chunk
-            logger.error(f"Error response body: {response_body.decode()}")
+            logger.error("Error response body: %s", response_body.decode())
             # Reconstruct response since we consumed the body iterator
             return Response(content=response_body, status_code=response.status_code, 
                           headers=dict(response.headers))
         except Exception as e:
-            logger.error(f"Error reading response body: {str(e)}")
+            logger.error("Error reading response body: %s", e)
+
+    return response
+
+# Wraps every other http middleware except request_metrics_middleware, so dependencies such as get_current_user count too
+@app.middleware("http")
+async def db_stats_middleware(request: Request, call_next):
+    stats, token = start_request_stats()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_stats(token)
 
+    route = request.scope.get("route")
+    endpoint_db_stats.add(request.method, getattr(route, "path", UNMATCHED_ROUTE), stats)
+    if DB_STATS_HEADERS:
+        response.headers.update(stats.headers())
     return response
 
-# Health check endpoint
+# Latency, status codes and in-flight requests; outermost, so it times every other middleware too
+@app.middleware("http")
+async def request_metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    http_requests_in_flight.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        http_requests_in_flight.dec()
+        route = getattr(request.scope.get("route"), "path", UNMATCHED_ROUTE)
+        http_requests_total.inc(request.method, route, str(status_code))
+        http_request_duration.observe(time.perf_counter() - started, request.method, route)
+
+# Request, connection pool and per-endpoint database metrics of this worker, in Prometheus text format
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        metrics_registry.render_prometheus() + endpoint_db_stats.render_prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+# Health check endpoint (liveness: no I/O, so a slow database never restarts workers)
 @app.get(
     f"{API_PREFIX}/health",
     tags=["System"],
@@ -325,6 +403,28 @@ async def health_check():
         "api_version": API_VERSION
     }
 
+# Readiness probe for the load balancer
+@app.get(
+    f"{API_PREFIX}/health/ready",
+    tags=["System"],
+    summary="Readiness check",
+    response_model=dict,
+    responses={503: {"description": "Database unreachable or connection pool saturated"}},
+)
+async def readiness_check():
+    """
+    Check whether this worker can serve traffic: a bounded SELECT 1 and the
+    connection pool utilization, plus the maintenance task status.
+    Results are cached for READINESS_CACHE_SECONDS.
+    Returns:
+        dict: Readiness status; 503 when the worker should be taken out of rotation
+    """
+    result = await readiness.result()
+    status_code = (
+        status.HTTP_503_SERVICE_UNAVAILABLE if result["status"] == "unavailable" else status.HTTP_200_OK
+    )
+    return JSONResponse(status_code=status_code, content=jsonable_encoder(result))
+
 # Router configuration
 router_configs = [
     {
@@ -1,5 +1,5 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Numeric, func
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Numeric, DateTime, Index, func, text
 
 
 class Cacus(Base):
@@ -24,4 +24,31 @@ class Cacus(Base):
     xmonper = Column(Numeric(5, 2))  # Monthly monitoring extra sale % (e.g., 5.00)
     xmondiscper = Column(Numeric(5, 2))  # Monthly discount % (e.g., 2.00)
     xisgotmon = Column(String)  # 'True' or 'False' if customer got monitoring offer
-    xisgotdefault = Column(String)  # 'True' or 'False' if customer got default offer
\ No newline at end of file
+    xisgotdefault = Column(String)  # 'True' or 'False' if customer got default offer
+
+
+class CustomerAssignment(Base):
+    """
+    One row per (salesman, customer) pair ever assigned through xsp/xsp1/xsp2/xsp3,
+    maintained by database triggers on cacus. `version` is the id of the last
+    transaction that changed the customer or the assignment; `active` turns
+    false when the salesman is taken off the customer.
+    """
+    __tablename__ = "customer_assignments"
+
+    employee_id = Column(String, primary_key=True)
+    zid = Column(Integer, primary_key=True)
+    xcus = Column(String, primary_key=True)
+    active = Column(Boolean, nullable=False, default=True)
+    version = Column(BigInteger, nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_customer_assignments_employee_version", "employee_id", "version", "zid", "xcus"),
+        # Customer lists of a salesman across businesses, in page order
+        Index(
+            "ix_customer_assignments_employee_active",
+            "employee_id", "xcus", "zid",
+            postgresql_where=text("active"),
+        ),
+    )
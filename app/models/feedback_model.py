@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -6,6 +6,10 @@ from database import Base
 class Feedback(Base):
     """Model for storing customer feedback data."""
     __tablename__ = "feedback"
+    __table_args__ = (
+        # Keyset pagination over the newest-first ordering
+        Index('ix_feedback_created_at_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     zid = Column(Integer, primary_key=True)
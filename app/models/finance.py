@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Date, DateTime, Index
 from database import Base
 
 class GLHeader(Base):
@@ -16,3 +16,41 @@ class GLDetail(Base):
     xsub = Column(String, primary_key=True)
     xproj = Column(String)
     xprime = Column(Float)
+
+
+class CustomerBalanceSnapshot(Base):
+    """
+    A customer's GL balance per project at the end of a month in which the
+    customer had postings: the sum of gldetail.xprime dated up to period_end,
+    opening-balance vouchers excluded. Ledger views start from the latest
+    snapshot before their from date that no queued posting invalidates
+    (see CustomerBalanceSnapshotDirty); the snapshot job and
+    scripts/balance_snapshots.py rebuild them.
+    """
+    __tablename__ = 'customer_balance_snapshot'
+
+    zid = Column(Integer, primary_key=True)
+    xsub = Column(String, primary_key=True)
+    xproj = Column(String, primary_key=True)
+    period_end = Column(Date, primary_key=True)
+    balance = Column(Float, nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class CustomerBalanceSnapshotDirty(Base):
+    """
+    Customers with GL postings the snapshots do not reflect yet, from
+    from_date on. Filled by statement-level triggers on glheader and
+    gldetail; drained by the snapshot job once from_date is in a closed month.
+    Snapshots of a queued customer with period_end >= from_date are stale.
+    """
+    __tablename__ = 'customer_balance_snapshot_dirty'
+
+    zid = Column(Integer, primary_key=True)
+    xsub = Column(String, primary_key=True)
+    from_date = Column(Date, nullable=False)  # earliest posting date queued
+    version = Column(BigInteger, nullable=False)  # highest txid_current() that queued the customer
+
+    __table_args__ = (
+        Index("ix_customer_balance_snapshot_dirty_version", "version"),
+    )
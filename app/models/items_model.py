@@ -2,6 +2,7 @@ from database import Base
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     create_engine,
     Numeric,
@@ -9,7 +10,9 @@ from sqlalchemy import (
     create_engine,
     func,
     Float,
-    Numeric
+    Numeric,
+    DateTime,
+    Index,
 )
 
 
@@ -44,6 +47,39 @@ class Opspprc(Base):
     xdisc = Column(Numeric(10, 2))
 
 
+class StockBalance(Base):
+    """Per-warehouse stock ledger maintained from imtrn by database triggers."""
+    __tablename__ = "stock_balance"
+
+    zid = Column(Integer, primary_key=True)
+    xwh = Column(String, primary_key=True)
+    xitem = Column(String, primary_key=True)
+    stock = Column(Numeric(14, 2), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False)  # Last time a delta was applied
+
+    __table_args__ = (
+        Index("ix_stock_balance_zid_xitem", "zid", "xitem"),
+    )
+
+
+class ItemVersion(Base):
+    """
+    One row per item, stamped with the id of the last transaction that touched
+    the item's catalog row, prices or stock. Maintained by database triggers
+    on caitem, opspprc and stock_balance; read by the delta sync endpoint.
+    """
+    __tablename__ = "item_versions"
+
+    zid = Column(Integer, primary_key=True)
+    xitem = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False)  # txid_current() of the last change
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_item_versions_version", "version", "zid", "xitem"),
+    )
+
+
 # final items view table. 
 
 
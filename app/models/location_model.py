@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, Index
 from sqlalchemy.sql import func
 from database import Base
 
 class LocationRecord(Base):
     """Model for storing location data in the database."""
     __tablename__ = "location_records"
+    __table_args__ = (
+        # Keyset pagination over the newest-first ordering, overall and per user
+        Index('ix_location_records_timestamp_id', 'timestamp', 'id'),
+        Index('ix_location_records_username_timestamp_id', 'username', 'timestamp', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, index=True)  # Foreign key to users table
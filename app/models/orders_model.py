@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, BigInteger, Date
+from sqlalchemy import Column, Integer, String, DateTime, Float, BigInteger, Date, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 from database import Base
 
@@ -94,3 +95,54 @@ class Imtemptdt(Base):
     zid = Column(Integer)
     ximtmptrn = Column(String, primary_key=True)  # character varying
     xlineamt = Column(Float)  # double precision
+
+
+class OrderIdempotency(Base):
+    """Responses of order submissions, keyed by the client's Idempotency-Key header"""
+    __tablename__ = "order_idempotency"
+    __table_args__ = (
+        Index('ix_order_idempotency_created_at', 'created_at'),
+    )
+
+    username = Column(String(50), primary_key=True)
+    idempotency_key = Column(String(100), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # sha256 of endpoint + payload
+    response = Column(JSONB(none_as_null=True), nullable=True)  # NULL while the first submission is still running
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class CustomerSalesMonthly(Base):
+    """
+    Per-customer sales and returns for one calendar month, summed from
+    opord/opodt, imtemptrn/imtemptdt and opcrn/opcdt. Read by the customer
+    detail endpoint for closed months; rewritten by the refresh job for the
+    months queued in customer_sales_monthly_dirty.
+    """
+    __tablename__ = "customer_sales_monthly"
+
+    zid = Column(Integer, primary_key=True)
+    xcus = Column(String, primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    gross_sales = Column(Float, nullable=False, default=0)
+    imtemp_returns = Column(Float, nullable=False, default=0)
+    opcrn_returns = Column(Float, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)  # opord x opodt rows, as the live query counted them
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class CustomerSalesMonthlyDirty(Base):
+    """
+    Customer months whose source documents changed since customer_sales_monthly
+    was last computed. Filled by statement-level triggers on the six sales and
+    return tables; drained by the refresh job.
+    """
+    __tablename__ = "customer_sales_monthly_dirty"
+
+    zid = Column(Integer, primary_key=True)
+    xcus = Column(String, primary_key=True)
+    month = Column(Date, primary_key=True)
+    version = Column(BigInteger, nullable=False)  # highest txid_current() that queued the month
+
+    __table_args__ = (
+        Index("ix_customer_sales_monthly_dirty_version", "version"),
+    )
@@ -9,7 +9,7 @@ from logs import setup_logger
 import traceback
 
 # apiUsers table
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 class ApiUsers(Base):
     __tablename__ = "apiUsers"
@@ -7,8 +7,10 @@ from controllers.db_controllers.customer_balance_controller import CustomerBalan
 from schemas.user_schema import UserRegistrationSchema
 from utils.auth import get_current_normal_user
 from logs import setup_logger
+from utils.streaming import NDJSON_MEDIA_TYPE
+from fastapi.responses import StreamingResponse
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 router = APIRouter(
     prefix="/customer-balance",
@@ -52,15 +54,41 @@ async def get_customer_balance(
         )
         
         # Log successful request
-        logger.info(f"Customer balance retrieved successfully by user {current_user.username} for customer {request.customer} in business {request.zid}")
+        logger.info("Customer balance retrieved successfully by user %s for customer %s in business %s", current_user.username, request.customer, request.zid)
         
         return response
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrieving customer balance for user {current_user.username}: {str(e)}")
+        logger.error("Error retrieving customer balance for user %s: %s", current_user.username, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving customer balance: {str(e)}"
         )
+
+
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}, "description": "One LedgerEntry JSON object per line, OPENING first"}},
+    summary="Stream a customer ledger as NDJSON",
+    description="Same ledger entries as POST /customer-balance/, written as newline-delimited JSON while rows are read; for ranges of several years"
+)
+async def stream_customer_balance(
+    request: CustomerBalanceRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user)
+):
+    controller = CustomerBalanceController(db)
+    to_date = request.to_date or date.today()
+
+    stream = await controller.stream_customer_ledger(
+        zid=request.zid,
+        customer_id=request.customer,
+        start_date=request.frm_date,
+        end_date=to_date,
+        current_user=current_user
+    )
+    logger.info("Customer ledger stream started by user %s for customer %s in business %s", current_user.username, request.customer, request.zid)
+    return stream.response()
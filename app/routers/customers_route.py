@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, status, Query, Depends, Request
+from fastapi import APIRouter, HTTPException, status, Query, Depends, Request, Response
 from schemas.customers_schema import (
     CustomersSchema, 
+    CustomerChangesSchema,
     SalesmanAreaRequest, 
     SalesmanAreaResponse,
     SalesmanAreaUpdateRequest,
@@ -12,11 +13,15 @@ from schemas.customers_schema import (
     IsGotMonitoringOfferSchema
 )
 from schemas.user_schema import UserRegistrationSchema
-from schemas.sales_return_schema import NetSalesWithAllReturnsResponse
-from typing import List, Union
+from schemas.sales_return_schema import NetSalesWithAllReturnsResponse, CustomerSalesSummaryRequest
+from typing import List, Optional, Union
 from typing_extensions import Annotated
 from utils.auth import get_current_normal_user, get_current_admin
 from utils.error import error_details
+from utils.pagination import CURSOR_HEADER, set_next_cursor
+from utils.http_cache import conditional_json
+from utils.streaming import NDJSON_MEDIA_TYPE
+from fastapi.responses import StreamingResponse
 from controllers.db_controllers.customers_db_controller import (
     CustomersDBController,
 )
@@ -26,7 +31,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 
 router = APIRouter()
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 
 
@@ -44,7 +49,7 @@ async def get_customer_by_id(
     try:
         net_sales = await sales_return_db_controller.get_net_sales_with_all_returns(zid, customer_id)
         if not net_sales:
-            logger.info(f"Customer with ID {customer_id} not found in business {zid}")
+            logger.info("Customer with ID %s not found in business %s", customer_id, zid)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Customer with ID {customer_id} not found in business {zid}"
@@ -52,21 +57,52 @@ async def get_customer_by_id(
         return net_sales
 
     except ValueError as e:
-        logger.error(f"Error getting Customer by ID: {e}")
+        logger.error("Error getting Customer by ID: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException as e:
         # Re-raise HTTP exceptions to preserve status code
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error in get_customer_by_id: {e}")
+        logger.error("Unexpected error in get_customer_by_id: %s", e)
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred while retrieving the customer"
         )
 
+# Route to get the customer-by-id summary for a salesman's whole route in one call
+@router.post("/sales-summary", response_model=List[NetSalesWithAllReturnsResponse])
+async def get_customers_sales_summary(
+    request: CustomerSalesSummaryRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user),
+):
+    if (request.customer_ids is None) == (request.employee_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error_details("Provide either customer_ids or employee_id"),
+        )
+
+    sales_return_db_controller = SalesReturnDBController(db)
+
+    try:
+        return await sales_return_db_controller.get_net_sales_for_customers(
+            request.zid, customer_ids=request.customer_ids, employee_id=request.employee_id
+        )
+
+    except ValueError as e:
+        logger.error("Error getting customers sales summary: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Unexpected error in get_customers_sales_summary: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail="An unexpected error occurred while retrieving the sales summary"
+        )
+
 @router.get("/all/{zid}", response_model=List[CustomersSchema])
 async def get_all_customers(
     request: Request,
+    response: Response,
     zid: int,
     customer: Annotated[
         str,
@@ -84,25 +120,30 @@ async def get_all_customers(
     ] ,
     limit: int = 10,
     offset: int = 0,
+    cursor: Annotated[
+        Optional[str],
+        Query(description="Optional: X-Next-Cursor header from the previous page; replaces offset"),
+    ] = None,
     db: AsyncSession = Depends(get_db),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
 ):
     customers_db_controller = CustomersDBController(db)
 
     try:
-        customers = await customers_db_controller.get_all_customers(
-            zid, customer, employee_id, limit, offset, current_user
+        customers, next_cursor = await customers_db_controller.get_all_customers(
+            zid, customer, employee_id, limit, offset, current_user, cursor
         )
+        set_next_cursor(response, next_cursor)
         return customers
 
     except ValueError as e:
-        logger.error(f"Error getting Customer route: {e}")
+        logger.error("Error getting Customer route: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException as e:
         # Re-raise HTTP exceptions to preserve status code
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error in get_all_customers: {e}")
+        logger.error("Unexpected error in get_all_customers: %s", e)
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred while retrieving customers"
@@ -126,37 +167,101 @@ async def get_all_customers_sync(
     ],
     limit: int = 100,
     offset: int = 0,
+    cursor: Annotated[
+        Optional[str],
+        Query(description="Optional: X-Next-Cursor header from the previous page; replaces offset"),
+    ] = None,
     db: AsyncSession = Depends(get_db),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
 ):
     customers_db_controller = CustomersDBController(db)
 
     try:
-        customers = await customers_db_controller.get_all_customers_sync(
-            employee_id, limit, offset, current_user
+        customers, next_cursor = await customers_db_controller.get_all_customers_sync(
+            employee_id, limit, offset, current_user, cursor
         )
         if not customers:
-            logger.info(f"No customers found for employee ID: {employee_id}")
+            logger.info("No customers found for employee ID: %s", employee_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No customers found for employee ID: {employee_id}"
             )
-        return customers
+        # ETag over the page body: an unchanged customer list costs a 304 and no payload
+        headers = {CURSOR_HEADER: next_cursor} if next_cursor else None
+        return conditional_json(request, customers, headers)
 
     except ValueError as e:
-        logger.error(f"Error getting Customer route sync: {e}")
+        logger.error("Error getting Customer route sync: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException as e:
         # Re-raise HTTP exceptions to preserve status code
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error in get_all_customers_sync: {e}")
+        logger.error("Unexpected error in get_all_customers_sync: %s", e)
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred while retrieving customers"
         )
 
 
+@router.get(
+    "/all-sync/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}, "description": "One CustomersSchema JSON object per line"}},
+    summary="Stream a salesman's customers as NDJSON",
+    description="Same customers as /all-sync, written as newline-delimited JSON while rows are read; limit is optional"
+)
+async def stream_all_customers_sync(
+    request: Request,
+    employee_id: Annotated[
+        str,
+        Query(
+            min_length=3,
+            description="Put Employee ID, like SA--000015",
+        ),
+    ],
+    limit: Annotated[Optional[int], Query(ge=1, description="Optional: maximum number of customers; all when omitted")] = None,
+    cursor: Annotated[
+        Optional[str],
+        Query(description="Optional: X-Next-Cursor header from a paged /all-sync request to continue after"),
+    ] = None,
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user),
+):
+    logger.info("stream customers sync endpoint called for employee ID: %s by user: %s", employee_id, current_user.username)
+    return CustomersDBController.stream_all_customers_sync(employee_id, limit, cursor).response()
+
+
+@router.get(
+    "/changes",
+    response_model=CustomerChangesSchema,
+    summary="Customer changes since a sync version",
+    description="Delta sync for a salesman's customer list: customers added, changed or reassigned since the client's last version"
+)
+async def get_customer_changes(
+    request: Request,
+    employee_id: Annotated[
+        str,
+        Query(
+            min_length=3,
+            description="Put Employee ID, like SA--000015",
+        ),
+    ],
+    since: Annotated[int, Query(ge=0, description="`version` from the previous completed sync; 0 for the full list")] = 0,
+    limit: Annotated[int, Query(ge=1, le=5000)] = 500,
+    cursor: Annotated[
+        Optional[str],
+        Query(description="Optional: next_cursor from the previous page of this sync"),
+    ] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user),
+):
+    customers_db_controller = CustomersDBController(db)
+    changes = await customers_db_controller.get_customer_changes(employee_id, since, limit, cursor)
+    if changes.full_resync:
+        logger.info("Customer sync version %s is ahead of the database, asking %s for a full resync", since, employee_id)
+    return changes
+
+
 @router.post("/get-salesman-area-wise", response_model=SalesmanAreaResponse)
 async def get_salesman_by_area(
     request: SalesmanAreaRequest,
@@ -174,7 +279,7 @@ async def get_salesman_by_area(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting salesman info: {str(e)}")
+        logger.error("Error getting salesman info: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error retrieving salesman information"
@@ -202,7 +307,7 @@ async def update_salesman_by_area(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating salesman assignments: {str(e)}")
+        logger.error("Error updating salesman assignments: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error updating salesman assignments"
@@ -212,6 +317,7 @@ async def update_salesman_by_area(
 @router.post("/get-area-by-zid", response_model=AreaResponse)
 async def get_areas_by_zid(
     request: AreaByZidRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user)
 ):
@@ -222,11 +328,11 @@ async def get_areas_by_zid(
             zid=request.zid,
             user_id=request.user_id
         )
-        return result
+        return conditional_json(http_request, AreaResponse(**result))
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting areas: {str(e)}")
+        logger.error("Error getting areas: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error retrieving areas"
@@ -270,7 +376,7 @@ async def create_offer(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating offer: {str(e)}")
+        logger.error("Error creating offer: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error creating offer"
@@ -293,7 +399,7 @@ async def is_got_monitoring_offer(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error checking monitoring offer: {str(e)}")
+        logger.error("Error checking monitoring offer: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error checking monitoring offer"
@@ -317,7 +423,7 @@ async def is_got_default_offer(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error checking default offer: {str(e)}")
+        logger.error("Error checking default offer: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error checking default offer"
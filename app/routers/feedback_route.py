@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from controllers.db_controllers.feedback_db_controller import FeedbackDBController
@@ -6,6 +6,7 @@ from schemas.feedback_schema import FeedbackCreate, FeedbackResponse, FeedbackQu
 from schemas.user_schema import UserRegistrationSchema
 from utils.auth import get_current_normal_user
 from logs import setup_logger
+from utils.pagination import set_next_cursor
 from typing import List
 
 router = APIRouter(
@@ -16,7 +17,7 @@ router = APIRouter(
     }
 )
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 @router.post(
     "/create",
@@ -46,7 +47,7 @@ async def create_feedback(
         # Use the dictionary result directly with Pydantic model
         return FeedbackResponse(**result)
     except Exception as e:
-        logger.error(f"Error creating feedback: {str(e)}")
+        logger.error("Error creating feedback: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating feedback: {str(e)}"
@@ -57,6 +58,7 @@ async def create_feedback(
     response_model=List[FeedbackResponse]
 )
 async def get_feedbacks(
+    response: Response,
     zid: int = None,
     customer_id: str = None,
     product_id: str = None,
@@ -64,6 +66,7 @@ async def get_feedbacks(
     is_collection_issue: bool = None,
     limit: int = 50,
     offset: int = 0,
+    cursor: str = None,
     db: AsyncSession = Depends(get_db),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user)
 ):
@@ -77,6 +80,7 @@ async def get_feedbacks(
     - **is_collection_issue**: Filter by collection issue status
     - **limit**: Maximum number of results (default: 50)
     - **offset**: Number of results to skip (default: 0)
+    - **cursor**: X-Next-Cursor header from the previous page; replaces offset
     """
     try:
         query_params = FeedbackQuery(
@@ -86,16 +90,20 @@ async def get_feedbacks(
             is_delivery_issue=is_delivery_issue,
             is_collection_issue=is_collection_issue,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
         
         feedback_controller = FeedbackDBController(db)
-        results = await feedback_controller.get_feedbacks(query_params)
+        results, next_cursor = await feedback_controller.get_feedbacks(query_params)
+        set_next_cursor(response, next_cursor)
         
         # Convert to response format
         return [FeedbackResponse(**result) for result in results]
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error getting feedbacks: {str(e)}")
+        logger.error("Error getting feedbacks: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting feedbacks: {str(e)}"
@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response
 from typing import List, Union, Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from controllers.db_controllers.items_db_controller import ItemsDBController
-from schemas.items_schema import ItemsSchema, ItemsBaseSchema
+from schemas.items_schema import ItemsSchema, ItemsBaseSchema, ItemChangesSchema
 from logs import setup_logger
 from utils.auth import get_current_user, get_current_admin, get_current_normal_user
 from schemas.user_schema import UserRegistrationSchema
 from utils.error import error_details
+from utils.pagination import CURSOR_HEADER, set_next_cursor
+from utils.http_cache import conditional_json
+from utils.streaming import NDJSON_MEDIA_TYPE
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 # This route comes first to prevent "/all/sync" from being interpreted as "/all/{zid}" with zid=sync
 @router.get(
@@ -21,21 +25,64 @@ async def get_all_items_sync(
     item_name: Annotated[Union[str, None], Query(description="Optional: Put Items ID or Items Name to filter results")] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Annotated[Union[str, None], Query(description="Optional: X-Next-Cursor header from the previous page; replaces offset")] = None,
     db: AsyncSession = Depends(get_db),    
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
 ):
-    logger.info(f"get all items sync endpoint called: {request.url.path} by user: {current_user.username} (ID: {current_user.id})")
+    logger.info("get all items sync endpoint called: %s by user: %s (ID: %s)", request.url.path, current_user.username, current_user.id)
     items_db_controller = ItemsDBController(db)
     
-    items = await items_db_controller.get_all_items_sync(
-        item_name=item_name, limit=limit, offset=offset
+    items, next_cursor = await items_db_controller.get_all_items_sync(
+        item_name=item_name, limit=limit, offset=offset, cursor=cursor
     )
     if not items: 
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=error_details("No items found"),
         )
-    return items
+    # ETag over the page body: an unchanged catalog page costs a 304 and no payload
+    headers = {CURSOR_HEADER: next_cursor} if next_cursor else None
+    return conditional_json(request, items, headers)
+
+
+@router.get(
+    "/all/sync/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}, "description": "One ItemsSchema JSON object per line"}},
+    summary="Stream the sync catalog as NDJSON",
+    description="Same items as /all/sync, written as newline-delimited JSON while rows are read; limit is optional"
+)
+async def stream_all_items_sync(
+    request: Request,
+    item_name: Annotated[Union[str, None], Query(description="Optional: Put Items ID or Items Name to filter results")] = None,
+    limit: Annotated[Union[int, None], Query(ge=1, description="Optional: maximum number of items; all when omitted")] = None,
+    cursor: Annotated[Union[str, None], Query(description="Optional: X-Next-Cursor header from a paged /all/sync request to continue after")] = None,
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user),
+):
+    logger.info("stream all items sync endpoint called: %s by user: %s (ID: %s)", request.url.path, current_user.username, current_user.id)
+    return ItemsDBController.stream_all_items_sync(item_name=item_name, limit=limit, cursor=cursor).response()
+
+
+@router.get(
+    "/changes", response_model=ItemChangesSchema,
+    summary="Item changes since a sync version",
+    description="Delta sync for the offline catalog: items upserted or deleted since the client's last version"
+)
+async def get_item_changes(
+    request: Request,
+    since: Annotated[int, Query(ge=0, description="`version` from the previous completed sync; 0 for the full catalog")] = 0,
+    limit: Annotated[int, Query(ge=1, le=5000)] = 500,
+    cursor: Annotated[Union[str, None], Query(description="Optional: next_cursor from the previous page of this sync")] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user),
+):
+    logger.info("get item changes endpoint called: %s since %s by user: %s (ID: %s)", request.url.path, since, current_user.username, current_user.id)
+    items_db_controller = ItemsDBController(db)
+
+    changes = await items_db_controller.get_item_changes(since=since, limit=limit, cursor=cursor)
+    if changes.full_resync:
+        logger.info("Item sync version %s is ahead of the database, asking %s for a full resync", since, current_user.username)
+    return changes
 
 
 @router.get(
@@ -43,24 +90,27 @@ async def get_all_items_sync(
 )
 async def get_all_items(
     request: Request,
+    response: Response,
     zid: int,
     item_name: Annotated[Union[str, None], Query(description="Optional: Put Items ID or Items Name to filter results")] = None,
     limit: int = 10,
     offset: int = 0,
+    cursor: Annotated[Union[str, None], Query(description="Optional: X-Next-Cursor header from the previous page; replaces offset")] = None,
     db: AsyncSession = Depends(get_db),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
 ):
-    logger.info(f"get all items endpoint called: {request.url.path}")
+    logger.info("get all items endpoint called: %s", request.url.path)
     items_db_controller = ItemsDBController(db)
     
-    items = await items_db_controller.get_all_items(
-        zid=zid, item_name=item_name, limit=limit, offset=offset
+    items, next_cursor = await items_db_controller.get_all_items(
+        zid=zid, item_name=item_name, limit=limit, offset=offset, cursor=cursor
     )
     if not items:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=error_details("No items found"),
         )
+    set_next_cursor(response, next_cursor)
     return items
 
 @router.get(
@@ -75,7 +125,7 @@ async def get_single_item(
     db: AsyncSession = Depends(get_db),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
 ):
-    logger.info(f"get single item endpoint called: {request.url.path} by user: {current_user.username} (ID: {current_user.id})")
+    logger.info("get single item endpoint called: %s by user: %s (ID: %s)", request.url.path, current_user.username, current_user.id)
     items_db_controller = ItemsDBController(db)
     
     item = await items_db_controller.get_single_item(zid=zid, item_id=item_id)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db, async_session_maker
 from controllers.db_controllers.location_db_controller import LocationDBController
@@ -6,6 +6,7 @@ from schemas.location_schema import LocationCreate, Location, LocationQuery
 from schemas.user_schema import UserRegistrationSchema
 from utils.auth import get_current_normal_user
 from utils.error import error_details
+from utils.pagination import set_next_cursor
 from logs import setup_logger
 from typing import List, Optional
 from asyncio import Queue
@@ -19,7 +20,7 @@ router = APIRouter(
     }
 )
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 # Configure the maximum number of concurrent operations
 MAX_CONCURRENT_OPERATIONS = 5
@@ -67,7 +68,7 @@ async def create_location(
 ):
     """Create a new location record for a user."""
     try:
-        logger.info(f"Create location endpoint called: {request.url.path} by user: {current_user.username} (ID: {current_user.id})")
+        logger.info("Create location endpoint called: %s by user: %s (ID: %s)", request.url.path, current_user.username, current_user.id)
         
         # Ensure the user can only create locations for themselves unless they're an admin
         if location_data.username != current_user.username and not current_user.is_admin:
@@ -80,7 +81,7 @@ async def create_location(
         
         return convert_to_location_response(location_record)
     except Exception as e:
-        logger.error(f"Error creating location record: {str(e)}")
+        logger.error("Error creating location record: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_details(f"Error creating location record: {str(e)}")
@@ -95,18 +96,20 @@ async def create_location(
 )
 async def get_locations(
     request: Request,
+    response: Response,
     username: Optional[str] = None,
     business_id: Optional[int] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     limit: Optional[int] = 50,
     offset: Optional[int] = 0,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header from the previous page; replaces offset"),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Query location records based on various filters."""
     try:
-        logger.info(f"Query locations endpoint called: {request.url.path} by user: {current_user.username} (ID: {current_user.id})")
+        logger.info("Query locations endpoint called: %s by user: %s (ID: %s)", request.url.path, current_user.username, current_user.id)
         
         # Convert date strings to datetime objects if provided
         start_datetime = None
@@ -150,20 +153,24 @@ async def get_locations(
             start_date=start_datetime,
             end_date=end_datetime,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
         
         location_db_controller = LocationDBController(db)
-        locations = await location_db_controller.get_locations(query_params)
+        locations, next_cursor = await location_db_controller.get_locations(query_params)
         
         if not locations:
             logger.info("No location records found matching query")
             return []
         
-        logger.info(f"Found {len(locations)} location records")
+        logger.info("Found %s location records", len(locations))
+        set_next_cursor(response, next_cursor)
         return [convert_to_location_response(location) for location in locations]
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error querying location records: {str(e)}")
+        logger.error("Error querying location records: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_details(f"Error querying location records: {str(e)}")
@@ -184,7 +191,7 @@ async def get_last_location(
 ):
     """Get the most recent location for a specific user."""
     try:
-        logger.info(f"Get last location endpoint called: {request.url.path} by user: {current_user.username} (ID: {current_user.id})")
+        logger.info("Get last location endpoint called: %s by user: %s (ID: %s)", request.url.path, current_user.username, current_user.id)
         
         # Non-admin users can only get their own last location
         if username != current_user.username and not current_user.is_admin:
@@ -197,12 +204,12 @@ async def get_last_location(
         location = await location_db_controller.get_last_location(username)
         
         if not location:
-            logger.info(f"No location record found for user {username}")
+            logger.info("No location record found for user %s", username)
             return None
         
         return convert_to_location_response(location)
     except Exception as e:
-        logger.error(f"Error getting last location: {str(e)}")
+        logger.error("Error getting last location: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_details(f"Error getting last location: {str(e)}")
@@ -19,7 +19,7 @@ import csv
 import io
 
 router = APIRouter()
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 @router.get(
     "/mo/{zid}",
@@ -118,7 +118,7 @@ async def get_mo_detail(
         # Re-raise HTTP exceptions without modifying them
         raise he
     except Exception as e:
-        logger.error(f"Error in get_mo_detail: {str(e)}")
+        logger.error("Error in get_mo_detail: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_details(f"Failed to retrieve manufacturing order details: {str(e)}")
@@ -207,7 +207,7 @@ async def export_mo_detail_csv(
         # Re-raise HTTP exceptions without modifying them
         raise he
     except Exception as e:
-        logger.error(f"Error in export_mo_detail_csv: {str(e)}")
+        logger.error("Error in export_mo_detail_csv: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_details(f"Failed to export manufacturing order details: {str(e)}")
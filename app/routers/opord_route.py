@@ -2,5 +2,5 @@ from fastapi import APIRouter
 from logs import setup_logger
 router = APIRouter()
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
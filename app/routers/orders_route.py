@@ -1,17 +1,18 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db, async_session_maker
-from fastapi import APIRouter, status, Depends, HTTPException, Request, Path, Query
+from database import get_db
+from fastapi import APIRouter, status, Depends, HTTPException, Request, Response, Path, Query, Header
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from typing import List, Optional
-import asyncio
-from asyncio import Queue
+import time
 
-from schemas.orders_schema import OpmobSchema, BulkOpmobSchema, OpmobResponse
+from schemas.orders_schema import OpmobSchema, BulkOpmobSchema, OpmobResponse, BulkOrderReport
 from schemas.order_summary_schema import OrderSummaryListResponse
 from schemas.user_schema import UserRegistrationSchema
 from logs import setup_logger
 from utils.auth import get_current_normal_user
 from utils.permissions import has_permission
+from utils.idempotency import run_idempotent
 from controllers.db_controllers.orders_db_controller import OrderDBController
 import traceback
 from datetime import datetime
@@ -24,10 +25,10 @@ router = APIRouter(
     }
 )
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
-# Configure the maximum number of concurrent operations
-MAX_CONCURRENT_OPERATIONS = 5
+# Indexes of the orders /create-bulk-order left out, comma separated
+BULK_ORDERS_NOT_CREATED_HEADER = "Bulk-Orders-Not-Created"
 
 # Helper to convert Opmob object to OpmobResponse
 def convert_to_opmob_response(item) -> OpmobResponse:
@@ -65,59 +66,6 @@ def convert_to_opmob_response(item) -> OpmobResponse:
     }
     return OpmobResponse(**item_dict)
 
-async def process_single_order(order: OpmobSchema, current_user: UserRegistrationSchema) -> List[OpmobResponse]:
-    """Process a single order with its own database session"""
-    session = async_session_maker()
-    try:
-        logger.info(f"Creating new database session for order processing customer: {order.xcus}")
-        order_db_controller = OrderDBController(session)
-        
-        # Removed the session.begin() context manager as the controller handles its own transactions
-        logger.info(f"Starting order creation for customer {order.xcus} with {len(order.items)} items")
-        created_items = await order_db_controller.create_order(order.zid, order, current_user)
-        logger.info(f"Order created successfully for customer {order.xcus} with {len(created_items)} items")
-        
-        # Convert DB models to Pydantic models
-        response_items = [convert_to_opmob_response(item) for item in created_items]
-        logger.info(f"Converted {len(response_items)} DB items to response models")
-        return response_items
-    except Exception as e:
-        logger.error(f"Error processing order for customer {order.xcus}: {str(e)}\n{traceback.format_exc()}")
-        raise
-    finally:
-        await session.close()
-        logger.info(f"Closed database session for customer {order.xcus}")
-
-async def process_order_queue(queue: Queue, current_user: UserRegistrationSchema) -> List[OpmobResponse]:
-    """Process orders from the queue concurrently"""
-    created_items = []
-    orders_processed = 0
-    while True:
-        try:
-            order = await queue.get()
-            if order is None:  # Sentinel value to indicate end of queue
-                logger.info("Worker received sentinel value, ending processing")
-                break
-            
-            orders_processed += 1
-            logger.info(f"Processing order #{orders_processed} for customer {order.xcus} with {len(order.items)} items")
-                
-            items = await process_single_order(order, current_user)
-            if items:
-                created_items.extend(items)
-                logger.info(f"Added {len(items)} items to result, total: {len(created_items)}")
-            else:
-                logger.warning(f"Order processing returned no items for customer {order.xcus}")
-        except Exception as e:
-            logger.error(f"Error processing order: {str(e)}\n{traceback.format_exc()}")
-            # Continue processing other orders
-        finally:
-            queue.task_done()
-    
-    # Log the results for debugging
-    logger.info(f"Worker finished with {len(created_items)} items")
-    return created_items
-
 async def handle_order_creation(
     request: Request,
     zid: int,
@@ -125,22 +73,23 @@ async def handle_order_creation(
     current_user: UserRegistrationSchema,
     db: AsyncSession
 ) -> List[OpmobResponse]:
-    """Helper function to handle order creation logic"""
+    """Helper function to handle order creation logic; the caller commits"""
     try:
         order_db_controller = OrderDBController(db)
-        db_items = await order_db_controller.create_order(zid, order, current_user)
-        logger.info(f"Order created by {current_user.username}, id {current_user.user_id}")
+        # run_idempotent commits the lines together with the stored response
+        db_items = await order_db_controller.create_order(zid, order, current_user, commit=False)
+        logger.info("Order created by %s, id %s", current_user.username, current_user.user_id)
         
         # Convert DB models to Pydantic models
         return [convert_to_opmob_response(item) for item in db_items]
     except ValueError as e:
-        logger.error(f"Validation error creating order: {e}")
+        logger.error("Validation error creating order: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={"message": str(e), "type": "validation_error"}
         )
     except Exception as e:
-        logger.error(f"Unexpected error creating order: {traceback.format_exc()}")
+        logger.error("Unexpected error creating order: %s", traceback.format_exc())
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail={"message": "Internal server error", "type": "server_error"}
@@ -156,97 +105,128 @@ async def handle_order_creation(
 @has_permission("order.create")  # Apply permission check
 async def create_order(
     request: Request,
+    response: Response,
     order: OpmobSchema,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Client-generated ID; retries with the same key return the original lines"),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
     db: AsyncSession = Depends(get_db)
 ):
-    return await handle_order_creation(request, order.zid, order, current_user, db)
+    return await run_idempotent(
+        db, current_user.username, idempotency_key, request.url.path, order, response,
+        lambda: handle_order_creation(request, order.zid, order, current_user, db)
+    )
+
+async def handle_bulk_order_ingestion(
+    orders_data: BulkOpmobSchema,
+    current_user: UserRegistrationSchema,
+    db: AsyncSession,
+    atomic: bool = False
+) -> BulkOrderReport:
+    """Helper function to ingest a batch of orders in one transaction and report per-order results; the caller commits"""
+    started = time.perf_counter()
+    try:
+        order_db_controller = OrderDBController(db)
+        results, db_items = await order_db_controller.ingest_bulk_orders(
+            orders_data.orders, current_user, atomic=atomic, commit=False
+        )
+    except Exception:
+        logger.error("Unexpected error creating bulk orders: %s", traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"message": "Error creating bulk orders", "type": "server_error"}
+        )
+    elapsed = time.perf_counter() - started
+
+    created = sum(1 for result in results if result.status == "created")
+    report = BulkOrderReport(
+        received=len(results),
+        created=created,
+        rejected=sum(1 for result in results if result.status == "rejected"),
+        failed=sum(1 for result in results if result.status == "failed"),
+        lines_created=len(db_items),
+        elapsed_ms=round(elapsed * 1000, 2),
+        orders_per_second=round(created / elapsed, 2) if elapsed > 0 else 0.0,
+        results=results,
+        items=[convert_to_opmob_response(item) for item in db_items],
+    )
+    logger.info(
+        "Bulk order by %s: %s/%s orders created, %s rejected, %s failed, %s lines in %s ms (%s orders/s)", current_user.username, report.created, report.received, report.rejected, report.failed, report.lines_created, report.elapsed_ms, report.orders_per_second
+    )
+    return report
 
 @router.post(
     "/create-bulk-order",
     status_code=status.HTTP_201_CREATED,
     response_model=List[OpmobResponse],
     summary="Create multiple orders in bulk",
-    description="Creates multiple orders at once for different customers using concurrent processing"
+    description="Creates multiple orders at once for different customers in a single transaction. Orders that are rejected or fail are left out and their indexes listed in the Bulk-Orders-Not-Created header; with atomic=true nothing is created unless every order is valid",
+    responses={422: {"description": "With atomic=true: at least one order was rejected or failed; nothing was created"}}
 )
 # @has_permission("order.bulk_create")  # Apply permission check for bulk operations
 async def create_bulk_order(
     request: Request,
+    response: Response,
     orders_data: BulkOpmobSchema,
+    atomic: bool = Query(False, description="Create nothing and answer 422 with every order's errors unless all orders are valid"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Client-generated ID; retries with the same key return the original lines"),
     current_user: UserRegistrationSchema = Depends(get_current_normal_user),
     db: AsyncSession = Depends(get_db)
 ):    
     """
-        Create multiple orders concurrently using an asyncio Queue to manage concurrency.
+        Create multiple orders and return the created lines. Orders that are
+        not created are listed by index in the Bulk-Orders-Not-Created
+        header; /create-bulk-order/report returns their errors.
     """
-    logger.info(f"Create bulk order endpoint called: {request.url.path} by user: {current_user.username} (ID: {current_user.id}) with {len(orders_data.orders)} orders")
+    logger.info("Create bulk order endpoint called: %s by user: %s (ID: %s) with %s orders", request.url.path, current_user.username, current_user.id, len(orders_data.orders))
     
     if not orders_data.orders:
         logger.warning("No orders provided in request")
         return []
-    
-    try:
-        # Log request details
-        logger.info(f"Processing bulk order request with {len(orders_data.orders)} orders")
-        logger.info(f"First order data: Customer: {orders_data.orders[0].xcus}, Items: {len(orders_data.orders[0].items)}")
-        
-        # For non-concurrent processing (fallback)
-        if len(orders_data.orders) == 1:
-            logger.info("Processing single order directly")
-            order_controller = OrderDBController(db)
-            db_items = await order_controller.create_order(
-                orders_data.orders[0].zid, 
-                orders_data.orders[0], 
-                current_user
+
+    async def create_items():
+        report = await handle_bulk_order_ingestion(orders_data, current_user, db, atomic=atomic)
+        if atomic and (report.rejected or report.failed):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "message": f"{report.rejected} rejected and {report.failed} failed of {report.received} orders; nothing was created",
+                    "type": "validation_error",
+                    "results": jsonable_encoder(report.results),
+                }
             )
-            # logger.info(f"Single order processed, created {len(db_items)} items")
-            # Convert DB models to Pydantic response models
-            response_items = [convert_to_opmob_response(item) for item in db_items]
-            # logger.info(f"Returning {len(response_items)} response items")
-            return response_items
-        
-        # Create a queue and populate it with orders
-        order_queue = Queue()
-        for order in orders_data.orders:
-            await order_queue.put(order)
-            
-        # Add sentinel values to signal end of queue
-        worker_count = min(MAX_CONCURRENT_OPERATIONS, len(orders_data.orders))
-        for _ in range(worker_count):
-            await order_queue.put(None)
-        
-        # logger.info(f"Starting {worker_count} worker tasks")
-        
-        # Process orders concurrently
-        tasks = []
-        for i in range(worker_count):
-            task = asyncio.create_task(process_order_queue(order_queue, current_user))
-            tasks.append(task)
-        
-        # Wait for all tasks to complete
-        all_results = await asyncio.gather(*tasks)
-        # logger.info(f"All tasks completed, merging results from {len(all_results)} workers")
-        
-        # Merge results from all workers
-        final_results = []
-        for result_list in all_results:
-            if isinstance(result_list, list):
-                final_results.extend(result_list)
-                logger.info(f"Added {len(result_list)} items from a worker")
-            else:
-                logger.warning(f"Worker returned non-list result: {type(result_list)}")
-        
-        logger.info(f"Final result has {len(final_results)} items")
-        
-        # Our results are already Pydantic models at this point
-        return final_results
-        
-    except Exception as e:
-        logger.error(f"Unexpected error creating bulk orders: {traceback.format_exc()}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail={"message": f"Error creating bulk orders: {str(e)}", "type": "server_error"}
-        )
+        not_created = [str(result.index) for result in report.results if result.status != "created"]
+        if not_created:
+            response.headers[BULK_ORDERS_NOT_CREATED_HEADER] = ",".join(not_created)
+        return report.items
+
+    return await run_idempotent(
+        db, current_user.username, idempotency_key, request.url.path, orders_data, response, create_items
+    )
+
+@router.post(
+    "/create-bulk-order/report",
+    status_code=status.HTTP_201_CREATED,
+    response_model=BulkOrderReport,
+    summary="Create multiple orders in bulk with per-order results",
+    description="Validates the whole batch up front, writes all lines in one transaction and reports the outcome of every order"
+)
+async def create_bulk_order_report(
+    request: Request,
+    response: Response,
+    orders_data: BulkOpmobSchema,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", description="Client-generated ID; retries with the same key return the original report"),
+    current_user: UserRegistrationSchema = Depends(get_current_normal_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+        Create multiple orders and return a per-order report including
+        validation rejections, database failures and throughput.
+    """
+    logger.info("Create bulk order report endpoint called by user: %s with %s orders", current_user.username, len(orders_data.orders))
+    return await run_idempotent(
+        db, current_user.username, idempotency_key, request.url.path, orders_data, response,
+        lambda: handle_bulk_order_ingestion(orders_data, current_user, db)
+    )
 
 @router.get(
     "/get-pending-orders",
@@ -272,7 +252,7 @@ async def get_pending_orders(
         )
         return result
     except Exception as e:
-        logger.error(f"Error retrieving pending orders: {str(e)}")
+        logger.error("Error retrieving pending orders: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving pending orders: {str(e)}"
@@ -302,7 +282,7 @@ async def get_confirmed_orders(
         )
         return result
     except Exception as e:
-        logger.error(f"Error retrieving confirmed orders: {str(e)}")
+        logger.error("Error retrieving confirmed orders: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving confirmed orders: {str(e)}"
@@ -332,7 +312,7 @@ async def get_cancelled_orders(
         )
         return result
     except Exception as e:
-        logger.error(f"Error retrieving cancelled orders: {str(e)}")
+        logger.error("Error retrieving cancelled orders: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving cancelled orders: {str(e)}"
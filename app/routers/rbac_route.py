@@ -109,7 +109,7 @@ class UserRoleAssign(BaseModel):
             }
         }
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 router = APIRouter(
     prefix="/rbac",
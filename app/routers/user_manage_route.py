@@ -9,6 +9,8 @@ from utils.auth import get_current_admin
 from logs import setup_logger
 from typing import List
 from models.users_model import ApiUsers
+from utils.scheduler import scheduler
+from utils.passwords import password_hasher
 
 router = APIRouter(
     prefix="/user-manage",
@@ -16,7 +18,7 @@ router = APIRouter(
     dependencies=[Depends(get_current_admin)],  # All routes require admin access
 )
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 @router.delete("/{username}")
 async def delete_user(
@@ -39,6 +41,16 @@ async def update_user_status(
         new_status=user_status.status
     )
 
+@router.get("/maintenance")
+async def get_maintenance_status():
+    """Run metrics of the background maintenance tasks in this worker"""
+    return scheduler.status()
+
+@router.get("/password-pool")
+async def get_password_pool_status():
+    """Queue depth and throughput of the password hashing pool in this worker"""
+    return password_hasher.stats()
+
 @router.get("/get-all-users", response_model=List[UserOutSchema])
 async def get_all_users(
     current_admin: dict = Depends(get_current_admin),
@@ -69,7 +81,7 @@ async def get_all_users(
             user_list.append(user_dict)
         return user_list
     except Exception as e:
-        logger.error(f"Error retrieving users: {str(e)}")
+        logger.error("Error retrieving users: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving users: {str(e)}"
@@ -91,7 +103,7 @@ async def update_user(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in update_user endpoint: {str(e)}")
+        logger.error("Error in update_user endpoint: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while updating user"
@@ -20,6 +20,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 from sqlalchemy.future import select
 from models.users_model import Logged, TokenBlacklist, ApiUsers
+from utils.auth_cache import invalidate_token
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -28,7 +29,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 router = APIRouter()
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 @router.post("/registration", status_code=status.HTTP_201_CREATED)
 async def user_registration(
@@ -39,11 +40,11 @@ async def user_registration(
     try:
         user_registration_controller = UserRegistrationController(db)
         result = await user_registration_controller.register_user(user_data)
-        logger.info(f"User {user_data.username} registered successfully from {request.client.host}")
+        logger.info("User %s registered successfully from %s", user_data.username, request.client.host)
         return result
     except Exception as e:
         # Only log the error message without traceback
-        logger.error(f"Registration error: {str(e)}")
+        logger.error("Registration error: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(
@@ -63,7 +64,7 @@ async def login(
         return result
     except Exception as e:
         # Only log the error message without traceback
-        logger.error(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(
@@ -79,11 +80,11 @@ async def logout(
 ):
     try:
         user_login_controller = UserLoginController(db)
-        logger.debug(f"Logging out user: {current_user.username}")
+        logger.debug("Logging out user: %s", current_user.username)
         return await user_login_controller.user_logout(token, current_user.username)
     except Exception as e:
-        logger.debug(f"Logging out user: {current_user}")
-        logger.error(f"Logout error: {str(e)}\n{traceback.format_exc()}")
+        logger.debug("Logging out user: %s", current_user)
+        logger.error("Logout error: %s\n%s", e, traceback.format_exc())
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(
@@ -167,11 +168,14 @@ async def refresh_token(
         new_access_token = await create_access_token(data=token_data)
         
         # Update session
+        previous_access_token = logged_user.access_token
         logged_user.access_token = new_access_token
         logged_user.zutime = datetime.utcnow()
         await db.commit()
+        # The replaced access token no longer has a session behind it
+        invalidate_token(previous_access_token)
         
-        logger.info(f"Access token refreshed for user {username} from {request.client.host}")
+        logger.info("Access token refreshed for user %s from %s", username, request.client.host)
         
         return {
             "access_token": new_access_token,
@@ -181,7 +185,7 @@ async def refresh_token(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Token refresh error: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Token refresh error: %s\n%s", e, traceback.format_exc())
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Unexpected error during token refresh"
@@ -217,7 +221,7 @@ async def get_current_user_info(
             is_admin=user.is_admin
         )
     except Exception as e:
-        logger.error(f"Error getting user info: {str(e)}")
+        logger.error("Error getting user info: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not get user information"
@@ -22,6 +22,19 @@ class CustomersSchema(BaseModel):
     class Config:
         from_attributes = True
 
+class CustomerKeySchema(BaseModel):
+    zid: int
+    xcus: str
+
+class CustomerChangesSchema(BaseModel):
+    """Delta sync response for a salesman's customer list"""
+    since: int
+    version: int  # Send back as `since` on the next sync, once next_cursor is None
+    full_resync: bool = False  # Drop the local customer list and sync again from version 0
+    upserts: List[CustomersSchema]
+    deletes: List[CustomerKeySchema]  # Customers deleted or no longer assigned to the salesman
+    next_cursor: Optional[str] = None  # More changes in this sync; pass as `cursor` with the same `since`
+
 class SalesmanAreaRequest(BaseModel):
     """Request schema for getting salesman by area"""
     zid: int
@@ -54,4 +54,5 @@ class FeedbackQuery(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     limit: Optional[int] = 50
-    offset: Optional[int] = 0
\ No newline at end of file
+    offset: Optional[int] = 0
+    cursor: Optional[str] = None  # Keyset cursor from a previous page; replaces offset
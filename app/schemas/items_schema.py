@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
 
 
 class ItemsBaseSchema(BaseModel):
@@ -18,6 +19,21 @@ class ItemsBaseSchema(BaseModel):
 class ItemsSchema(ItemsBaseSchema):
     min_disc_qty: float
     disc_amt: float
+    stock_updated_at: Optional[datetime] = None  # When the stock ledger row last changed
 
     class Config:
         from_attributes = True
+
+
+class ItemKeySchema(BaseModel):
+    zid: int
+    item_id: str
+
+
+class ItemChangesSchema(BaseModel):
+    since: int
+    version: int  # Send back as `since` on the next sync, once next_cursor is None
+    full_resync: bool = False  # Drop the local catalog and sync again from version 0
+    upserts: List[ItemsSchema]
+    deletes: List[ItemKeySchema]
+    next_cursor: Optional[str] = None  # More changes in this sync; pass as `cursor` with the same `since`
@@ -46,3 +46,4 @@ class LocationQuery(BaseModel):
     end_date: Optional[datetime] = None
     limit: Optional[int] = 50
     offset: Optional[int] = 0
+    cursor: Optional[str] = None  # Keyset cursor from a previous page; replaces offset
@@ -161,6 +161,28 @@ class BulkOpmobSchema(BaseModel):
         }
 
 
+class BulkOrderResult(BaseModel):
+    index: int  # Position of the order in the submitted batch
+    zid: int
+    xcus: str
+    status: str  # "created", "rejected" (failed validation), "failed" (database error) or "skipped" (atomic batch not written)
+    invoiceno: Optional[str] = None
+    lines: int = 0
+    errors: List[str] = []
+
+
+class BulkOrderReport(BaseModel):
+    received: int
+    created: int
+    rejected: int
+    failed: int
+    lines_created: int
+    elapsed_ms: float
+    orders_per_second: float
+    results: List[BulkOrderResult]
+    items: List[OpmobResponse]
+
+
 class GrossSalesResponse(BaseModel):
     gross_sales: float
     total_quantity: int
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class NetSalesWithAllReturnsResponse(BaseModel):
     # Customer Info
@@ -32,4 +32,22 @@ class NetSalesWithAllReturnsResponse(BaseModel):
     # Offers
     default_offer: Optional[str] = "No default offer"
     monitory_offer: Optional[str] = "No monitory offer"
-    offer: Optional[str] = "No offer"
\ No newline at end of file
+    offer: Optional[str] = "No offer"
+
+
+class CustomerSalesSummaryRequest(BaseModel):
+    zid: int = Field(..., description="Business ID")
+    customer_ids: Optional[List[str]] = Field(
+        None, max_length=1000, description="Customer IDs to summarise (or employee_id)"
+    )
+    employee_id: Optional[str] = Field(
+        None, description="Summarise every customer assigned to this salesman (or customer_ids)"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "zid": 100001,
+                "employee_id": "SA--000015"
+            }
+        }
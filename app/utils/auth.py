@@ -15,29 +15,14 @@ from sqlalchemy.future import select
 from utils.token_utils import (
     SECRET_KEY, ALGORITHM, is_token_blacklisted
 )
+from utils.auth_cache import cache_user, get_cached_user, invalidation_generation
+from utils.session_activity import session_activity
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login")
 
-async def update_session_activity(db: AsyncSession, username: str, token: str):
-    """Update the last activity time for a session"""
-    try:
-        result = await db.execute(
-            select(Logged).filter_by(username=username, access_token=token)
-        )
-        session = result.scalar_one_or_none()
-        
-        if session:
-            session.zutime = datetime.utcnow()
-            await db.commit()
-        else:
-            logger.warning(f"No active session found for user {username}")
-            
-    except Exception as e:
-        logger.error(f"Error updating session activity: {str(e)}")
-        await db.rollback()
 async def session_activity_middleware(request: Request, call_next):
-    """Middleware to update session activity timestamp"""
+    """Middleware to record session activity for the write-behind buffer"""
     response = None
 
     try:
@@ -63,18 +48,15 @@ async def session_activity_middleware(request: Request, call_next):
                 username = payload.get("username")
 
                 if username:
-                    # Resolve the database session from get_db()
-                    async for db in get_db():
-                        # Update session activity
-                        await update_session_activity(db, username, token)
-                        break  # Exit after using the session
+                    # Buffered; written to logged.zutime in bulk by the maintenance scheduler
+                    session_activity.touch(username, token)
 
             except JWTError:
                 logger.warning("Invalid token in session activity update")
             except Exception as e:
-                logger.error(f"Error updating session activity: {str(e)}")
+                logger.error("Error updating session activity: %s", e)
     except Exception as e:
-        logger.error(f"Session middleware error: {str(e)}")
+        logger.error("Session middleware error: %s", e)
 
     # Call the next middleware or route handler
     if response is None:
@@ -91,17 +73,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     )
     
     try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username: str = payload.get("username")
+        if not username:
+            raise credentials_exception
+
+        # A recently validated token skips the blacklist, user and session lookups
+        cached_user = get_cached_user(token)
+        if cached_user is not None and cached_user.username == username:
+            return cached_user
+
+        # Taken before the lookups, so a logout that lands while they run keeps them uncached
+        generation = invalidation_generation()
         if await is_token_blacklisted(db, token):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has been revoked"
             )
 
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("username")
-        if not username:
-            raise credentials_exception
-
         database_controller = UserDBController(db)
         user = await database_controller.get_user_by_username(username)
         if not user:
@@ -123,13 +112,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="No active session found for this token"
             )
-        
+
+        cache_user(token, user, generation)
         return user
     except JWTError as e:
-        logger.error(f"JWT validation error: {str(e)}")
+        logger.error("JWT validation error: %s", e)
         raise credentials_exception
     except Exception as e:
-        logger.error(f"User validation error: {str(e)}\n{traceback.format_exc()}")
+        logger.error("User validation error: %s\n%s", e, traceback.format_exc())
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error",
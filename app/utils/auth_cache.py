@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import os
+from typing import Callable, Dict, Optional, Set, Tuple
+import asyncpg
+from dotenv import load_dotenv
+from sqlalchemy import func, inspect, select
+
+from database import asyncpg_dsn, engine
+from logs import setup_logger
+from models.users_model import ApiUsers
+from utils.cache import TTLCache
+
+# Load environment variables
+load_dotenv()
+
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# Postgres NOTIFY channel that carries invalidations to every worker
+AUTH_CACHE_CHANNEL = "auth_cache_invalidate"
+# How often the listener connection is pinged so a dead connection is noticed
+LISTEN_PING_SECONDS = 15
+LISTEN_RETRY_MAX_SECONDS = 30
+
+logger = setup_logger(__name__)
+
+# token hash -> detached ApiUsers resolved for a token with a live session
+_users_by_token = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+# username -> token hashes, so account-level changes can drop every token of a user
+_tokens_by_username: Dict[str, Set[str]] = {}
+# Bumped by every eviction in this worker, local or broadcast
+_generation = 0
+
+
+def token_key(token: str) -> str:
+    """Hash the raw JWT so bearer tokens are never held as cache keys."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _snapshot_user(user: ApiUsers) -> ApiUsers:
+    """Copy column values into a transient ApiUsers that is not bound to any session."""
+    return ApiUsers(**{
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(ApiUsers).column_attrs
+    })
+
+
+def invalidation_generation() -> int:
+    """
+    Take this before reading what will be cached. If it has moved by the time
+    the result would be stored, an invalidation may have landed in between
+    (e.g. a logout committed after the session was read) and the result must
+    not be cached.
+    """
+    return _generation
+
+
+def mark_invalidated() -> None:
+    """Record an eviction so lookups that started before it don't cache their result"""
+    global _generation
+    _generation += 1
+
+
+def get_cached_user(token: str) -> Optional[ApiUsers]:
+    """Return the user for a token validated within the TTL, or None."""
+    # Without a live subscription this worker could miss another worker's
+    # invalidation, so every request goes to the database until it is back
+    if not invalidation_listener.connected:
+        return None
+    return _users_by_token.get(token_key(token))
+
+
+def cache_user(token: str, user: ApiUsers, generation: int) -> None:
+    """
+    Remember that token belongs to an active user with an active session, as
+    read after invalidation_generation() returned generation.
+    """
+    if not invalidation_listener.connected or generation != _generation:
+        return
+    key = token_key(token)
+    _users_by_token.set(key, _snapshot_user(user))
+
+    keys = _tokens_by_username.setdefault(user.username, set())
+    # Drop hashes the LRU has already evicted so the index stays bounded
+    keys.intersection_update([k for k in keys if k in _users_by_token])
+    keys.add(key)
+
+
+def _evict_token(key: str) -> None:
+    mark_invalidated()
+    user = _users_by_token.pop(key)
+    if user is not None:
+        _tokens_by_username.get(user.username, set()).discard(key)
+
+
+def _evict_user(username: str) -> None:
+    mark_invalidated()
+    for key in _tokens_by_username.pop(username, set()):
+        _users_by_token.pop(key)
+
+
+def invalidate_token(token: Optional[str]) -> None:
+    """Forget a single token in every worker, e.g. after logout or blacklisting."""
+    if not token:
+        return
+    key = token_key(token)
+    _evict_token(key)
+    broadcast_invalidation(f"token:{key}")
+
+
+def invalidate_user(username: str) -> None:
+    """Forget every cached token of a user in every worker, e.g. after a status change."""
+    _evict_user(username)
+    broadcast_invalidation(f"user:{username}")
+
+
+# Keeps fire-and-forget publishes referenced until they finish
+_pending_publishes: Set[asyncio.Task] = set()
+# kind -> (apply, clear) of other per-worker caches invalidated over the same channel
+_invalidation_handlers: Dict[str, Tuple[Callable[[str], None], Callable[[], None]]] = {}
+
+
+def register_invalidation_handler(kind: str, apply: Callable[[str], None], clear: Callable[[], None]) -> None:
+    """
+    Deliver "<kind>:<value>" invalidations to `apply` in every worker, and call
+    `clear` whenever the listener (re)subscribes. Such a cache must also be
+    bypassed while `invalidation_listener.connected` is False, and `apply`
+    must call mark_invalidated().
+    """
+    _invalidation_handlers[kind] = (apply, clear)
+
+
+def broadcast_invalidation(payload: str) -> None:
+    """
+    Send an invalidation to the other workers. Callers invalidate after their
+    commit, so another worker that misses the cache re-reads committed state.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Scripts run without the listeners; nothing to tell
+        return
+    task = loop.create_task(_publish(payload))
+    _pending_publishes.add(task)
+    task.add_done_callback(_pending_publishes.discard)
+
+
+async def _publish(payload: str) -> None:
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(select(func.pg_notify(AUTH_CACHE_CHANNEL, payload)))
+            await conn.commit()
+    except Exception as e:
+        # The other workers still drop the entry once AUTH_CACHE_TTL_SECONDS pass
+        logger.error("Error publishing auth cache invalidation: %s", e)
+
+
+def _apply_invalidation(payload: str) -> None:
+    kind, _, value = payload.partition(":")
+    if kind == "token":
+        _evict_token(value)
+    elif kind == "user":
+        _evict_user(value)
+    elif kind in _invalidation_handlers:
+        apply, _ = _invalidation_handlers[kind]
+        apply(value)
+    else:
+        logger.warning("Ignoring unknown auth cache invalidation: %s", payload)
+
+
+class InvalidationListener:
+    """
+    LISTENs on AUTH_CACHE_CHANNEL over a dedicated asyncpg connection, outside
+    the SQLAlchemy pool, and evicts whatever other workers invalidate. The
+    cache is only used while the subscription is live and is cleared on every
+    (re)subscribe, because notifications sent in between are lost.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.received += 1
+        _apply_invalidation(payload)
+
+    async def _listen(self) -> None:
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(asyncpg_dsn())
+                await conn.add_listener(AUTH_CACHE_CHANNEL, self._on_notify)
+                mark_invalidated()
+                _users_by_token.clear()
+                _tokens_by_username.clear()
+                for _, clear in _invalidation_handlers.values():
+                    clear()
+                self.connected = True
+                delay = 1
+                while True:
+                    await asyncio.sleep(LISTEN_PING_SECONDS)
+                    await asyncio.wait_for(conn.fetchval("SELECT 1"), LISTEN_PING_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Auth cache invalidation listener unavailable, retrying in %ss: %s", delay, e)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.terminate()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(), name="auth-cache-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+invalidation_listener = InvalidationListener()
+
+
+def auth_cache_stats() -> dict:
+    return {
+        **_users_by_token.stats(),
+        "listening": invalidation_listener.connected,
+        "invalidations_received": invalidation_listener.received,
+    }
@@ -0,0 +1,111 @@
+import os
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.metrics import format_labels
+
+# Load environment variables
+load_dotenv()
+
+# Send each request's query count and DB time back as response headers
+DB_STATS_HEADERS = os.getenv(
+    "DB_STATS_HEADERS", "true" if os.getenv("FASTAPI_ENV") == "development" else "false"
+).lower() == "true"
+SLOWEST_STATEMENT_CHARS = 300
+
+# Requests that matched no route share one label instead of one per raw path
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class RequestDBStats:
+    """Database round trips of one request, filled in by the engine's cursor hooks"""
+    queries: int = 0
+    total_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.queries += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-DB-Queries": str(self.queries),
+            # Shows up in the browser devtools timing tab
+            "Server-Timing": f'db;dur={self.total_ms:.1f};desc="{self.queries} queries"',
+        }
+        if self.slowest_statement:
+            headers["X-DB-Slowest-Ms"] = f"{self.slowest_ms:.1f}"
+            headers["X-DB-Slowest-Statement"] = " ".join(self.slowest_statement.split())[:SLOWEST_STATEMENT_CHARS]
+        return headers
+
+
+# The stats object of the request being handled. SQLAlchemy runs the cursor
+# hooks in a greenlet that shares the calling task's context, so they see it.
+_current_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+
+def start_request_stats() -> Tuple[RequestDBStats, Token]:
+    stats = RequestDBStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_request_stats(token: Token) -> None:
+    _current_stats.reset(token)
+
+
+def record_query(statement: str, elapsed_ms: float) -> None:
+    """Called for every statement; queries outside a request (jobs, startup) are not attributed"""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+
+@dataclass
+class EndpointDBStats:
+    requests: int = 0
+    queries: int = 0
+    db_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: Optional[str] = None
+
+
+class EndpointDBStatsRegistry:
+    """Per-endpoint totals of this worker, keyed by (method, route template)"""
+
+    def __init__(self):
+        self.endpoints: Dict[Tuple[str, str], EndpointDBStats] = {}
+
+    def add(self, method: str, route: str, stats: RequestDBStats) -> None:
+        endpoint = self.endpoints.setdefault((method, route), EndpointDBStats())
+        endpoint.requests += 1
+        endpoint.queries += stats.queries
+        endpoint.db_seconds += stats.total_ms / 1000
+        if stats.slowest_ms / 1000 > endpoint.slowest_seconds:
+            endpoint.slowest_seconds = stats.slowest_ms / 1000
+            endpoint.slowest_statement = stats.slowest_statement
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition of the per-endpoint counters"""
+        metrics = (
+            ("orderapp_endpoint_requests_total", "counter", "Requests handled", "requests"),
+            ("orderapp_endpoint_db_queries_total", "counter", "Database statements executed", "queries"),
+            ("orderapp_endpoint_db_seconds_total", "counter", "Time spent in database statements", "db_seconds"),
+            ("orderapp_endpoint_db_slowest_query_seconds", "gauge", "Slowest single statement", "slowest_seconds"),
+        )
+        lines: List[str] = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route), endpoint in sorted(self.endpoints.items()):
+                labels = format_labels(("method", "route"), (method, route))
+                lines.append(f"{name}{labels} {getattr(endpoint, field)}")
+        return "\n".join(lines) + "\n"
+
+
+endpoint_db_stats = EndpointDBStatsRegistry()
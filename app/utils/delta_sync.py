@@ -0,0 +1,17 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def high_water_mark(db: AsyncSession) -> int:
+    """
+    Version up to which every change is visible, for the delta sync endpoints.
+
+    Change rows are stamped with the id of the transaction that wrote them.
+    Transaction ids are handed out at start but commits land in any order,
+    so the newest visible id is not a safe watermark: an older transaction
+    may still commit below it. The oldest transaction still running is,
+    because every id below it belongs to a finished transaction. Changes at
+    or above it are left for the next sync.
+    """
+    result = await db.execute(select(func.txid_snapshot_xmin(func.txid_current_snapshot())))
+    return result.scalar_one()
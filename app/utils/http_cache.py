@@ -0,0 +1,52 @@
+import hashlib
+from typing import Any, Dict, Optional
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Clients may keep the body but must revalidate it with If-None-Match every time
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag_for(body: bytes) -> str:
+    """
+    Weak ETag from a hash of the JSON body. Weak because GZipMiddleware may
+    re-encode the bytes on the wire while the content stays the same.
+    """
+    return f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check with weak comparison, as RFC 9110 requires for it"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def conditional_json(
+    request: Request, content: Any, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    JSON response carrying an ETag of its body, or an empty 304 when the
+    client's If-None-Match already names that ETag.
+    """
+    response = JSONResponse(content=jsonable_encoder(content), headers=headers)
+    etag = etag_for(response.body)
+    cache_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if etag_matches(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={**(headers or {}), **cache_headers},
+        )
+
+    response.headers.update(cache_headers)
+    return response
@@ -0,0 +1,179 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from logs import setup_logger
+from models.orders_model import OrderIdempotency
+
+# Load environment variables
+load_dotenv()
+
+# How long a key keeps replaying its original response
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "48"))
+# A claim without a stored response older than this is treated as abandoned and pruned
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "300"))
+MAX_KEY_LENGTH = 100
+
+logger = setup_logger(__name__)
+
+
+def request_fingerprint(endpoint: str, payload: BaseModel) -> str:
+    """Hash of the endpoint and body, so a key reused for a different request is caught"""
+    digest = hashlib.sha256(endpoint.encode("utf-8"))
+    digest.update(payload.model_dump_json().encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def _claim_key(db: AsyncSession, username: str, key: str, fingerprint: str) -> Optional[datetime]:
+    """Insert a pending row for the key; returns its created_at, or None if the key is already taken"""
+    result = await db.execute(
+        insert(OrderIdempotency)
+        .values(
+            username=username,
+            idempotency_key=key,
+            request_hash=fingerprint,
+            created_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["username", "idempotency_key"])
+        .returning(OrderIdempotency.created_at)
+    )
+    claimed_at = result.scalar()
+    await db.commit()
+    return claimed_at
+
+
+async def _replay(db: AsyncSession, username: str, key: str, fingerprint: str, response: Response) -> Any:
+    result = await db.execute(
+        select(OrderIdempotency.request_hash, OrderIdempotency.response).filter(
+            OrderIdempotency.username == username,
+            OrderIdempotency.idempotency_key == key,
+        )
+    )
+    existing = result.first()
+
+    if existing is not None and existing.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    if existing is None or existing.response is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed"
+        )
+
+    logger.info("Replaying order response for %s, Idempotency-Key %s", username, key)
+    response.headers["Idempotent-Replayed"] = "true"
+    return existing.response
+
+
+def _pending_claim(username: str, key: str, claimed_at: datetime) -> tuple:
+    """Filter for this submission's own claim while it has no response yet"""
+    # created_at tells it apart from a retry that claimed the key after this
+    # claim was pruned as abandoned
+    return (
+        OrderIdempotency.username == username,
+        OrderIdempotency.idempotency_key == key,
+        OrderIdempotency.created_at == claimed_at,
+        OrderIdempotency.response.is_(None),
+    )
+
+
+async def _release_key(db: AsyncSession, username: str, key: str, claimed_at: datetime) -> None:
+    """Delete a claim that never got a response, so the client can retry"""
+    # A claim with a response was committed together with its orders and
+    # stays, even if the commit reported an error after it went through
+    try:
+        await db.execute(delete(OrderIdempotency).where(*_pending_claim(username, key, claimed_at)))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error("Error releasing Idempotency-Key %s for %s: %s", key, username, e)
+
+
+async def run_idempotent(
+    db: AsyncSession,
+    username: str,
+    idempotency_key: Optional[str],
+    endpoint: str,
+    payload: BaseModel,
+    response: Response,
+    handler: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Run handler at most once per (username, Idempotency-Key).
+
+    The handler writes through db without committing. The first submission
+    claims the key before writing anything; its response is then stored in
+    the handler's transaction, so the opmob lines and the stored response
+    commit together or not at all. A retry with the same key and body gets
+    the stored response back without touching opmob. Without a key the
+    handler's writes are simply committed.
+    """
+    if not idempotency_key:
+        result = await handler()
+        await db.commit()
+        return result
+
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"
+        )
+
+    fingerprint = request_fingerprint(endpoint, payload)
+    claimed_at = await _claim_key(db, username, idempotency_key, fingerprint)
+    if claimed_at is None:
+        return await _replay(db, username, idempotency_key, fingerprint, response)
+
+    try:
+        result = await handler()
+        stored = await db.execute(
+            update(OrderIdempotency)
+            .where(*_pending_claim(username, idempotency_key, claimed_at))
+            .values(response=jsonable_encoder(result))
+        )
+        claim_lost = stored.rowcount != 1
+        if not claim_lost:
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        await _release_key(db, username, idempotency_key, claimed_at)
+        raise
+
+    if claim_lost:
+        # The claim outlived IDEMPOTENCY_PENDING_TIMEOUT_SECONDS and was pruned, so a
+        # retry may own the key by now: discard this submission's lines instead
+        await db.rollback()
+        logger.error("Idempotency-Key %s for %s expired while processing; lines discarded", idempotency_key, username)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed"
+        )
+
+    return result
+
+
+async def prune_idempotency_keys(db: AsyncSession) -> int:
+    """Delete expired keys and abandoned claims; run by the maintenance scheduler"""
+    now = datetime.utcnow()
+    result = await db.execute(
+        delete(OrderIdempotency).where(
+            or_(
+                OrderIdempotency.created_at < now - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),
+                (OrderIdempotency.response.is_(None))
+                & (OrderIdempotency.created_at < now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)),
+            )
+        )
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,65 @@
+from typing import NamedTuple
+from sqlalchemy import case, func, literal, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+# Rank buckets, best first
+RANK_EXACT_CODE = 0
+RANK_CODE_PREFIX = 1
+RANK_NAME_PREFIX = 2
+RANK_CONTAINS = 3
+RANK_FUZZY = 4
+
+LIKE_ESCAPE = "!"
+
+
+class ItemSearch(NamedTuple):
+    """WHERE clause and ORDER BY terms for a ranked item search."""
+    condition: ColumnElement
+    rank: ColumnElement
+    similarity: ColumnElement
+
+
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally."""
+    return (
+        term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", LIKE_ESCAPE + "%")
+        .replace("_", LIKE_ESCAPE + "_")
+    )
+
+
+def build_item_search(term: str, code_col, name_col, group_col) -> ItemSearch:
+    """
+    Ranked search over item code, name and group.
+
+    Every predicate is one the pg_trgm GIN indexes from migration
+    item_search_trgm can serve: ILIKE '%term%' on the three columns, plus
+    word similarity (`<%`) on the name for misspellings. Results rank exact
+    code matches first, then code prefixes, name prefixes, substring matches
+    and finally fuzzy name matches, with similarity breaking ties.
+    """
+    term = term.strip()
+    escaped = escape_like(term)
+    contains = f"%{escaped}%"
+    prefix = f"{escaped}%"
+
+    contains_any = or_(
+        name_col.ilike(contains, escape=LIKE_ESCAPE),
+        code_col.ilike(contains, escape=LIKE_ESCAPE),
+        group_col.ilike(contains, escape=LIKE_ESCAPE),
+    )
+    fuzzy_name = literal(term).op("<%")(name_col)
+
+    rank = case(
+        (func.lower(code_col) == term.lower(), RANK_EXACT_CODE),
+        (code_col.ilike(prefix, escape=LIKE_ESCAPE), RANK_CODE_PREFIX),
+        (name_col.ilike(prefix, escape=LIKE_ESCAPE), RANK_NAME_PREFIX),
+        (contains_any, RANK_CONTAINS),
+        else_=RANK_FUZZY,
+    )
+
+    return ItemSearch(
+        condition=or_(contains_any, fuzzy_name),
+        rank=rank,
+        similarity=func.word_similarity(term, name_col),
+    )
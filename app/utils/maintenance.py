@@ -0,0 +1,78 @@
+import os
+from dotenv import load_dotenv
+
+from controllers.user_login_controller import UserLoginController
+from controllers.db_controllers.sales_return_db_controller import SalesReturnDBController
+from controllers.db_controllers.customer_balance_controller import CustomerBalanceController
+from database import async_session_maker
+from logs import setup_logger
+from utils.scheduler import MaintenanceScheduler, PeriodicTask
+from utils.session_activity import SESSION_ACTIVITY_FLUSH_SECONDS, session_activity
+from utils.token_utils import cleanup_expired_tokens
+from utils.idempotency import prune_idempotency_keys
+
+# Load environment variables
+load_dotenv()
+
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+INACTIVE_SESSION_HOURS = int(os.getenv("INACTIVE_SESSION_HOURS", "720"))  # 30 days
+# How stale a closed month in customer_sales_monthly may get after an ERP edit
+SALES_MONTHLY_REFRESH_SECONDS = int(os.getenv("SALES_MONTHLY_REFRESH_SECONDS", "60"))
+SALES_MONTHLY_REFRESH_BATCH = int(os.getenv("SALES_MONTHLY_REFRESH_BATCH", "5000"))
+# Rebuilds the month-end balance snapshots of customers with new GL postings;
+# until then their ledgers start from an older snapshot
+BALANCE_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("BALANCE_SNAPSHOT_INTERVAL_SECONDS", "3600"))
+BALANCE_SNAPSHOT_BATCH = int(os.getenv("BALANCE_SNAPSHOT_BATCH", "500"))
+
+logger = setup_logger(__name__)
+
+
+async def prune_token_blacklist() -> int:
+    async with async_session_maker() as db:
+        deleted = await cleanup_expired_tokens(db)
+    if deleted:
+        logger.info("Pruned %s expired tokens from the blacklist", deleted)
+    return deleted
+
+
+async def prune_order_idempotency() -> int:
+    async with async_session_maker() as db:
+        return await prune_idempotency_keys(db)
+
+
+async def cleanup_inactive_sessions() -> int:
+    async with async_session_maker() as db:
+        return await UserLoginController(db).cleanup_inactive_sessions(INACTIVE_SESSION_HOURS)
+
+
+async def refresh_customer_sales_monthly() -> int:
+    async with async_session_maker() as db:
+        refreshed = await SalesReturnDBController(db).refresh_customer_sales_monthly(SALES_MONTHLY_REFRESH_BATCH)
+    if refreshed:
+        logger.info("Recomputed %s customer months in customer_sales_monthly", refreshed)
+    return refreshed
+
+
+async def build_balance_snapshots() -> int:
+    async with async_session_maker() as db:
+        written = await CustomerBalanceController(db).refresh_balance_snapshots(BALANCE_SNAPSHOT_BATCH)
+    if written:
+        logger.info("Wrote %s customer balance snapshots", written)
+    return written
+
+
+def register_maintenance_jobs(scheduler: MaintenanceScheduler) -> None:
+    """Register the housekeeping jobs that used to run inside request handlers."""
+    scheduler.add(PeriodicTask("token_blacklist_prune", prune_token_blacklist, MAINTENANCE_INTERVAL_SECONDS))
+    scheduler.add(PeriodicTask("inactive_session_cleanup", cleanup_inactive_sessions, MAINTENANCE_INTERVAL_SECONDS))
+    scheduler.add(PeriodicTask("order_idempotency_prune", prune_order_idempotency, MAINTENANCE_INTERVAL_SECONDS))
+    scheduler.add(PeriodicTask(
+        "customer_sales_monthly_refresh", refresh_customer_sales_monthly, SALES_MONTHLY_REFRESH_SECONDS
+    ))
+    scheduler.add(PeriodicTask(
+        "customer_balance_snapshot_build", build_balance_snapshots, BALANCE_SNAPSHOT_INTERVAL_SECONDS
+    ))
+    # Every worker buffers its own requests, so every worker flushes
+    scheduler.add(PeriodicTask(
+        "session_activity_flush", session_activity.flush, SESSION_ACTIVITY_FLUSH_SECONDS, exclusive=False
+    ))
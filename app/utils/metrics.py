@@ -0,0 +1,171 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds in seconds; +Inf is always added
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    """Prometheus label block for the given names and values, plus the worker label"""
+    # Each uvicorn worker keeps its own counters, so every series carries the
+    # worker's pid; without it samples scraped from different workers collide
+    pairs = [("worker", os.getpid()), *zip(names, values)]
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[LabelValues, float] = {} if labels else {(): 0}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, values)} {_format_value(value)}" for values, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """A value set directly, or read from `collect` at scrape time"""
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        collect: Optional[Callable[[], float]] = None,
+    ):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[LabelValues, float] = {} if labels else {(): 0}
+        self.collect = collect
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def render(self) -> List[str]:
+        if self.collect is not None:
+            items = [((), self.collect())]
+        else:
+            with self._lock:
+                items = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, values)} {_format_value(value)}" for values, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum
+        self.series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.series.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((values, (list(counts), total[0])) for values, (counts, total) in self.series.items())
+        lines = self.header()
+        bucket_labels = self.labels + ("le",)
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, None), counts):
+                cumulative += count
+                le = "+Inf" if bound is None else _format_value(bound)
+                lines.append(f"{self.name}_bucket{format_labels(bucket_labels, (*values, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this worker, rendered together for /metrics"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+# HTTP requests, labelled by route template so path parameters don't explode the series
+http_requests_in_flight = metrics_registry.register(Gauge(
+    "orderapp_http_requests_in_flight", "Requests being handled right now",
+))
+http_requests_total = metrics_registry.register(Counter(
+    "orderapp_http_requests_total", "Requests handled, by status code", ("method", "route", "status"),
+))
+http_request_duration = metrics_registry.register(Histogram(
+    "orderapp_http_request_duration_seconds", "Request latency", ("method", "route"),
+))
+
+# Waiting for a pooled connection; the pool's own gauges are registered by database.py
+db_pool_wait = metrics_registry.register(Histogram(
+    "orderapp_db_pool_wait_seconds", "Time spent waiting to check out a connection", buckets=POOL_WAIT_BUCKETS,
+))
+db_pool_timeouts = metrics_registry.register(Counter(
+    "orderapp_db_pool_timeouts_total", "Checkouts that gave up after pool_timeout",
+))
@@ -1,6 +1,23 @@
 # utils.py
+import asyncio
 import random
 import string
+from typing import List, Optional
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from logs import setup_logger
+
+# Must match INCREMENT BY of opmob_invoicesl_seq (migration invoice_sequence):
+# every nextval() reserves this many consecutive invoice serials for one worker
+INVOICE_BLOCK_SIZE = 100
+INVOICE_SERIAL_LENGTH = 12
+# Largest serial that still fits INVOICE_SERIAL_LENGTH digits; the sequence's MAXVALUE stays below it
+MAX_INVOICE_SERIAL = 10 ** INVOICE_SERIAL_LENGTH - 1
+# SQLSTATE of nextval() past MAXVALUE
+SEQUENCE_LIMIT_EXCEEDED = "2200H"
+
+logger = setup_logger(__name__)
 
 def generate_random_number(length: int) -> str:
     return ''.join(random.choices(string.digits, k=length))
@@ -9,3 +26,53 @@ def format_invoice_number(invoicesl: str) -> str:
     parts = [invoicesl[i:i+5] for i in range(0, len(invoicesl), 4)]
     return '-'.join(parts)
 
+
+class InvoiceNumberAllocator:
+    """
+    Hi/lo allocator for invoice serials backed by opmob_invoicesl_seq.
+
+    One nextval() reserves a block of INVOICE_BLOCK_SIZE serials that this
+    worker then hands out from memory, so most orders need no round-trip.
+    Serials are unique across workers; a restart leaves gaps, never repeats.
+    """
+
+    def __init__(self, block_size: int = INVOICE_BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _reserve_block(self, db: AsyncSession) -> None:
+        try:
+            start = await db.scalar(text("SELECT nextval('opmob_invoicesl_seq')"))
+        except exc.DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) == SEQUENCE_LIMIT_EXCEEDED:
+                logger.critical("opmob_invoicesl_seq is exhausted; no invoice serials are left")
+                raise RuntimeError("Invoice serials are exhausted (opmob_invoicesl_seq reached its MAXVALUE)") from e
+            raise
+        if start + self.block_size - 1 > MAX_INVOICE_SERIAL:
+            # Would no longer format as INVOICE_SERIAL_LENGTH digits
+            logger.critical("opmob_invoicesl_seq returned %s, past %s digits", start, INVOICE_SERIAL_LENGTH)
+            raise RuntimeError(f"Invoice serial block at {start} exceeds {INVOICE_SERIAL_LENGTH} digits")
+        self._next = start
+        self._end = start + self.block_size
+
+    async def allocate_many(self, db: AsyncSession, count: int) -> List[str]:
+        """Return count zero-padded invoice serials, reserving new blocks as needed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        serials: List[str] = []
+        async with self._lock:
+            while len(serials) < count:
+                if self._next >= self._end:
+                    await self._reserve_block(db)
+                serials.append(str(self._next).zfill(INVOICE_SERIAL_LENGTH))
+                self._next += 1
+        return serials
+
+    async def allocate(self, db: AsyncSession) -> str:
+        return (await self.allocate_many(db, 1))[0]
+
+
+invoice_allocator = InvoiceNumberAllocator()
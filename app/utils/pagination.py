@@ -0,0 +1,116 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+from fastapi import HTTPException, Response, status
+from sqlalchemy import DateTime, and_, or_, tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import ColumnElement, UnaryExpression
+
+from utils.error import error_details
+
+# Response header carrying the cursor for the next page; absent on the last page
+CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor holding the sort key values of the last row on a page"""
+    raw = json.dumps(list(values), default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Sort key values from a cursor; 400 if it is malformed or was issued for another ordering"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        values = None
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error_details("Invalid cursor"),
+        )
+    return values
+
+
+def _split_order(term: ColumnElement) -> Tuple[ColumnElement, bool]:
+    """(expression, descending) for an ORDER BY term such as `col` or `col.desc()`"""
+    if isinstance(term, UnaryExpression) and term.modifier in (operators.desc_op, operators.asc_op):
+        return term.element, term.modifier is operators.desc_op
+    return term, False
+
+
+def _coerce(column: ColumnElement, value: Any) -> Any:
+    # Timestamps travel as ISO strings; asyncpg wants datetime objects back
+    if isinstance(value, str) and isinstance(column.type, DateTime):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=error_details("Invalid cursor"),
+            )
+    return value
+
+
+def keyset_after(order_by: Sequence[ColumnElement], cursor: str) -> ColumnElement:
+    """
+    WHERE clause selecting the rows that follow the cursor in `order_by`.
+
+    The ORDER BY terms must end in a unique key so the position is exact.
+    When every term sorts the same way this is a single row comparison,
+    `(a, b) > (:a, :b)`, which PostgreSQL answers from a matching btree
+    index; mixed directions expand to the equivalent OR chain.
+    """
+    terms = [_split_order(term) for term in order_by]
+    values = decode_cursor(cursor, len(terms))
+    values = [_coerce(column, value) for (column, _), value in zip(terms, values)]
+
+    descending = {desc for _, desc in terms}
+    if len(descending) == 1:
+        columns = [column for column, _ in terms]
+        if len(columns) == 1:
+            left, right = columns[0], values[0]
+        else:
+            left, right = tuple_(*columns), tuple_(*values)
+        return left < right if descending.pop() else left > right
+
+    clauses = []
+    for i, (column, desc) in enumerate(terms):
+        equal_prefix = [terms[j][0] == values[j] for j in range(i)]
+        beyond = column < values[i] if desc else column > values[i]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+
+def paginate(rows: Sequence[T], limit: int, sort_key: Callable[[T], Sequence[Any]]) -> Tuple[List[T], Optional[str]]:
+    """
+    Trim rows fetched with LIMIT limit + 1 to one page and build the cursor
+    for the next one, or None when this is the last page.
+    """
+    rows = list(rows)
+    if limit <= 0:
+        return [], None
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort_key(rows[-1]))
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
@@ -0,0 +1,100 @@
+import os
+from typing import FrozenSet, NamedTuple, Optional
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models.permissions_model import Permission, Role, role_permission, user_role
+from models.users_model import ApiUsers
+from utils.auth_cache import (
+    broadcast_invalidation, invalidation_generation, invalidation_listener, mark_invalidated,
+    register_invalidation_handler,
+)
+from utils.cache import TTLCache
+
+# Load environment variables
+load_dotenv()
+
+PERMISSION_CACHE_TTL_SECONDS = int(os.getenv("PERMISSION_CACHE_TTL_SECONDS", "60"))
+PERMISSION_CACHE_MAX_ENTRIES = int(os.getenv("PERMISSION_CACHE_MAX_ENTRIES", "10000"))
+
+
+class UserGrants(NamedTuple):
+    """Everything the RBAC decorators need to know about a user."""
+    is_admin: bool
+    roles: FrozenSet[str]
+    permissions: FrozenSet[str]
+
+
+_grants_by_username = TTLCache(maxsize=PERMISSION_CACHE_MAX_ENTRIES, ttl=PERMISSION_CACHE_TTL_SECONDS)
+
+# Broadcast payload value meaning every user
+ALL_USERS = "*"
+
+
+def get_cached_grants(username: str) -> Optional[UserGrants]:
+    # Like the auth cache, only trusted while invalidations from other workers arrive
+    if not invalidation_listener.connected:
+        return None
+    return _grants_by_username.get(username)
+
+
+async def resolve_user_grants(db: AsyncSession, username: str) -> Optional[UserGrants]:
+    """
+    Return the roles and permission codenames of a user, or None if the user does not exist.
+
+    The user -> roles -> permissions closure is loaded with a single outer-joined
+    query and cached per username.
+    """
+    grants = get_cached_grants(username)
+    if grants is not None:
+        return grants
+
+    generation = invalidation_generation()
+
+    result = await db.execute(
+        select(ApiUsers.is_admin, Role.name, Permission.codename)
+        .select_from(ApiUsers)
+        .outerjoin(user_role, user_role.c.username == ApiUsers.username)
+        .outerjoin(Role, Role.id == user_role.c.role_id)
+        .outerjoin(role_permission, role_permission.c.role_id == Role.id)
+        .outerjoin(Permission, Permission.id == role_permission.c.permission_id)
+        .filter(ApiUsers.username == username)
+    )
+    rows = result.all()
+    if not rows:
+        return None
+
+    is_admin = rows[0].is_admin
+    grants = UserGrants(
+        is_admin=bool(is_admin) and is_admin.lower() == "admin",
+        roles=frozenset(row.name for row in rows if row.name is not None),
+        permissions=frozenset(row.codename for row in rows if row.codename is not None),
+    )
+    # Not cached if a role change was invalidated while the query ran
+    if invalidation_listener.connected and generation == invalidation_generation():
+        _grants_by_username.set(username, grants)
+    return grants
+
+
+def _evict_grants(username: str) -> None:
+    mark_invalidated()
+    if username == ALL_USERS:
+        _grants_by_username.clear()
+    else:
+        _grants_by_username.pop(username)
+
+
+def invalidate_user_grants(username: str) -> None:
+    """Forget the cached grants of one user in every worker, e.g. after a role assignment."""
+    _evict_grants(username)
+    broadcast_invalidation(f"grants:{username}")
+
+
+def invalidate_all_grants() -> None:
+    """Forget every cached grant in every worker, e.g. after a role's permissions change."""
+    _evict_grants(ALL_USERS)
+    broadcast_invalidation(f"grants:{ALL_USERS}")
+
+
+register_invalidation_handler("grants", _evict_grants, _grants_by_username.clear)
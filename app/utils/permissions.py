@@ -1,20 +1,19 @@
 from fastapi import HTTPException, Depends, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from typing import Optional, List, Union, Callable, Any
 import functools
 from jose import jwt
 import inspect
 
 from logs import setup_logger
-from database import get_db
+from database import async_session_maker
 from models.permissions_model import Permission, Role
-from models.users_model import ApiUsers
 from utils.auth import get_current_user
+from utils.permission_cache import UserGrants, get_cached_grants, resolve_user_grants
 from utils.token_utils import SECRET_KEY, ALGORITHM
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 async def check_user_permissions(
     db: AsyncSession, 
@@ -23,7 +22,7 @@ async def check_user_permissions(
 ) -> bool:
     """
     Check if a user has the required permissions either through direct role assignment
-    or inherited from roles.
+    or inherited from roles. Uses the cached grants from utils.permission_cache.
     
     Args:
         db: Database session
@@ -34,47 +33,47 @@ async def check_user_permissions(
         bool: True if user has all required permissions, False otherwise
     """
     try:
-        # Get the user with their roles
-        user_query = await db.execute(
-            select(ApiUsers).filter(ApiUsers.username == username)
-        )
-        user = user_query.scalar_one_or_none()
-        
-        if not user:
-            logger.warning(f"Permission check failed: User {username} not found")
+        grants = await resolve_user_grants(db, username)
+
+        if grants is None:
+            logger.warning("Permission check failed: User %s not found", username)
             return False
             
         # Admin users always have all permissions
-        if user.is_admin and user.is_admin.lower() == "admin":
-            logger.info(f"User {username} has admin status, granting all permissions")
+        if grants.is_admin:
             return True
             
-        # Get all permissions for the user's roles
-        if not user.roles:
-            logger.warning(f"User {username} has no roles assigned")
+        if not grants.roles:
+            logger.warning("User %s has no roles assigned", username)
             return False
-            
-        # Collect all permissions from the user's roles
-        user_permissions = set()
-        for role in user.roles:
-            for permission in role.permissions:
-                user_permissions.add(permission.codename)
                 
         # Check if the user has all the required permissions
-        has_permissions = all(perm in user_permissions for perm in required_permissions)
+        has_permissions = grants.permissions.issuperset(required_permissions)
         
         if not has_permissions:
-            logger.warning(f"User {username} lacks required permissions: {required_permissions}")
-        else:
-            logger.info(f"Permission check successful for user {username}: {required_permissions}")
+            logger.warning("User %s lacks required permissions: %s", username, required_permissions)
             
         return has_permissions
         
     except Exception as e:
-        logger.error(f"Error checking permissions for {username}: {str(e)}")
+        logger.error("Error checking permissions for %s: %s", username, e)
         return False
 
 
+async def _grants_for_request(username: str, kwargs: dict) -> Optional[UserGrants]:
+    """Resolve grants from the cache, or with the endpoint's session (or a short-lived one) on a miss"""
+    grants = get_cached_grants(username)
+    if grants is not None:
+        return grants
+
+    for val in kwargs.values():
+        if isinstance(val, AsyncSession):
+            return await resolve_user_grants(val, username)
+
+    async with async_session_maker() as db:
+        return await resolve_user_grants(db, username)
+
+
 def has_permission(required_permissions: Union[str, List[str]]):
     """
     Decorator to check if user has the required permission(s) to access an endpoint.
@@ -112,21 +111,14 @@ def has_permission(required_permissions: Union[str, List[str]]):
                     detail="Authentication required"
                 )
 
-            # Get database session from the function's dependencies
-            db = None
-            for key, val in kwargs.items():
-                if isinstance(val, AsyncSession):
-                    db = val
-                    break
-                    
-            if not db:
-                # Get db from dependency if not found in kwargs
-                db = await get_db().__anext__()
-                
             username = current_user.username
-            has_perm = await check_user_permissions(db, username, required_permissions)
+            grants = await _grants_for_request(username, kwargs)
+            has_perm = grants is not None and (
+                grants.is_admin or grants.permissions.issuperset(required_permissions)
+            )
             
             if not has_perm:
+                logger.warning("User %s lacks required permissions: %s", username, required_permissions)
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail=f"Insufficient permissions: {', '.join(required_permissions)}"
@@ -175,36 +167,19 @@ def has_role(required_roles: Union[str, List[str]]):
                     detail="Authentication required"
                 )
 
-            # Get database session from the function's dependencies
-            db = None
-            for key, val in kwargs.items():
-                if isinstance(val, AsyncSession):
-                    db = val
-                    break
-                    
-            if not db:
-                # Get db from dependency if not found in kwargs
-                db = await get_db().__anext__()
-                
             # Admin users have access to all roles
             if current_user.is_admin == "admin":
                 return await func(*args, **kwargs)
                 
-            # Get user with roles from database
-            username = current_user.username
-            user_query = await db.execute(
-                select(ApiUsers).filter(ApiUsers.username == username)
-            )
-            user = user_query.scalar_one_or_none()
+            grants = await _grants_for_request(current_user.username, kwargs)
             
-            if not user or not user.roles:
+            if not grants or not grants.roles:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail=f"User has no roles assigned"
                 )
                 
-            user_role_names = {role.name for role in user.roles}
-            if not any(role in user_role_names for role in required_roles):
+            if grants.roles.isdisjoint(required_roles):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail=f"Required role not found: {', '.join(required_roles)}"
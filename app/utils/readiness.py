@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database import engine, pool_status
+from logs import setup_logger
+from utils.scheduler import scheduler
+
+# Load environment variables
+load_dotenv()
+
+# A result is reused for this long, so frequent probes cost one check per worker
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+# Upper bound for checking out a connection and running SELECT 1
+READINESS_DB_TIMEOUT_SECONDS = float(os.getenv("READINESS_DB_TIMEOUT_SECONDS", "2"))
+# Not ready once this share of pool_size + max_overflow is checked out
+READINESS_MAX_POOL_UTILIZATION = float(os.getenv("READINESS_MAX_POOL_UTILIZATION", "1.0"))
+
+logger = setup_logger(__name__)
+
+
+class ReadinessCheck:
+    """
+    Whether this worker should receive traffic: the database answers a
+    `SELECT 1` within READINESS_DB_TIMEOUT_SECONDS and the pool is not
+    saturated. Maintenance task status is reported alongside; a failing job
+    marks the worker degraded but keeps it in rotation.
+    """
+
+    def __init__(self, cache_seconds: float, db_timeout: float, max_pool_utilization: float):
+        self.cache_seconds = cache_seconds
+        self.db_timeout = db_timeout
+        self.max_pool_utilization = max_pool_utilization
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _check_database(self) -> Dict[str, Any]:
+        async def select_one():
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        started = time.perf_counter()
+        try:
+            # The timeout covers the pool checkout too, so an exhausted pool fails here
+            await asyncio.wait_for(select_one(), self.db_timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": f"no answer within {self.db_timeout:g}s"}
+        except Exception as e:
+            # Only the exception type goes out: the probe is unauthenticated
+            logger.warning("Readiness database check failed: %s", e)
+            return {"ok": False, "error": type(e).__name__}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    @staticmethod
+    def _maintenance_status() -> Dict[str, Any]:
+        tasks = {
+            task.name: {
+                "last_finished_at": task.last_finished_at,
+                "last_error": task.last_error,
+                "failures": task.failures,
+            }
+            for task in scheduler.tasks.values()
+        }
+        return {
+            "running": scheduler.running,
+            "failing": sorted(name for name, task in tasks.items() if task["last_error"]),
+            "tasks": tasks,
+        }
+
+    async def _run(self) -> Dict[str, Any]:
+        database = await self._check_database()
+        pool = pool_status()
+        pool["ok"] = pool["utilization"] < self.max_pool_utilization
+        maintenance = self._maintenance_status()
+
+        if not (database["ok"] and pool["ok"]):
+            state = "unavailable"
+        elif maintenance["failing"] or (scheduler.tasks and not maintenance["running"]):
+            state = "degraded"
+        else:
+            state = "ready"
+        return {
+            "status": state,
+            "checked_at": datetime.utcnow(),
+            "database": database,
+            "pool": pool,
+            "maintenance": maintenance,
+        }
+
+    async def result(self) -> Dict[str, Any]:
+        """The cached result while it is fresh; concurrent callers share one check"""
+        if self._lock is None:
+            # Created lazily so it belongs to the running event loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._result is None or time.monotonic() - self._checked_at >= self.cache_seconds:
+                self._result = await self._run()
+                self._checked_at = time.monotonic()
+            return self._result
+
+
+readiness = ReadinessCheck(READINESS_CACHE_SECONDS, READINESS_DB_TIMEOUT_SECONDS, READINESS_MAX_POOL_UTILIZATION)
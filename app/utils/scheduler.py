@@ -0,0 +1,153 @@
+import asyncio
+import random
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import asyncpg
+
+from database import asyncpg_dsn
+from logs import setup_logger
+
+# Each task's first run is delayed by a random share of its interval, up to
+# this, so workers started together don't all run their jobs at once
+START_JITTER_MAX_SECONDS = 60
+LOCK_CONNECT_TIMEOUT_SECONDS = 10
+
+logger = setup_logger(__name__)
+
+
+class PeriodicTask:
+    """
+    A coroutine run every `interval` seconds by the MaintenanceScheduler.
+
+    With `exclusive=True` a run first takes a Postgres advisory lock derived
+    from the task name, so only one uvicorn worker performs it per interval;
+    the others record the run as skipped. The lock is held on a dedicated
+    asyncpg connection outside the SQLAlchemy pool, so a long job only
+    occupies the pool slot its own session uses.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        exclusive: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.exclusive = exclusive
+        self.lock_key = zlib.crc32(name.encode("utf-8"))
+
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_finished_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_result: Any = None
+        self.last_error: Optional[str] = None
+
+    async def _run_locked(self) -> bool:
+        """Run func under the advisory lock; return False if another worker holds it."""
+        # A session-level lock on an autocommit connection, so it neither sits
+        # idle in transaction nor is released by the job's own commits
+        lock_conn = await asyncpg.connect(asyncpg_dsn(), timeout=LOCK_CONNECT_TIMEOUT_SECONDS)
+        try:
+            if not await lock_conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key):
+                return False
+            try:
+                self.last_result = await self.func()
+            finally:
+                await lock_conn.execute("SELECT pg_advisory_unlock($1)", self.lock_key)
+        finally:
+            await lock_conn.close()
+        return True
+
+    async def run_once(self) -> None:
+        started = time.perf_counter()
+        self.last_started_at = datetime.utcnow()
+        try:
+            if self.exclusive:
+                ran = await self._run_locked()
+            else:
+                self.last_result = await self.func()
+                ran = True
+
+            if not ran:
+                self.skipped += 1
+                return
+            self.runs += 1
+            self.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error("Maintenance task '%s' failed: %s", self.name, e)
+        finally:
+            self.last_finished_at = datetime.utcnow()
+            self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started_at": self.last_started_at,
+            "last_finished_at": self.last_finished_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class MaintenanceScheduler:
+    """Runs registered PeriodicTasks in the background for the lifetime of the app."""
+
+    def __init__(self):
+        self.tasks: Dict[str, PeriodicTask] = {}
+        self._runners: Dict[str, asyncio.Task] = {}
+
+    def add(self, task: PeriodicTask) -> PeriodicTask:
+        if task.name in self.tasks:
+            raise ValueError(f"Maintenance task '{task.name}' is already registered")
+        self.tasks[task.name] = task
+        return task
+
+    async def _loop(self, task: PeriodicTask) -> None:
+        await asyncio.sleep(random.uniform(0, min(task.interval, START_JITTER_MAX_SECONDS)))
+        while True:
+            await task.run_once()
+            await asyncio.sleep(task.interval)
+
+    @property
+    def running(self) -> bool:
+        return any(not runner.done() for runner in self._runners.values())
+
+    def start(self) -> None:
+        for name, task in self.tasks.items():
+            if name not in self._runners or self._runners[name].done():
+                self._runners[name] = asyncio.create_task(self._loop(task), name=f"maintenance:{name}")
+        logger.info("Maintenance scheduler started with tasks: %s", ', '.join(self.tasks) or 'none')
+
+    async def stop(self) -> None:
+        for runner in self._runners.values():
+            runner.cancel()
+        await asyncio.gather(*self._runners.values(), return_exceptions=True)
+        self._runners.clear()
+        logger.info("Maintenance scheduler stopped")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "tasks": [task.status() for task in self.tasks.values()],
+        }
+
+
+scheduler = MaintenanceScheduler()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import DateTime, String, column, or_, update, values
+
+from database import async_session_maker
+from logs import setup_logger
+from models.users_model import Logged
+
+# Load environment variables
+load_dotenv()
+
+# Upper bound on how far logged.zutime may lag behind the last request of a session
+SESSION_ACTIVITY_FLUSH_SECONDS = int(os.getenv("SESSION_ACTIVITY_FLUSH_SECONDS", "30"))
+# Flush early once this many distinct sessions are waiting
+SESSION_ACTIVITY_MAX_PENDING = int(os.getenv("SESSION_ACTIVITY_MAX_PENDING", "5000"))
+FLUSH_CHUNK_SIZE = 5000
+
+logger = setup_logger(__name__)
+
+
+class SessionActivityBuffer:
+    """
+    Write-behind buffer for `logged.zutime`.
+
+    Requests only record the latest touch per (username, access token) in
+    memory; flush() writes every pending touch with a single UPDATE ... FROM
+    (VALUES ...) statement.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[str, str], datetime] = {}
+        self._overflow_flush: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.rows_updated = 0
+
+    def touch(self, username: str, token: str) -> None:
+        self._pending[(username, token)] = datetime.utcnow()
+        if len(self._pending) >= self.max_pending and (
+            self._overflow_flush is None or self._overflow_flush.done()
+        ):
+            self._overflow_flush = asyncio.create_task(self._flush_logged())
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Error flushing session activity: %s", e)
+
+    async def flush(self) -> int:
+        """Write pending touches to the logged table and return the number of sessions updated."""
+        if not self._pending:
+            return 0
+
+        # Swap before awaiting so touches arriving during the write go to the next batch
+        pending, self._pending = self._pending, {}
+
+        rows = [(username, token, ts) for (username, token), ts in pending.items()]
+        updated = 0
+        try:
+            async with async_session_maker() as db:
+                # Chunked to stay well under the 32767 bind parameter limit of asyncpg
+                for start in range(0, len(rows), FLUSH_CHUNK_SIZE):
+                    result = await db.execute(
+                        self._update_statement(rows[start:start + FLUSH_CHUNK_SIZE]),
+                        execution_options={"synchronize_session": False},
+                    )
+                    updated += result.rowcount
+                await db.commit()
+        except Exception:
+            # Put the batch back unless a newer touch for the same session arrived meanwhile
+            for key, ts in pending.items():
+                if key not in self._pending:
+                    self._pending[key] = ts
+            raise
+
+        self.flushes += 1
+        self.rows_updated += updated
+        return updated
+
+    @staticmethod
+    def _update_statement(rows):
+        touched = values(
+            column("username", String),
+            column("access_token", String),
+            column("zutime", DateTime),
+            name="touched",
+        ).data(rows)
+
+        return (
+            update(Logged)
+            .where(
+                Logged.username == touched.c.username,
+                Logged.access_token == touched.c.access_token,
+                # Sessions logged in before zutime was written start out NULL
+                or_(Logged.zutime.is_(None), Logged.zutime < touched.c.zutime),
+            )
+            .values(zutime=touched.c.zutime)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "rows_updated": self.rows_updated,
+        }
+
+
+session_activity = SessionActivityBuffer(max_pending=SESSION_ACTIVITY_MAX_PENDING)
@@ -0,0 +1,101 @@
+import os
+from typing import AsyncIterator, Callable
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.sql import Select
+
+from database import async_session_maker
+from logs import setup_logger
+from utils.metrics import Counter, Gauge, metrics_registry
+
+# Load environment variables
+load_dotenv()
+
+# Rows fetched from the server-side cursor per round trip, and per chunk written
+STREAM_FETCH_ROWS = int(os.getenv("STREAM_FETCH_ROWS", "500"))
+# Each stream holds a pooled connection until the client has read it all, so
+# a worker serves at most this many at once and answers 503 beyond that
+MAX_CONCURRENT_STREAMS = int(os.getenv("MAX_CONCURRENT_STREAMS", "4"))
+STREAM_RETRY_AFTER_SECONDS = 10
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+logger = setup_logger(__name__)
+
+
+class StreamSlots:
+    """Counts the NDJSON streams this worker is sending and turns away the ones over the limit"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    def acquire(self) -> None:
+        if self.active >= self.limit:
+            streams_rejected.inc()
+            logger.warning("All %s stream slots are in use, rejecting request", self.limit)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many downloads in progress, please try again",
+                headers={"Retry-After": str(STREAM_RETRY_AFTER_SECONDS)},
+            )
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+stream_slots = StreamSlots(MAX_CONCURRENT_STREAMS)
+
+metrics_registry.register(Gauge(
+    "orderapp_ndjson_streams_active", "NDJSON streams being sent", collect=lambda: stream_slots.active,
+))
+streams_rejected = metrics_registry.register(Counter(
+    "orderapp_ndjson_streams_rejected_total", "NDJSON streams turned away with 503",
+))
+
+
+class _SlotStreamingResponse(StreamingResponse):
+    """Gives its stream slot back once the response is finished, however it ends"""
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            stream_slots.release()
+
+
+class NDJSONStream:
+    """
+    A query whose rows are sent to the client as newline-delimited JSON, one
+    object per line, while they are read from a server-side cursor. Only one
+    fetch batch is held in memory at a time.
+    """
+
+    def __init__(self, statement: Select, to_model: Callable[..., BaseModel]):
+        self.statement = statement
+        self.to_model = to_model
+
+    async def _lines(self) -> AsyncIterator[str]:
+        # The request's get_db session is closed before a streaming body is
+        # sent, so the rows are read through a session of our own
+        streamed = 0
+        async with async_session_maker() as db:
+            try:
+                result = await db.stream(
+                    self.statement.execution_options(yield_per=STREAM_FETCH_ROWS)
+                )
+                async for rows in result.partitions():
+                    streamed += len(rows)
+                    yield "".join(self.to_model(row).model_dump_json() + "\n" for row in rows)
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated stream
+                logger.error("Error streaming NDJSON response after %s rows: %s", streamed, e)
+                raise
+        logger.info("Streamed %s rows as NDJSON", streamed)
+
+    def response(self) -> StreamingResponse:
+        """The streaming response, holding one of MAX_CONCURRENT_STREAMS slots; 503 if none is free"""
+        stream_slots.acquire()
+        return _SlotStreamingResponse(self._lines(), media_type=NDJSON_MEDIA_TYPE)
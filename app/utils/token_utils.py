@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import delete  # Added this import
 from models.users_model import TokenBlacklist
+from utils.auth_cache import invalidate_token
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +21,7 @@ ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))
 
-logger = setup_logger()
+logger = setup_logger(__name__)
 
 async def create_token(data: dict, expires_delta: timedelta) -> str:
     to_encode = data.copy()
@@ -41,23 +42,22 @@ async def create_refresh_token(data: dict) -> str:
         expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     )
 
-async def cleanup_expired_tokens(db: AsyncSession):
-    """Cleanup expired tokens from the blacklist"""
+async def cleanup_expired_tokens(db: AsyncSession) -> int:
+    """Delete blacklisted tokens that are past any possible expiry; run by the maintenance scheduler"""
     try:
         # Delete tokens older than REFRESH_TOKEN_EXPIRE_DAYS
         cutoff_date = datetime.utcnow() - timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-        await db.execute(
+        result = await db.execute(
             delete(TokenBlacklist).where(TokenBlacklist.blacklisted_at < cutoff_date)
         )
         await db.commit()
+        return result.rowcount
     except Exception as e:
-        logger.error(f"Error cleaning up expired tokens: {str(e)}")
+        logger.error("Error cleaning up expired tokens: %s", e)
         await db.rollback()
+        raise
 
 async def is_token_blacklisted(db: AsyncSession, token: str) -> bool:
-    # Periodically cleanup expired tokens
-    await cleanup_expired_tokens(db)
-    
     result = await db.execute(
         select(TokenBlacklist).filter(TokenBlacklist.token == token)
     )
@@ -66,21 +66,23 @@ async def is_token_blacklisted(db: AsyncSession, token: str) -> bool:
 async def blacklist_token(db: AsyncSession, token: str):
     if not token:
         return
-        
+
     # Check if token already blacklisted
     existing = await db.execute(
         select(TokenBlacklist).filter(TokenBlacklist.token == token)
     )
-    if existing.scalar():
-        return
+    if not existing.scalar():
+        token_blacklist = TokenBlacklist(
+            token=token,
+            blacklisted_at=datetime.utcnow()
+        )
+        db.add(token_blacklist)
+        try:
+            await db.commit()
+        except Exception as e:
+            logger.error("Error blacklisting token: %s", e)
+            await db.rollback()
 
-    token_blacklist = TokenBlacklist(
-        token=token,
-        blacklisted_at=datetime.utcnow()
-    )
-    db.add(token_blacklist)
-    try:
-        await db.commit()
-    except Exception as e:
-        logger.error(f"Error blacklisting token: {str(e)}")
-        await db.rollback()
\ No newline at end of file
+    # Stop serving this token from the auth cache in every worker, once the
+    # blacklist row is committed so a worker re-checking the database sees it
+    invalidate_token(token)
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Event-loop latency during a burst of concurrent logins.
+
+Compares verifying pbkdf2_sha256 passwords inline on the event loop (the old
+behaviour) with the bounded worker pool in utils/passwords.py. A probe task
+sleeps for a fixed tick and records how late it wakes up; that lag is what
+every other request on the worker experiences while logins are in progress.
+
+Usage (from the repository root):
+    python benchmarks/password_hashing.py --logins 50 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from utils.passwords import PasswordHasher, pwd_context  # noqa: E402
+
+TICK_SECONDS = 0.005
+
+
+async def probe_loop_lag(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+
+
+async def run(label: str, verify, logins: int, hashed: str) -> None:
+    lags: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(stop, lags))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(verify("secret-password", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    assert all(results)
+
+    lags.sort()
+    p99 = lags[max(0, int(len(lags) * 0.99) - 1)] if lags else 0.0
+    print(
+        f"{label:<8} logins={logins:<4} total={elapsed * 1000:8.1f} ms  "
+        f"logins/s={logins / elapsed:7.1f}  loop lag: "
+        f"median={statistics.median(lags) if lags else 0.0:6.2f} ms  "
+        f"p99={p99:7.2f} ms  max={lags[-1] if lags else 0.0:7.2f} ms  samples={len(lags)}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50, help="concurrent login attempts")
+    parser.add_argument("--workers", type=int, default=4, help="password pool threads")
+    args = parser.parse_args()
+
+    hashed = pwd_context.hash("secret-password")
+
+    async def inline_verify(plain: str, hashed_password: str) -> bool:
+        return pwd_context.verify(plain, hashed_password)
+
+    hasher = PasswordHasher(workers=args.workers, max_queue=args.logins)
+
+    await run("inline", inline_verify, args.logins, hashed)
+    await run("pool", hasher.verify, args.logins, hashed)
+    print(f"pool stats: {hasher.stats()}")
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Rebuild or verify customer_balance_snapshot, the month-end balances that
+customer ledger opening balances start from.
+
+`rebuild` rebuilds the customers queued by the glheader/gldetail triggers
+(the same work as the hourly maintenance job); with --full it first queues
+every customer in scope from the start of history, so their snapshots are
+dropped and rebuilt. `check` compares every snapshot in scope with the full
+sum of the customer's GL lines and exits with status 1 if any differ.
+
+Usage (from the repository root):
+    python scripts/balance_snapshots.py rebuild [--full [--zid 100001] [--customer CUS-000002]]
+    python scripts/balance_snapshots.py check [--zid 100001] [--customer CUS-000002] [--tolerance 0.01]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from controllers.db_controllers.customer_balance_controller import CustomerBalanceController  # noqa: E402
+from database import async_session_maker, engine  # noqa: E402
+
+
+async def rebuild(args: argparse.Namespace) -> int:
+    async with async_session_maker() as db:
+        controller = CustomerBalanceController(db)
+        if args.full:
+            queued = await controller.queue_balance_snapshots(zid=args.zid, customer_id=args.customer)
+            print(f"Queued {queued} customers")
+        elif args.zid is not None or args.customer is not None:
+            print("--zid/--customer only apply with --full; rebuilding the whole queue")
+        written = await controller.refresh_balance_snapshots(args.batch)
+    print(f"Wrote {written} snapshots")
+    return 0
+
+
+async def check(args: argparse.Namespace) -> int:
+    async with async_session_maker() as db:
+        mismatches = await CustomerBalanceController(db).check_balance_snapshots(
+            zid=args.zid, customer_id=args.customer, tolerance=args.tolerance
+        )
+
+    for row in mismatches:
+        print(
+            f"{row['zid']} {row['xsub']} {row['xproj']} {row['period_end']}: "
+            f"snapshot {row['snapshot_balance']:.2f}, GL {row['gl_balance']:.2f}"
+        )
+    if mismatches:
+        print(f"{len(mismatches)} snapshots differ from the GL; run `rebuild --full` for the affected customers")
+        return 1
+    print("All snapshots match the GL")
+    return 0
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, description in (("rebuild", "build missing snapshots"), ("check", "compare snapshots with the GL")):
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--zid", type=int, help="limit to one business")
+        command.add_argument("--customer", help="limit to one customer (xsub)")
+    commands.choices["rebuild"].add_argument("--full", action="store_true", help="drop and rebuild from history")
+    commands.choices["rebuild"].add_argument("--batch", type=int, default=500, help="customers per transaction")
+    commands.choices["check"].add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    try:
+        return await (rebuild(args) if args.command == "rebuild" else check(args))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
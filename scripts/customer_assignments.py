@@ -0,0 +1,45 @@
+"""
+Re-derive customer_assignments from the salesman columns (xsp, xsp1, xsp2,
+xsp3) of cacus.
+
+The cacus triggers keep the table current on their own; run this after a
+bulk load that ran with triggers disabled. Missing pairs are added or
+reactivated and stale ones deactivated, with a new version so delta sync
+clients pick them up. cacus writers wait on a SHARE lock meanwhile.
+
+Usage (from the repository root):
+    python scripts/customer_assignments.py refresh [--zid 100001]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from controllers.db_controllers.customers_db_controller import CustomersDBController  # noqa: E402
+from database import async_session_maker, engine  # noqa: E402
+
+
+async def refresh(args: argparse.Namespace) -> int:
+    async with async_session_maker() as db:
+        written = await CustomersDBController(db).refresh_customer_assignments(zid=args.zid)
+    print(f"Wrote {written} customer assignment rows")
+    return 0
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("refresh", help="rebuild customer_assignments from cacus")
+    command.add_argument("--zid", type=int, help="limit to one business")
+    args = parser.parse_args()
+
+    try:
+        return await refresh(args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,44 @@
+"""
+Recompute stock_balance, the per-warehouse stock ledger, from imtrn.
+
+The imtrn triggers keep the ledger current on their own; run this to repair
+drift or to backfill a business after a load that bypassed the triggers.
+imtrn writers wait on a SHARE lock while the rows in scope are recounted.
+
+Usage (from the repository root):
+    python scripts/stock_balance.py refresh [--zid 100001] [--item ITEM-001 --item ITEM-002]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from controllers.db_controllers.items_db_controller import ItemsDBController  # noqa: E402
+from database import async_session_maker, engine  # noqa: E402
+
+
+async def refresh(args: argparse.Namespace) -> int:
+    async with async_session_maker() as db:
+        written = await ItemsDBController(db).refresh_stock_balance(zid=args.zid, item_ids=args.item)
+    print(f"Wrote {written} stock balance rows")
+    return 0
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("refresh", help="recompute stock_balance from imtrn")
+    command.add_argument("--zid", type=int, help="limit to one business")
+    command.add_argument("--item", action="append", help="limit to an item (xitem); repeat for several")
+    args = parser.parse_args()
+
+    try:
+        return await refresh(args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))